@@ -0,0 +1,88 @@
+"""
+Season (or match-set) rows of the team views, grouped by team once.
+
+The shot map, total passes, successful box passes and pass network of a
+club over many matches draw the same rows as their match versions, only
+more of them. TeamAggregates filters the season events once per view kind
+(shots, passes, passes with their recipients), adds what the views need
+(the mirrored shots a team conceded, pass outcome and box flags), and
+groups every table by teamId with one groupby. A club's season, or any set
+of its matches, is then a lookup of its rows plus an ``isin`` on matchId;
+the layers built from them are cached in layers.py.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from coordinates import STATSBOMB_COLUMNS, coordinate
+from layers import SHOT_TYPES
+from pass_graphs import pass_edges
+from schema import category_mask
+from zones import PENALTY_BOX, into_zone
+
+
+AGGREGATE_COLUMNS = ['matchId', 'teamId', 'playerId', 'playerName', 'minute', 'type', 'outcomeType', 'x', 'y',
+                     'endX', 'endY', 'EPV', 'isOwnGoal']
+
+
+class TeamAggregates:
+    """
+    Parameters
+    ----------
+    events_df : events of several matches (see AGGREGATE_COLUMNS), with
+                the zone columns of zones.py.
+    """
+
+    def __init__(self, events_df):
+        self.match_ids = sorted(events_df['matchId'].unique().tolist())
+        self.n_events = len(events_df)
+
+        # the two teams of a match sum to the same number, so a team's opponent is that sum minus its id
+        match_teams = events_df[['matchId', 'teamId']].drop_duplicates()
+        team_sum = match_teams.groupby('matchId')['teamId'].sum()
+
+        # every shot twice: for the team that took it, and mirrored for the team it was against
+        is_shot = category_mask(events_df['type'], ['Goal'] + SHOT_TYPES) & \
+            (events_df['isOwnGoal'] != True).to_numpy()
+        shots = events_df.loc[is_shot, ['matchId', 'teamId', 'x', 'y', 'playerName', 'minute', 'type']]
+        shots = shots.assign(isGoal=category_mask(shots['type'], 'Goal'), shooterId=shots['teamId'])
+        against = shots.assign(teamId=shots['matchId'].map(team_sum).to_numpy() - shots['teamId'].to_numpy(),
+                               x=coordinate(events_df.loc[is_shot], 'flippedX'))
+        self.shots = pd.concat([shots.assign(against=False), against.assign(against=True)], ignore_index=True)
+
+        passes = events_df.loc[category_mask(events_df['type'], 'Pass') &
+                               category_mask(events_df['outcomeType'], ['Successful', 'Unsuccessful'])]
+        successful = category_mask(passes['outcomeType'], 'Successful')
+        self.passes = passes[['matchId', 'teamId', 'x', 'y', 'endX', 'endY', 'playerName', 'minute']].assign(
+            successful=successful, intoBox=into_zone(passes, PENALTY_BOX) & successful,
+            **{column: coordinate(passes, column) for column in STATSBOMB_COLUMNS.values()}).reset_index(drop=True)
+
+        self.network = pass_edges(events_df)
+        names = events_df.loc[events_df['playerId'].notna().to_numpy()].drop_duplicates('playerId')
+        self.player_names = pd.Series(names['playerName'].astype(str).to_numpy(),
+                                      index=names['playerId'].to_numpy(dtype=np.int64))
+
+        # one groupby per table: team -> positions of its rows
+        self._rows = {name: getattr(self, name).groupby('teamId', sort=False).indices
+                      for name in ('shots', 'passes', 'network')}
+
+    @property
+    def version(self):
+        """Changes with the matches and events aggregated, for keys of anything drawn from them."""
+        ids = ','.join(map(str, self.match_ids))
+        return hashlib.sha1(f'{self.n_events}:{ids}'.encode()).hexdigest()[:12]
+
+    def rows(self, name, team_id, match_ids=None):
+        """Rows of one table ('shots', 'passes' or 'network') of a team, in all or in the given matches."""
+        table = getattr(self, name)
+        rows = table.take(self._rows[name].get(int(team_id), []))
+        if match_ids is not None:
+            rows = rows.loc[rows['matchId'].isin(list(match_ids)).to_numpy()]
+        return rows.reset_index(drop=True)
+
+    def team_match_ids(self, team_id, match_ids=None):
+        """Matches of a team, all of them or those among ``match_ids``."""
+        shots_and_passes = np.r_[self.rows('passes', team_id, match_ids)['matchId'].to_numpy(),
+                                 self.rows('shots', team_id, match_ids)['matchId'].to_numpy()]
+        return sorted(np.unique(shots_and_passes).tolist())
@@ -0,0 +1,183 @@
+"""
+Geometry API: the data behind each view, for clients that draw it themselves.
+
+    uvicorn api:app
+
+GET /views                                         view names and their URL slugs
+GET /matches                                       match ids and "Home vs Away" labels
+GET /matches/{match_id}/teams                      the two teams of a match
+GET /matches/{match_id}/teams/{team_id}/{view}     layers of a view (see layers.py) as JSON,
+    ?format=arrow&layer=edges                      or one layer as an Arrow IPC stream
+
+View parameters are query parameters: minute_start and minute_end (pass
+network, PV formation map), max_line_width, n_clusters (one of K_VALUES of
+pass_clusters.py), category and statistic (positional heatmap) and player
+(defensive line, required; positional heatmap), one of the team's players
+in the match.
+
+Nothing is rendered. Responses are cached per (match, team, view,
+parameters, format, data version) and carry an ETag derived from that key,
+so a request with a matching If-None-Match is answered with 304 before any
+layer is computed.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pyarrow as pa
+from cachetools import LRUCache, cached
+from fastapi import FastAPI, HTTPException, Request, Response
+
+from eventstore import EventIndex, partition_path, read_match_events
+from lineups import match_lineups
+from matches import MatchCatalog
+from pass_clusters import K_VALUES
+from render_cache import file_version
+from spatial import CATEGORIES, STATISTICS
+from views import VIEWS, MatchContext, slug, view_layers
+
+
+# bump when the layers change, so clients do not keep stale ETags
+LAYERS_VERSION = 5
+
+RESPONSE_CACHE_SIZE = 512
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+VIEW_SLUGS = {slug(view): view for view in VIEWS}
+
+
+def _json_column(series):
+    if series.dtype.kind == 'f':
+        # four decimals of a pitch unit is plenty, and keeps the payload small
+        values = np.round(series.to_numpy(dtype=float), 4)
+        return [None if np.isnan(value) else float(value) for value in values]
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def layers_json(layers):
+    """JSON bytes of Layers: every table column by column, and the values."""
+    payload = {
+        'tables': {name: {column: _json_column(table[column]) for column in table.columns}
+                   for name, table in layers.tables.items()},
+        'values': layers.values,
+    }
+    return json.dumps(payload, separators=(',', ':'), default=str).encode()
+
+
+def layer_arrow(layers, name):
+    """Arrow IPC stream bytes of one table of Layers, the values in the schema metadata."""
+    table = pa.Table.from_pandas(layers.tables[name], preserve_index=False)
+    table = table.replace_schema_metadata({'values': json.dumps(layers.values, default=str)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def create_app(store_path='events_store', matches_path='matches_data.json'):
+    """The API over an event store and matches_data.json, loaded on the first request."""
+    api = FastAPI(title='Football Visualizer geometry API')
+    lock = threading.Lock()
+    responses = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+
+    @lru_cache(maxsize=1)
+    def catalog():
+        return MatchCatalog(matches_path)
+
+    @cached(LRUCache(maxsize=32), lock=threading.Lock())
+    def match_events(match_id):
+        return EventIndex(read_match_events(store_path, match_id)).match(match_id)
+
+    def match_data_or_404(match_id):
+        if match_id not in catalog() or not os.path.exists(partition_path(store_path, match_id)):
+            raise HTTPException(404, f'unknown match {match_id}')
+        return catalog().get(match_id)
+
+    @api.get('/views')
+    def views():
+        return [{'slug': view_slug, 'name': view} for view_slug, view in VIEW_SLUGS.items()]
+
+    @api.get('/matches')
+    def matches():
+        return [{'matchId': match_id, 'label': catalog().label(match_id)} for match_id in catalog().match_ids()]
+
+    @api.get('/matches/{match_id}/teams')
+    def teams(match_id: int):
+        match_data_or_404(match_id)
+        return catalog().headers[match_id]
+
+    @api.get('/matches/{match_id}/teams/{team_id}/{view_slug}')
+    def layers(match_id: int, team_id: int, view_slug: str, request: Request, format: str = 'json',
+               layer: str | None = None, minute_start: float | None = None, minute_end: float | None = None,
+               max_line_width: float | None = None, n_clusters: int | None = None, category: str | None = None,
+               statistic: str | None = None, player: str | None = None):
+        if view_slug not in VIEW_SLUGS:
+            raise HTTPException(404, f'unknown view {view_slug!r}, one of {sorted(VIEW_SLUGS)}')
+        if format not in ('json', 'arrow'):
+            raise HTTPException(422, "format must be 'json' or 'arrow'")
+        view = VIEW_SLUGS[view_slug]
+        match_data = match_data_or_404(match_id)
+        venues = {match_data[venue]['teamId']: venue for venue in ('home', 'away')}
+        if team_id not in venues:
+            raise HTTPException(404, f'team {team_id} did not play match {match_id}')
+        if view == 'Defensive Line' and player is None:
+            raise HTTPException(422, 'the defensive line needs a player')
+        if n_clusters is not None and n_clusters not in K_VALUES:
+            raise HTTPException(422, f'n_clusters must be one of {list(K_VALUES)}')
+        if category is not None and category not in CATEGORIES:
+            raise HTTPException(422, f'category must be one of {list(CATEGORIES)}')
+        if statistic is not None and statistic not in STATISTICS:
+            raise HTTPException(422, f'statistic must be one of {list(STATISTICS)}')
+        if player is not None and 'player' in VIEWS[view][1]:
+            events_df = match_events(match_id)
+            team_players = set(events_df.loc[events_df['teamId'].to_numpy() == team_id, 'playerName']
+                               .dropna().astype(str))
+            if player not in team_players:
+                raise HTTPException(422, f'{player!r} is not a player of team {team_id} in match {match_id}')
+
+        params = {name: value for name, value in (('max_line_width', max_line_width), ('n_clusters', n_clusters),
+                                                  ('category', category), ('statistic', statistic),
+                                                  ('player', player)) if value is not None}
+        if minute_start is not None or minute_end is not None:
+            params['minute_range'] = (minute_start or 0, minute_end if minute_end is not None else float('inf'))
+        params = {name: value for name, value in params.items() if name in VIEWS[view][1]}
+
+        data_version = file_version(partition_path(store_path, match_id), matches_path)
+        key = json.dumps([LAYERS_VERSION, match_id, team_id, view, params, format, layer, data_version],
+                         sort_keys=True, default=str)
+        etag = '"{}"'.format(hashlib.sha1(key.encode()).hexdigest())
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if_none_match = request.headers.get('if-none-match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return Response(status_code=304, headers=headers)
+
+        with lock:
+            cached_response = responses.get(etag)
+        if cached_response is None:
+            opp_venue = 'away' if venues[team_id] == 'home' else 'home'
+            ctx = MatchContext(match_id, match_data, match_events(match_id), team_id,
+                               match_data[venues[team_id]]['name'], match_data[opp_venue]['teamId'],
+                               match_data[opp_venue]['name'], match_lineups(match_data))
+            result = view_layers(view, ctx, **params)
+            if format == 'json':
+                cached_response = (layers_json(result), 'application/json')
+            else:
+                name = layer if layer is not None else next(iter(result.tables))
+                if name not in result.tables:
+                    raise HTTPException(404, f'unknown layer {name!r}, one of {sorted(result.tables)}')
+                cached_response = (layer_arrow(result, name), ARROW_MEDIA_TYPE)
+            with lock:
+                responses[etag] = cached_response
+
+        body, media_type = cached_response
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    return api
+
+
+app = create_app()
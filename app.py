@@ -1,15 +1,20 @@
+import os
 import streamlit as st
 import pandas as pd
-import json
-from visuals import (
-    createShotmap,
-    createPassNetworks,
-    getTeamTotalPasses,
-    getTeamSuccessfulBoxPasses,
-    createPVFormationMap,
-    clusters,
-    defline,
+from aggregates import AGGREGATE_COLUMNS, TeamAggregates
+from defensive import INDEX_COLUMNS, DefensiveIndex
+from eventstore import (
+    EventIndex, convert_events_csv, partition_path, read_match_events, read_season_events, store_match_ids
 )
+from matches import MatchCatalog
+from pass_clusters import K_VALUES, match_cluster_scores, season_pass_clusters
+from pass_graphs import season_pass_graphs, season_ranking
+from spatial import BINS_FILE, CATEGORIES, season_spatial_bins
+from timeline import match_timeline
+from figures import figure_stats
+from render_cache import RenderCache, encode_figure, file_version
+from render_service import RenderService, RenderTimeout, ServiceBusy
+from views import VIEWS, MatchContext, render_view, view_params
 
 # ==========================================================
 # Page setup
@@ -21,19 +26,79 @@ st.title("English Premier League 24/25 Match Visualizer")
 # Load CSVs and JSON
 # ==========================================================
 @st.cache_data
-def load_data(events_path, teams_path, json_path):
-    events_df = pd.read_csv(events_path)
+def load_data(events_path, store_path, teams_path):
+    # one-time conversion of the season CSV into per-match Parquet partitions; the
+    # store directory only appears once complete, so an interrupted run converts again
+    if not os.path.isdir(store_path):
+        convert_events_csv(events_path, store_path)
+    match_ids = store_match_ids(store_path)
     teams_df = pd.read_csv(teams_path)
-    with open(json_path, "r", encoding="utf-8") as f:
-        matches = json.load(f)
-    return events_df, teams_df, matches
+    return match_ids, teams_df
+
+
+# matches_data.json is scanned once into an id-keyed catalog, single matches
+# are parsed on demand; the season players/formations tables are built in the same pass
+@st.cache_resource
+def load_match_catalog(json_path, team_name_map):
+    return MatchCatalog(json_path, team_names=team_name_map, lineups=True)
+
+
+# one render service for every session: identical requests in flight share one render
+@st.cache_resource
+def load_render_service(cache_dir):
+    return RenderService(RenderCache(cache_dir))
+
+
+# season pass clusters, fitted once and saved in the store; a new match in the
+# store is one more partial fit
+@st.cache_resource
+def load_season_clusters(store_path, n_clusters, match_ids):
+    return season_pass_clusters(store_path, n_clusters=n_clusters)
+
+
+# successful defensive actions of the whole season, read once from the store
+# columns they need; a player's season trend is a groupby over it
+@st.cache_resource
+def load_season_defensive_index(store_path, match_ids):
+    columns = INDEX_COLUMNS + ["outcomeType"]
+    return DefensiveIndex(read_season_events(store_path, columns=columns, match_ids=list(match_ids)))
+
+
+# counts and EPV of the whole season on the positional-play cells, binned once
+# and saved in the store; season heatmaps are sums over them
+@st.cache_resource
+def load_season_spatial_bins(store_path, match_ids):
+    return season_spatial_bins(store_path)
+
+
+# shots, passes and pass recipients of the whole season grouped by team once; a
+# season (or match-set) view is a lookup of the team's rows, its layers cached
+@st.cache_resource
+def load_season_team_aggregates(store_path, match_ids):
+    return TeamAggregates(read_season_events(store_path, columns=AGGREGATE_COLUMNS, match_ids=list(match_ids)))
+
+
+# per-player network metrics of every match of the season, computed in one batch
+# over the sparse season networks saved in the store
+@st.cache_resource
+def load_season_network_metrics(store_path, match_ids):
+    return season_pass_graphs(store_path).metrics()
+
+
+# cache_resource hands every rerun the same index object, so selecting a
+# match or a team is a slice of it rather than a fresh scan and copy
+@st.cache_resource(max_entries=32)
+def load_match_index(store_path, match_id):
+    return EventIndex(read_match_events(store_path, match_id))
 
 
 events_path = "events.csv"
+store_path = "events_store"
 teams_path = "teams.csv"
 match_data_path = "matches_data.json"
+render_cache_path = ".render_cache"
 
-events_df, teams_df, matches = load_data(events_path, teams_path, match_data_path)
+match_ids, teams_df = load_data(events_path, store_path, teams_path)
 #st.sidebar.success(f"Loaded {len(matches)} matches from data.json")
 
 # ==========================================================
@@ -43,34 +108,29 @@ events_df, teams_df, matches = load_data(events_path, teams_path, match_data_pat
 # match_id = st.sidebar.selectbox("Select Match", match_ids)
 #
 
-match_ids = sorted(events_df["matchId"].unique().tolist())
-
 # map team_id -> team_name (from teams.csv)
-team_name_map = dict(zip(teams_df["team_id"], teams_df["team_name"]))
+team_name_map = dict(zip(teams_df["team_id"].tolist(), teams_df["team_name"]))
 
-# map match_id -> "Home vs Away" label (use JSON for home/away order)
-id_to_label = {}
-for m in matches:
-    hid, aid = m["home"]["teamId"], m["away"]["teamId"]
-    hname = team_name_map.get(hid, m["home"]["name"])
-    aname = team_name_map.get(aid, m["away"]["name"])
-    id_to_label[m["matchId"]] = f"{hname} vs {aname}"
+# "Home vs Away" labels are precomputed by the catalog (JSON gives home/away order)
+catalog = load_match_catalog(match_data_path, team_name_map)
+lineups = catalog.lineups
+render_service = load_render_service(render_cache_path)
 
 match_id = st.sidebar.selectbox(
     "Select Match",
     match_ids,
-    format_func=lambda mid: id_to_label.get(mid, str(mid)),
+    format_func=catalog.label,
 )
 
 # # Match dictionary
-this_match = next(m for m in matches if str(m["matchId"]) == str(match_id))
-match_data = this_match
+match_data = catalog.get(match_id)
 
 # ==========================================================
 # Prepare team data
 # ==========================================================
-match_events = events_df[events_df["matchId"] == match_id].copy()
-match_team_ids = match_events["teamId"].unique()
+event_index = load_match_index(store_path, match_id)
+match_events = event_index.match(match_id)
+match_team_ids = event_index.team_ids(match_id)
 
 team_names = []
 for tid in match_team_ids:
@@ -90,101 +150,136 @@ st.write(f"### Match {match_id}: {team_name} vs {opp_name}")
 # ==========================================================
 viz_choice = st.sidebar.selectbox(
     "Select Visualization Type",
-    [
-        "Shot Map",
-        "Pass Network",
-        "Successful Box Passes",
-        "Total Passes",
-        "PV Formation Map",
-        "Pass Clusters",
-        "Defensive Line",
-    ],
+    list(VIEWS),
 )
 
-team_events = match_events[match_events["teamId"] == team_id].copy()
+team_events = event_index.team(match_id, team_id)
+
+# restrict the pass-based views to the minutes the starting XI played together
+minute_range = None
+if viz_choice in ("Pass Network", "PV Formation Map"):
+    if st.sidebar.checkbox("Starting XI period only"):
+        timeline = match_timeline(match_data, match_events, lineups)
+        minute_range = timeline.first_xi_period(team_id)
+        st.sidebar.caption(f"Minutes {minute_range[0]:.0f}-{minute_range[1]:.0f}")
+    elif viz_choice == "Pass Network":
+        # any window is two rows of the match's per-minute prefix sums, so dragging the slider is cheap
+        match_end = int(match_events["minute"].max()) + 1
+        window = st.sidebar.slider("Minutes", 0, match_end, (0, match_end))
+        minute_range = window if window != (0, match_end) else None
 
 # ==========================================================
 # Visualizations
 # ==========================================================
-if viz_choice == "Shot Map":
-    fig = createShotmap(
-        events_df=match_events,
-        hometeam=team_name,
-        awayteam=opp_name,
-        homeid=team_id,
-        awayid=opp_id,
-        pitchcolor="#171717",
-        shotcolor="grey",
-        goalcolor="gold",
-        titlecolor="white",
-        legendcolor="white",
-        marker_size=300,
-    )
-    #st.sidebar.write({
-    #   "home shots raw": int((match_events['teamId'] == team_id).sum()),
-    #   "shot rows (any team)": int((match_events['type'].astype(str).str.lower().eq('goal') |
-    #                                 match_events['type'].astype(str).str.lower().str.contains('shot')).sum()),
-    #})
-    st.pyplot(fig)
-
-elif viz_choice == "Pass Network":
-    fig = createPassNetworks(
-        match_data,
-        match_events,
-        matchId=match_id,
-        team=team_name,
-        max_line_width=8,
-        marker_size=300,
-        edgewidth=2,
-        dh_arrow_width=15,
-        marker_color="#FFDD57",
-        marker_edge_color="black",
-        shrink=5,
-    )
-    st.pyplot(fig)
+params = {}
+if viz_choice in ("Pass Network", "PV Formation Map"):
+    params["minute_range"] = minute_range
+if viz_choice == "Pass Network":
+    params["include_subs"] = st.sidebar.checkbox("Include substitutes")
+    show_centrality = st.sidebar.checkbox("Season centrality")
+
+team_aggregates = None
+if viz_choice in ("Shot Map", "Pass Network", "Successful Box Passes", "Total Passes"):
+    params["season"] = st.sidebar.checkbox("Season aggregate")
+    if params["season"]:
+        team_aggregates = load_season_team_aggregates(store_path, tuple(match_ids))
+        team_matches = team_aggregates.team_match_ids(team_id)
+        chosen = st.sidebar.multiselect("Matches", team_matches, default=team_matches, format_func=catalog.label)
+        params["match_ids"] = sorted(chosen) if len(chosen) < len(team_matches) else None
 
-elif viz_choice == "Successful Box Passes":
-    fig = getTeamSuccessfulBoxPasses(
-        match_data, match_events, team_name, pitch_color="#171717", cmap="plasma"
+if viz_choice == "Defensive Line":
+    def_players = sorted(
+        team_events["playerName"].dropna().unique().tolist()
     )
-    st.pyplot(fig)
+    if not def_players:
+        st.info("No players found for the selected team in this match.")
+        st.stop()
+    params["player"] = st.sidebar.selectbox("Select Player", def_players)
+
+if viz_choice == "Positional Heatmap":
+    params["category"] = st.sidebar.selectbox("Events", list(CATEGORIES))
+    params["statistic"] = st.sidebar.radio("Statistic", ["count", "EPV"], horizontal=True)
+    heatmap_players = sorted(team_events["playerName"].dropna().unique().tolist())
+    heatmap_player = st.sidebar.selectbox("Player", ["Whole team"] + heatmap_players)
+    params["player"] = None if heatmap_player == "Whole team" else heatmap_player
+    params["season"] = st.sidebar.checkbox("Whole season")
 
-elif viz_choice == "Total Passes":
-    fig = getTeamTotalPasses(
-        match_events, team_id, team_name, opp_name, pitch_color="#171717"
+if viz_choice == "Pass Clusters":
+    # every count of the slider is fitted at once and cached, moving it redraws without refitting
+    params["n_clusters"] = st.sidebar.slider(
+        "Number of Clusters", min(K_VALUES), max(K_VALUES), VIEWS[viz_choice][1]["n_clusters"]
     )
-    st.pyplot(fig)
-
-elif viz_choice == "PV Formation Map":
-    fig = createPVFormationMap(
-        match_data,
-        match_events,
-        team=team_name,
-        color_palette="coolwarm",
-        markerstyle="o",
-        markersize=500,
-        markeredgewidth=2,
-        labelsize=10,
-        labelcolor="white",
+    cluster_numbers = list(range(1, params["n_clusters"] + 1))
+    params["show"] = sorted(st.sidebar.multiselect(
+        "Show Clusters (1 = most passes)", cluster_numbers, default=cluster_numbers
+    ))
+    params["season"] = st.sidebar.checkbox(
+        "Season clusters", help="Assign the passes to clusters fitted on the whole season, the same in every match"
     )
-    st.pyplot(fig)
+    if not params["season"]:
+        scores = match_cluster_scores(team_events, team_id).dropna(subset=["silhouette"])
+        if not scores.empty:
+            best = scores.loc[scores["silhouette"].idxmax()]
+            st.sidebar.caption(f"Best silhouette: {best['silhouette']:.2f} with {best['n_clusters']:.0f} clusters")
 
-elif viz_choice == "Pass Clusters":
-    fig = clusters(match_events, team_id)
-    st.pyplot(fig)
-
-elif viz_choice == "Defensive Line":
-    #player = st.sidebar.text_input("Enter Player Name:")
-    #if player:
-    #    fig = defline(match_events, team_id, player)
-    #    st.pyplot(fig)
-    def_players = sorted(
-        team_events["playerName"].dropna().unique().tolist()
+# rendered images are cached on (match, team, view, parameters, data version),
+# a hit is served without drawing anything; a miss is rendered on the service's
+# workers, once however many sessions ask for it at the same time
+season_clusters = None
+spatial_bins = None
+data_version = file_version(partition_path(store_path, match_id), match_data_path)
+if params.get("season") and viz_choice == "Pass Clusters":
+    season_clusters = load_season_clusters(store_path, params["n_clusters"], tuple(match_ids))
+    data_version = f"{data_version}.{season_clusters.version}"
+if params.get("season") and viz_choice == "Positional Heatmap":
+    spatial_bins = load_season_spatial_bins(store_path, tuple(match_ids))
+    data_version = f"{data_version}.{file_version(os.path.join(store_path, BINS_FILE))}"
+if team_aggregates is not None:
+    data_version = f"{data_version}.{team_aggregates.version}"
+ctx = MatchContext(match_id, match_data, match_events, team_id, team_name, opp_id, opp_name, lineups,
+                   season_clusters, spatial_bins, team_aggregates)
+cache_key = RenderCache.key(match_id, team_id, viz_choice, view_params(viz_choice, **params), data_version)
+try:
+    image = render_service.render(
+        cache_key, lambda: encode_figure(render_view(viz_choice, ctx, **params))
     )
+except ServiceBusy:
+    st.warning("Too many visualizations are being drawn right now, please try again in a moment.")
+    st.stop()
+except RenderTimeout:
+    st.warning("This visualization is taking longer than usual, it will be ready if you reload shortly.")
+    st.stop()
+st.image(image, width="stretch")
 
-    if def_players:
-        player = st.sidebar.selectbox("Select Player", def_players)
-        fig = defline(match_events, team_id, player)
-        st.pyplot(fig)
-    else:
-        st.info("No players found for the selected team in this match.")
+if viz_choice == "Defensive Line":
+    season_index = load_season_defensive_index(store_path, tuple(match_ids))
+    player_id = season_index.player_id(team_id, params["player"])
+    if player_id is not None:
+        trend = season_index.line_trend(team_id, player_id)
+        st.write(f"#### {params['player']}: average defensive action height per match")
+        st.line_chart(trend.assign(match=range(1, len(trend) + 1)), x="match", y="line")
+
+if viz_choice == "Pass Network" and show_centrality:
+    network_metrics = load_season_network_metrics(store_path, tuple(match_ids))
+    ranking = season_ranking(network_metrics, team_id)
+    st.write(f"#### {team_name}: pass network centrality, season average per match")
+    st.dataframe(ranking.drop(columns=["teamId", "playerId"]), hide_index=True)
+
+# ==========================================================
+# Render diagnostics
+# ==========================================================
+# figures are drawn outside pyplot and released once encoded, so "live" and
+# "pyplot" should stay near zero however long the server runs
+with st.sidebar.expander("Render stats"):
+    stats = figure_stats()
+    rss = stats["rss_bytes"]
+    st.caption(
+        f"Figures: {stats['created']} created, {stats['closed']} closed, {stats['live']} live, "
+        f"{stats['pyplot']} in pyplot"
+    )
+    st.caption(f"Memory (RSS): {rss / 2**20:.0f} MiB" if rss is not None else "Memory (RSS): n/a")
+    jobs = render_service.stats()
+    st.caption(
+        f"Renders: {jobs['rendered']} drawn, {jobs['cache_hits']} cached, {jobs['coalesced']} shared, "
+        f"{jobs['pending']} pending, {jobs['rejected']} refused, {jobs['timeouts']} timed out"
+    )
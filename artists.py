@@ -0,0 +1,125 @@
+"""
+Batched artists for the visuals.
+
+Pass networks used to add one ConnectionPatch per edge and one text per
+player, which is hundreds of artists for season or substitute-inclusive
+networks, each drawn, clipped and measured on its own. The collections
+here draw all the edges of one arrow style, or all the labels, as a
+single artist, with the per-item widths and colours as arrays.
+"""
+import numpy as np
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.font_manager import FontProperties
+from matplotlib.patches import ArrowStyle, ConnectionStyle
+from matplotlib.textpath import TextPath, TextToPath
+from matplotlib.transforms import IdentityTransform
+
+
+class ArrowCollection(PathCollection):
+    """
+    Arrows between pairs of points, drawn like ``ConnectionPatch`` in data
+    coordinates with the given arrow style.
+
+    Parameters
+    ----------
+    start, end : (N, 2) arrays of data coordinates.
+
+    arrowstyle : matplotlib arrow style name, e.g. 'simple' or '<|-|>'.
+
+    shrink : points cut off both ends of every arrow.
+
+    mutation_scale, linewidths : scalar or one value per arrow, in points.
+
+    colors : colour or one colour per arrow, used for both edge and fill.
+    """
+
+    def __init__(self, start, end, arrowstyle='simple', shrink=0, mutation_scale=1, linewidths=1,
+                 colors='white', **kwargs):
+        kwargs.setdefault('capstyle', 'butt')
+        kwargs.setdefault('joinstyle', 'miter')
+        # the paths are built in display coordinates at draw time
+        super().__init__([], transform=IdentityTransform(), **kwargs)
+        self._start = np.asarray(start, dtype=float).reshape(-1, 2)
+        self._end = np.asarray(end, dtype=float).reshape(-1, 2)
+        n_arrows = len(self._start)
+        self._arrowstyle = ArrowStyle(arrowstyle)
+        self._connectionstyle = ConnectionStyle('arc3')
+        self._shrink = shrink
+        self._mutation_scale = np.broadcast_to(np.asarray(mutation_scale, dtype=float), n_arrows)
+        self._arrow_linewidths = np.broadcast_to(np.asarray(linewidths, dtype=float), n_arrows)
+        self._arrow_colors = np.broadcast_to(to_rgba_array(colors), (n_arrows, 4))
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        dpi_cor = renderer.points_to_pixels(1.)
+        start = self.axes.transData.transform(self._start)
+        end = self.axes.transData.transform(self._end)
+
+        paths, facecolors, edgecolors, linewidths = [], [], [], []
+        for pos_a, pos_b, scale, width, color in zip(start, end, self._mutation_scale, self._arrow_linewidths,
+                                                     self._arrow_colors):
+            path = self._connectionstyle(pos_a, pos_b, shrinkA=self._shrink * dpi_cor,
+                                         shrinkB=self._shrink * dpi_cor)
+            path, fillable = self._arrowstyle(path, scale * dpi_cor, width * dpi_cor, 1)
+            if not np.iterable(fillable):
+                path, fillable = [path], [fillable]
+            for part, fill in zip(path, fillable):
+                paths.append(part)
+                facecolors.append(color if fill else (0, 0, 0, 0))
+                edgecolors.append(color)
+                linewidths.append(width)
+
+        self.set_paths(paths)
+        self.set_facecolor(facecolors)
+        self.set_edgecolor(edgecolors)
+        self.set_linewidth(linewidths)
+        super().draw(renderer)
+
+
+class LabelCollection(PathCollection):
+    """
+    Text labels centred on points, drawn as one collection of glyph outlines.
+
+    Parameters
+    ----------
+    labels : strings (or values converted with str) to draw.
+
+    offsets : (N, 2) array of the label centres.
+
+    size : font size in points.
+
+    family, weight : font properties of the labels.
+
+    color : colour of the labels.
+    """
+
+    def __init__(self, labels, offsets, size=10, family='DejaVu Sans', weight='normal', color='white', **kwargs):
+        prop = FontProperties(family=family, weight=weight, size=size)
+        # centred the way Text centres a line: on the box from the descent to the ascent of 'lp'
+        _, lp_height, lp_descent = TextToPath().get_text_width_height_descent('lp', prop, ismath=False)
+        paths = []
+        for label in labels:
+            label = str(label)
+            width, height, descent = TextToPath().get_text_width_height_descent(label, prop, ismath=False)
+            height, descent = max(height, lp_height), max(descent, lp_descent)
+            paths.append(TextPath((-width / 2, descent - height / 2), label, size=size, prop=prop))
+        # glyphs are in points, scaled to pixels by the unit sizes and placed at the offsets
+        super().__init__(paths, sizes=np.ones(len(paths)), offsets=np.asarray(offsets, dtype=float).reshape(-1, 2),
+                         transform=IdentityTransform(), facecolors=color, edgecolors='none', linewidths=0,
+                         **kwargs)
+
+
+def draw_arrows(ax, start, end, **kwargs):
+    """Add an ArrowCollection from ``start`` to ``end`` (data coordinates) to ``ax`` and return it."""
+    arrows = ArrowCollection(start, end, **kwargs)
+    ax.add_collection(arrows, autolim=False)
+    return arrows
+
+
+def draw_labels(ax, labels, xy, **kwargs):
+    """Add a LabelCollection centred on ``xy`` (data coordinates) to ``ax`` and return it."""
+    collection = LabelCollection(labels, xy, offset_transform=ax.transData, **kwargs)
+    ax.add_collection(collection, autolim=False)
+    return collection
@@ -0,0 +1,72 @@
+"""
+Pitch coordinate frames of the events, computed once when they load.
+
+Events are stored in Opta units: a 100 x 100 pitch, x towards the goal the
+team attacks and y from its right touchline to its left. The views drawn
+on a StatsBomb pitch (120 x 80, y from the left touchline down) and the shot
+map, which mirrors the opponent's shots onto the other half, read float32
+columns that add_coordinate_columns puts next to the Opta ones when a
+partition is read (see eventstore.py), instead of converting and copying
+the coordinates on every render.
+"""
+import numpy as np
+import pandas as pd
+
+
+OPTA_LENGTH = OPTA_WIDTH = 100.0
+STATSBOMB_LENGTH, STATSBOMB_WIDTH = 120.0, 80.0
+
+
+def statsbomb_x(x):
+    """Opta x as StatsBomb x, float32."""
+    return np.asarray(x, dtype=np.float32) * np.float32(STATSBOMB_LENGTH / OPTA_LENGTH)
+
+
+def statsbomb_y(y):
+    """Opta y as StatsBomb y (which runs the other way), float32."""
+    return np.float32(STATSBOMB_WIDTH) - np.float32(STATSBOMB_WIDTH / OPTA_WIDTH) * np.asarray(y, dtype=np.float32)
+
+
+def flipped_x(x):
+    """Opta x seen in the other team's attacking direction, float32."""
+    return np.float32(OPTA_LENGTH) - np.asarray(x, dtype=np.float32)
+
+
+# derived column -> (transform, Opta column it is computed from)
+COORDINATE_COLUMNS = {
+    'sbX': (statsbomb_x, 'x'),
+    'sbY': (statsbomb_y, 'y'),
+    'sbEndX': (statsbomb_x, 'endX'),
+    'sbEndY': (statsbomb_y, 'endY'),
+    'flippedX': (flipped_x, 'x'),
+}
+
+# StatsBomb column of every Opta coordinate
+STATSBOMB_COLUMNS = {'x': 'sbX', 'y': 'sbY', 'endX': 'sbEndX', 'endY': 'sbEndY'}
+
+
+def add_coordinate_columns(events_df):
+    """Add the COORDINATE_COLUMNS of the Opta coordinates an events frame has, in place."""
+    for column, (transform, source) in COORDINATE_COLUMNS.items():
+        if source in events_df.columns:
+            events_df[column] = transform(events_df[source].to_numpy())
+    return events_df
+
+
+def coordinate(events_df, column):
+    """One of COORDINATE_COLUMNS as an array, the precomputed column when the frame has it."""
+    if column in events_df.columns:
+        return events_df[column].to_numpy()
+    transform, source = COORDINATE_COLUMNS[column]
+    return transform(events_df[source].to_numpy())
+
+
+def statsbomb_coordinates(events_df, columns=('x', 'y', 'endX', 'endY')):
+    """DataFrame of the given Opta coordinates of an events frame in StatsBomb units, under the Opta names."""
+    return pd.DataFrame({column: coordinate(events_df, STATSBOMB_COLUMNS[column]) for column in columns})
+
+
+def normalize(values, actual, desired):
+    """Rescale values from the ``actual`` (lower, upper) range onto the ``desired`` one, as floats."""
+    values = np.asarray(values, dtype=float)
+    return desired[0] + (values - actual[0]) * (desired[1] - desired[0]) / (actual[1] - actual[0])
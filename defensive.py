@@ -0,0 +1,120 @@
+"""
+Index of successful defensive actions.
+
+The successful defensive actions of a match (or of a whole season) are
+kept in one table, stably sorted by (teamId, playerId), with the action
+type as a bit of the ``action`` column. A team or a player is a dict
+lookup plus an ``iloc`` slice, and a subset of action types is one ``&``
+on that slice, so the defensive views never scan the events frame again.
+"""
+import threading
+
+import numpy as np
+from cachetools import LRUCache, cached
+
+from eventstore import frame_key
+from schema import category_mask
+
+
+DEFENSIVE_TYPES = ['Interception', 'BallRecovery', 'BlockedPass', 'Clearance', 'Tackle', 'Aerial']
+
+# action type -> its bit in the action column
+ACTION_BITS = {action_type: 1 << i for i, action_type in enumerate(DEFENSIVE_TYPES)}
+
+ALL_ACTIONS = sum(ACTION_BITS.values())
+
+INDEX_COLUMNS = ['matchId', 'teamId', 'playerId', 'playerName', 'minute', 'x', 'y', 'type']
+
+INDEX_CACHE_SIZE = 32
+
+
+def action_mask(action_types):
+    """Bitmask of the given action types."""
+    if isinstance(action_types, str):
+        action_types = [action_types]
+    return sum(ACTION_BITS[action_type] for action_type in action_types)
+
+
+class DefensiveIndex:
+    """
+    Parameters
+    ----------
+    events_df : events of a match or of several matches, with at least
+                matchId, teamId, playerId, playerName, minute, x, y, type and outcomeType.
+    """
+
+    def __init__(self, events_df):
+        successful = category_mask(events_df['type'], DEFENSIVE_TYPES) & \
+            category_mask(events_df['outcomeType'], 'Successful') & events_df['playerId'].notna().to_numpy()
+        table = events_df.loc[successful, [c for c in INDEX_COLUMNS if c in events_df.columns]]
+
+        types = table['type'].astype(str).to_numpy()
+        action = np.zeros(len(table), dtype=np.uint8)
+        for action_type, bit in ACTION_BITS.items():
+            action[types == action_type] = bit
+
+        team_col = table['teamId'].to_numpy(dtype=np.int64)
+        player_col = table['playerId'].to_numpy(dtype=np.int64)
+        order = np.lexsort((player_col, team_col))
+        self.table = table.take(order).reset_index(drop=True)
+        self.table['action'] = action[order]
+
+        team_col = team_col[order]
+        player_col = player_col[order]
+        n_rows = len(order)
+
+        starts = np.flatnonzero(np.r_[True, (team_col[1:] != team_col[:-1]) |
+                                      (player_col[1:] != player_col[:-1])]) if n_rows else np.array([], int)
+        stops = np.r_[starts[1:], n_rows]
+        self._players = {(int(team_col[start]), int(player_col[start])): (int(start), int(stop))
+                         for start, stop in zip(starts, stops)}
+        self._teams = {}
+        for (team_id, _), (start, stop) in self._players.items():
+            team_start, _ = self._teams.get(team_id, (start, stop))
+            self._teams[team_id] = (team_start, stop)
+
+    def _slice(self, start, stop, actions):
+        rows = self.table.iloc[start:stop]
+        if actions == ALL_ACTIONS:
+            return rows
+        return rows.loc[(rows['action'].to_numpy() & actions) != 0]
+
+    def team(self, team_id, actions=ALL_ACTIONS):
+        """Actions of a team whose type is in the ``actions`` bitmask."""
+        start, stop = self._teams.get(int(team_id), (0, 0))
+        return self._slice(start, stop, actions)
+
+    def player(self, team_id, player_id, actions=ALL_ACTIONS):
+        """Actions of a player of a team whose type is in the ``actions`` bitmask."""
+        start, stop = self._players.get((int(team_id), int(player_id)), (0, 0))
+        return self._slice(start, stop, actions)
+
+    def player_id(self, team_id, player_name):
+        """Id of the player of a team with the given name, None if they made no defensive action."""
+        names = self.team(team_id)[['playerId', 'playerName']]
+        ids = names.loc[names['playerName'] == player_name, 'playerId']
+        return int(ids.iloc[0]) if len(ids) else None
+
+    def line_trend(self, team_id, player_id=None):
+        """
+        Average height per match of the players of a team (or of one player):
+        the season trend, when the index holds a season.
+
+        Returns
+        -------
+        DataFrame with playerId, matchId, playerName, line (mean x, Opta units)
+        and actions (count), in match order per player.
+        """
+        actions = self.team(team_id) if player_id is None else self.player(team_id, player_id)
+        return actions.groupby(['playerId', 'matchId'], observed=True, sort=True) \
+            .agg(playerName=('playerName', 'first'), line=('x', 'mean'), actions=('x', 'size')).reset_index()
+
+
+def _index_key(events_df):
+    return frame_key(events_df, INDEX_COLUMNS + ['outcomeType'])
+
+
+@cached(LRUCache(maxsize=INDEX_CACHE_SIZE), key=_index_key, lock=threading.Lock())
+def defensive_index(events_df):
+    """The DefensiveIndex of an events frame, built once per frame."""
+    return DefensiveIndex(events_df)
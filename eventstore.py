@@ -0,0 +1,179 @@
+"""
+Partitioned Parquet store for the season events.
+
+The converter splits events.csv into one Parquet file per match
+(``<store>/<matchId>.parquet``) so the app only has to open the partition
+of the selected match, and only the columns the visuals read.
+
+    python eventstore.py events.csv events_store
+"""
+import hashlib
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from coordinates import add_coordinate_columns
+from schema import apply_event_schema
+from zones import add_zone_columns
+
+
+# columns read by visuals.py, everything else stays on disk
+EVENT_COLUMNS = ['id', 'matchId', 'minute', 'teamId', 'playerId', 'playerName', 'type', 'outcomeType',
+                 'x', 'y', 'endX', 'endY', 'EPV', 'isOwnGoal', 'cardType']
+
+PARTITION_SUFFIX = '.parquet'
+
+
+def partition_path(store_path, match_id):
+    return os.path.join(store_path, f'{int(match_id)}{PARTITION_SUFFIX}')
+
+
+def convert_events_csv(csv_path, store_path):
+    """
+    One-time conversion of the season CSV into the partitioned store.
+
+    Rows keep their original order inside each partition, the pass recipient
+    inference in visuals.py relies on it. A new store is written to
+    ``<store>.partial`` and renamed once complete, so an interrupted
+    conversion never leaves a store directory that looks finished; into
+    an existing store, partitions are replaced one file at a time.
+
+    Returns
+    -------
+    List of the match ids written.
+    """
+    events_df = apply_event_schema(pd.read_csv(csv_path, low_memory=False))
+    new_store = not os.path.isdir(store_path)
+    target_path = store_path
+    if new_store:
+        # left over by an interrupted conversion
+        target_path = os.path.normpath(store_path) + '.partial'
+        shutil.rmtree(target_path, ignore_errors=True)
+    os.makedirs(target_path, exist_ok=True)
+
+    match_ids = []
+    for match_id, match_events in events_df.groupby('matchId', sort=True):
+        table = pa.Table.from_pandas(match_events, preserve_index=False)
+        # write next to the final file and rename, so a reader never sees a partial partition
+        tmp_path = partition_path(target_path, match_id) + '.tmp'
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, partition_path(target_path, match_id))
+        match_ids.append(int(match_id))
+    if new_store:
+        os.rename(target_path, store_path)
+    return match_ids
+
+
+def store_match_ids(store_path):
+    """Match ids available in the store, read from the partition file names."""
+    return sorted(int(name[:-len(PARTITION_SUFFIX)]) for name in os.listdir(store_path)
+                  if name.endswith(PARTITION_SUFFIX))
+
+
+def _available_columns(path, columns):
+    if columns is None:
+        return None
+    names = set(pq.read_schema(path).names)
+    return [c for c in columns if c in names]
+
+
+def read_match_events(store_path, match_id, columns=EVENT_COLUMNS):
+    """
+    Read the events of a single match.
+
+    Only the requested columns are decoded; columns missing from the
+    partition are skipped so older exports still load. The frame comes back
+    with the dtypes declared in schema.py, the zone columns of zones.py and
+    the StatsBomb and flipped coordinates of coordinates.py.
+    """
+    path = partition_path(store_path, match_id)
+    events_df = apply_event_schema(pq.read_table(path, columns=_available_columns(path, columns)).to_pandas())
+    if 'x' in events_df.columns:
+        add_zone_columns(events_df)
+        add_coordinate_columns(events_df)
+    return events_df
+
+
+def read_season_events(store_path, columns=EVENT_COLUMNS, match_ids=None):
+    """Read several partitions (all of them by default) into one frame, ordered by match."""
+    if match_ids is None:
+        match_ids = store_match_ids(store_path)
+    frames = [read_match_events(store_path, match_id, columns) for match_id in match_ids]
+    # partitions can disagree on categories (e.g. playerName), re-apply after the concat
+    return apply_event_schema(pd.concat(frames, ignore_index=True))
+
+
+def frame_key(events_df, columns=None):
+    """
+    Cache key of the contents of an events frame: its length and a hash of
+    the rows of those of ``columns`` it has (all of them by default). Two
+    frames share a key only if they hold the same rows in the same order,
+    whatever matches, teams or slices they come from.
+    """
+    columns = [c for c in (columns if columns is not None else events_df.columns) if c in events_df.columns]
+    rows = pd.util.hash_pandas_object(events_df[columns], index=False).to_numpy()
+    return len(events_df), tuple(columns), hashlib.sha1(rows.tobytes()).hexdigest()
+
+
+class EventIndex:
+    """
+    Row-slice index over an events frame.
+
+    The frame is stably sorted by matchId once, so every match is a
+    contiguous block of rows in its original (chronological) order, and
+    fetching one is a dict lookup plus an ``iloc`` slice, no boolean scan or
+    copy of the whole frame. The rows of every team within a match are kept
+    as positions, so a team is a ``take`` of its own rows, in event order.
+    """
+
+    def __init__(self, events_df):
+        match_col = events_df['matchId'].to_numpy()
+        order = np.argsort(match_col, kind='stable')
+        self.events_df = events_df.take(order).reset_index(drop=True)
+
+        match_col = match_col[order]
+        team_col = events_df['teamId'].to_numpy()[order]
+        n_rows = len(order)
+
+        match_starts = np.flatnonzero(np.r_[True, match_col[1:] != match_col[:-1]]) if n_rows else np.array([], int)
+        match_stops = np.r_[match_starts[1:], n_rows]
+        self._matches = {int(match_col[start]): (int(start), int(stop))
+                         for start, stop in zip(match_starts, match_stops)}
+
+        self._teams = {}
+        self._match_teams = {}
+        for match_id, (start, stop) in self._matches.items():
+            match_teams = team_col[start:stop]
+            # events without a team (if any) are only reachable through match()
+            team_ids = np.unique(match_teams[~pd.isna(match_teams)])
+            self._match_teams[match_id] = [int(team_id) for team_id in team_ids]
+            for team_id in team_ids:
+                self._teams[(match_id, int(team_id))] = start + np.flatnonzero(match_teams == team_id)
+
+    def match_ids(self):
+        return list(self._matches)
+
+    def team_ids(self, match_id):
+        return list(self._match_teams.get(int(match_id), []))
+
+    def match(self, match_id):
+        """All events of a match in their original order, as a slice of the indexed frame."""
+        start, stop = self._matches[int(match_id)]
+        return self.events_df.iloc[start:stop]
+
+    def team(self, match_id, team_id):
+        """Events of one team in a match, in their original order."""
+        rows = self._teams.get((int(match_id), int(team_id)), np.array([], dtype=np.int64))
+        return self.events_df.iloc[rows]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python eventstore.py <events.csv> <store directory>')
+    written = convert_events_csv(sys.argv[1], sys.argv[2])
+    print(f'wrote {len(written)} match partitions to {sys.argv[2]}')
@@ -0,0 +1,220 @@
+"""
+Headless batch export of the app's visualizations.
+
+    python export.py --out exports --formats png pdf --workers 8
+
+Every (match, team, view) job is rendered on the Agg backend by a pool of
+worker processes and written to
+
+    <out>/<matchId>/<teamId>/<view>.<format>
+    <out>/<matchId>/<teamId>/defensive-line/<player>.<format>
+
+An output newer than both the match's event partition and
+matches_data.json is up to date and not rendered again (--force renders
+it anyway). Figures are closed as soon as they are written, and workers
+are replaced after a fixed number of jobs so a long run stays bounded in
+memory.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import matplotlib
+matplotlib.use('Agg')
+
+from eventstore import EventIndex, convert_events_csv, partition_path, read_match_events, store_match_ids
+from figures import close_figure
+from lineups import match_lineups
+from matches import MatchCatalog
+from views import VIEWS, MatchContext, render_view, slug
+
+
+FORMATS = ('png', 'svg', 'pdf')
+
+# views drawn once per player rather than once per team
+PLAYER_VIEWS = {'Defensive Line'}
+
+# jobs a worker process renders before it is replaced by a fresh one
+TASKS_PER_WORKER = 64
+
+
+def output_paths(out_dir, match_id, team_id, view, formats, player=None):
+    """Paths of the files one job writes, one per format."""
+    folder = os.path.join(out_dir, str(match_id), str(team_id))
+    name = slug(view)
+    if player is not None:
+        folder, name = os.path.join(folder, name), slug(player)
+    return [os.path.join(folder, f'{name}.{fmt}') for fmt in formats]
+
+
+def is_up_to_date(paths, source_mtime):
+    """True when every path exists and is newer than the source data."""
+    try:
+        return all(os.stat(path).st_mtime >= source_mtime for path in paths)
+    except FileNotFoundError:
+        return False
+
+
+def save_figure(fig, paths, dpi=200):
+    """Write ``fig`` to each path, in the format of its extension, then close it."""
+    try:
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fmt = os.path.splitext(path)[1][1:]
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            fig.savefig(tmp_path, format=fmt, dpi=dpi, bbox_inches='tight')
+            os.replace(tmp_path, path)
+    finally:
+        close_figure(fig)
+
+
+# ==========================================================
+# Worker side
+# ==========================================================
+_worker = {}
+
+
+def _init_worker(store_path, matches_path):
+    _worker['store_path'] = store_path
+    _worker['catalog'] = MatchCatalog(matches_path)
+
+
+@lru_cache(maxsize=4)
+def _match_events(match_id):
+    # jobs are submitted match by match, so a worker mostly reads each partition once
+    return EventIndex(read_match_events(_worker['store_path'], match_id)).match(match_id)
+
+
+def _context(match_id, team_id):
+    catalog = _worker['catalog']
+    match_data = catalog.get(match_id)
+    team_venue = 'home' if match_data['home']['teamId'] == team_id else 'away'
+    opp_venue = 'away' if team_venue == 'home' else 'home'
+    return MatchContext(match_id, match_data, _match_events(match_id), team_id, match_data[team_venue]['name'],
+                        match_data[opp_venue]['teamId'], match_data[opp_venue]['name'],
+                        match_lineups(match_data))
+
+
+def _render_job(job):
+    """Render one job in a worker. Returns (job, written paths, skipped paths, error)."""
+    match_id, team_id, view, out_dir, formats, dpi, source_mtime, force = job
+    written, skipped = [], []
+    try:
+        ctx = _context(match_id, team_id)
+        if view in PLAYER_VIEWS:
+            team_events = ctx.match_events.loc[ctx.match_events['teamId'] == team_id]
+            renders = [(output_paths(out_dir, match_id, team_id, view, formats, player), dict(player=player))
+                       for player in sorted(team_events['playerName'].dropna().unique())]
+        else:
+            renders = [(output_paths(out_dir, match_id, team_id, view, formats), {})]
+
+        for paths, params in renders:
+            if not force and is_up_to_date(paths, source_mtime):
+                skipped.extend(paths)
+                continue
+            save_figure(render_view(view, ctx, **params), paths, dpi)
+            written.extend(paths)
+    except Exception as e:
+        return job, written, skipped, f'{type(e).__name__}: {e}'
+    return job, written, skipped, None
+
+
+# ==========================================================
+# Driver
+# ==========================================================
+def export_season(store_path, matches_path, out_dir, views=None, formats=('png',), match_ids=None, workers=None,
+                  dpi=200, force=False):
+    """
+    Render every (match, team, view) of the season that is not up to date.
+
+    Parameters
+    ----------
+    store_path : event store directory (see eventstore.py).
+
+    matches_path : path of matches_data.json.
+
+    out_dir : root directory of the exported files.
+
+    views : names of the views to render, all of VIEWS when None.
+
+    formats : file formats to write, any of FORMATS.
+
+    match_ids : matches to render, every match in both the store and matches_data.json when None.
+
+    workers : number of worker processes, the number of CPUs when None.
+
+    dpi : resolution of the raster formats.
+
+    force : render even the outputs that are up to date.
+
+    Returns
+    -------
+    (written, skipped, failed) counts; written and skipped count files, failed counts jobs.
+    """
+    views = list(VIEWS) if views is None else list(views)
+    catalog = MatchCatalog(matches_path)
+    available = set(store_match_ids(store_path)) & set(catalog.match_ids())
+    match_ids = sorted(available if match_ids is None else available & {int(m) for m in match_ids})
+    matches_mtime = os.stat(matches_path).st_mtime
+
+    jobs, skipped = [], 0
+    for match_id in match_ids:
+        source_mtime = max(os.stat(partition_path(store_path, match_id)).st_mtime, matches_mtime)
+        for venue in ('home', 'away'):
+            team_id = catalog.headers[match_id][venue]['teamId']
+            for view in views:
+                # per-player outputs are only known once the worker has the events
+                if view not in PLAYER_VIEWS and not force and \
+                        is_up_to_date(output_paths(out_dir, match_id, team_id, view, formats), source_mtime):
+                    skipped += len(formats)
+                    continue
+                jobs.append((match_id, team_id, view, out_dir, tuple(formats), dpi, source_mtime, force))
+
+    written, failed = 0, 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(store_path, matches_path),
+                                 max_tasks_per_child=TASKS_PER_WORKER) as pool:
+            futures = [pool.submit(_render_job, job) for job in jobs]
+            for future in as_completed(futures):
+                (match_id, team_id, view, *_), job_written, job_skipped, error = future.result()
+                written += len(job_written)
+                skipped += len(job_skipped)
+                if error is not None:
+                    failed += 1
+                    print(f'failed {match_id} {team_id} {view}: {error}', file=sys.stderr)
+    return written, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the match visualizations of a season to files.')
+    parser.add_argument('--events', default='events.csv', help='season events CSV, converted to the store if missing')
+    parser.add_argument('--store', default='events_store', help='per-match event store directory')
+    parser.add_argument('--matches', default='matches_data.json', help='matches JSON')
+    parser.add_argument('--out', default='exports', help='output directory')
+    parser.add_argument('--views', nargs='+', choices=list(VIEWS), metavar='VIEW',
+                        help=f'views to render (default: all of {", ".join(VIEWS)})')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['png'])
+    parser.add_argument('--match-ids', nargs='+', type=int, help='only render these matches')
+    parser.add_argument('--workers', type=int, help='worker processes (default: number of CPUs)')
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--force', action='store_true', help='render outputs that are already up to date')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.store):
+        convert_events_csv(args.events, args.store)
+
+    started = time.perf_counter()
+    written, skipped, failed = export_season(args.store, args.matches, args.out, views=args.views,
+                                             formats=args.formats, match_ids=args.match_ids,
+                                             workers=args.workers, dpi=args.dpi, force=args.force)
+    print(f'wrote {written} files, {skipped} up to date, {failed} failed jobs '
+          f'in {time.perf_counter() - started:.1f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Figures that live outside pyplot.
+
+plt.subplots registers every figure with pyplot's global figure manager,
+where it stays until plt.close, so a long-running app whose visuals never
+close their figures keeps every one of them alive. The visuals draw into
+plain Figures with their own Agg canvas instead: nothing holds on to them
+but the caller, and close_figure clears one as soon as it is encoded so
+its artists are freed without waiting for the cyclic garbage collector.
+"""
+import os
+import threading
+import weakref
+
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+# keyword arguments of plt.subplots that belong to Figure.subplots rather than Figure
+_SUBPLOTS_KWARGS = ('sharex', 'sharey', 'squeeze', 'width_ratios', 'height_ratios', 'subplot_kw', 'gridspec_kw')
+
+_live = weakref.WeakSet()
+_lock = threading.Lock()
+_counters = {'created': 0, 'closed': 0}
+
+
+def subplots(nrows=1, ncols=1, **kwargs):
+    """Like plt.subplots, but the figure is not registered with pyplot."""
+    subplots_kwargs = {name: kwargs.pop(name) for name in _SUBPLOTS_KWARGS if name in kwargs}
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    with _lock:
+        _live.add(fig)
+        _counters['created'] += 1
+    return fig, fig.subplots(nrows, ncols, **subplots_kwargs)
+
+
+def close_figure(fig):
+    """Release a figure that has been encoded: unregister it from pyplot if needed and drop its artists."""
+    if fig.canvas.manager is not None:
+        plt.close(fig)
+    fig.clear()
+    with _lock:
+        if fig in _live:
+            _live.discard(fig)
+            _counters['closed'] += 1
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def figure_stats():
+    """
+    Counters of the figure layer.
+
+    Returns
+    -------
+    dict with created / closed figure counts, live (created here, neither
+    closed nor garbage collected yet), pyplot (figures registered with pyplot)
+    and rss_bytes.
+    """
+    with _lock:
+        stats = dict(_counters, live=len(_live))
+    stats['pyplot'] = len(plt.get_fignums())
+    stats['rss_bytes'] = rss_bytes()
+    return stats
@@ -0,0 +1,372 @@
+"""
+The data behind each visualization, computed without drawing anything.
+
+Every function returns Layers: named DataFrames (nodes, edges, shots,
+passes, ...) and named scalar values (formation, defensive line, ...).
+The visuals draw these layers, and the geometry API serves them as they
+are, so a client drawing a view itself sees exactly what the app draws.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, cached
+
+from coordinates import STATSBOMB_COLUMNS, coordinate, normalize
+from defensive import defensive_index
+from lineups import match_lineups
+from networks import pass_prefix_sums, split_reciprocal_edges
+from pass_clusters import match_clusters, pass_vectors
+from passes import enriched_passes
+from schema import category_mask
+from spatial import positional_edges
+from timeline import interval_mask
+from zones import PENALTY_BOX, into_zone
+
+
+Layers = namedtuple('Layers', ['tables', 'values'])
+
+SHOT_TYPES = ['MissedShots', 'SavedShot', 'ShotOnPost']
+
+# passes between two players drawn as a double-headed arrow, per network kind
+PAIRED_THRESHOLD = {False: 15, True: 20}
+
+AGGREGATE_CACHE_SIZE = 64
+
+
+def shot_layers(events_df, team_id, opp_id):
+    """
+    Shots of both teams, the opponent's mirrored onto the other half.
+
+    Returns
+    -------
+    Layers with table 'shots': x, y, teamId, playerName, minute, type, isGoal.
+    """
+    total_shots = events_df.loc[events_df['isOwnGoal'] != True]
+    total_shots = total_shots.loc[category_mask(total_shots['type'], ['Goal'] + SHOT_TYPES)]
+    total_shots = total_shots.loc[total_shots['teamId'].isin([team_id, opp_id])]
+    shots = total_shots[['x', 'y', 'teamId', 'playerName', 'minute', 'type']].reset_index(drop=True)
+    shots['x'] = np.where(shots['teamId'] == team_id, shots['x'], coordinate(total_shots, 'flippedX'))
+    shots['isGoal'] = category_mask(shots['type'], 'Goal')
+    return Layers({'shots': shots}, {})
+
+
+def pass_network_layers(match_data, events_df, team_id, lineups=None, minute_range=None, max_line_width=8,
+                        attacking=False, include_subs=False):
+    """
+    Players' average pass locations and the pass counts between them, starting XI
+    only unless ``include_subs``.
+
+    The attacking network only counts passes with a positive EPV, keeps edges
+    of more than twice the mean pass count and scales the transparency by the
+    largest EPV. Counts, EPV and locations of a minute range come from the
+    per-minute prefix sums of networks.py, so moving the range is cheap.
+
+    Returns
+    -------
+    Layers with tables
+        'nodes': playerKitNumber, x, y, count.
+        'edges': playerKitNumber, playerKitNumberReceipt, playerName, passRecipientName, pass_count, EPV,
+                 x, y (receiver), x_end, y_end (passer), width, alpha, paired.
+    and value 'formation'.
+    """
+    lineups = lineups if lineups is not None else match_lineups(match_data)
+
+    # per-minute running sums of the successful passes with their recipients
+    prefix = pass_prefix_sums(match_data, events_df, team_id, lineups)
+    start, end = minute_range if minute_range is not None else (0, np.inf)
+
+    formation = '-'.join(lineups.formation_name(match_data['matchId'], team_id))
+
+    # getting player average locations
+    average_locs_and_count = prefix.locations(start, end, include_subs)
+
+    # getting dataframe for passes between players, progressive passes only for the attacking network
+    passes_between = prefix.passes_between(start, end, include_subs, attacking)
+    # (an empty window would otherwise leave playerKitNumber as both the index name and a column)
+    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumberReceipt', right_index=True) \
+        .reset_index(drop=True)
+    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumber', right_index=True,
+                                          suffixes=['', '_end'])
+
+    # filtering passes
+    pass_filter = int(passes_between['pass_count'].mean()) if len(passes_between) else 0
+    passes_between = passes_between.loc[passes_between['pass_count'] > pass_filter * (2 if attacking else 1)]
+
+    # calculating the line width
+    passes_between['width'] = passes_between.pass_count / passes_between.pass_count.max() * max_line_width
+    passes_between = passes_between.reset_index(drop=True)
+
+    # lines are more transparent when less EPV is passed
+    min_transparency = 0.3
+    c_transparency = passes_between.EPV / passes_between.EPV.max() if attacking else passes_between.EPV
+    c_transparency = (c_transparency * (1 - min_transparency)) + min_transparency
+    passes_between['alpha'] = np.clip(c_transparency.astype(float), 0, 1)
+
+    # separating paired passes from normal passes
+    one_way, paired = split_reciprocal_edges(passes_between, PAIRED_THRESHOLD[attacking],
+                                             combine='sum' if attacking else 'each')
+    edges = pd.concat([one_way.assign(paired=False), paired.assign(paired=True)], ignore_index=True)
+    edges = edges.drop(columns=['count', 'count_end'])
+
+    nodes = average_locs_and_count.reset_index()
+    return Layers({'nodes': nodes, 'edges': edges}, {'formation': formation})
+
+
+def box_pass_layers(events_df, team_id):
+    """
+    Successful passes into the box from outside it.
+
+    Returns
+    -------
+    Layers with table 'passes': x, y, endX, endY, playerName, minute, and
+    sbX, sbY, sbEndX, sbEndY (StatsBomb pitch units).
+    """
+    passes_df = events_df.loc[category_mask(events_df['type'], 'Pass')]
+    team_passes = passes_df.loc[passes_df['teamId'] == team_id]
+    box_passes = team_passes.loc[into_zone(team_passes, PENALTY_BOX)]
+    successful_box_passes = box_passes.loc[category_mask(box_passes['outcomeType'], 'Successful')]
+    passes = successful_box_passes[['x', 'y', 'endX', 'endY', 'playerName', 'minute']].reset_index(drop=True)
+    for column in STATSBOMB_COLUMNS.values():
+        passes[column] = coordinate(successful_box_passes, column)
+    return Layers({'passes': passes}, {})
+
+
+def total_pass_layers(events_df, team_id):
+    """
+    All passes of a team.
+
+    Returns
+    -------
+    Layers with table 'passes': x, y, endX, endY, playerName, minute, successful.
+    """
+    passes_df = events_df.loc[category_mask(events_df['type'], 'Pass')]
+    team_passes = passes_df.loc[passes_df['teamId'] == team_id]
+    team_passes = team_passes.loc[category_mask(team_passes['outcomeType'], ['Successful', 'Unsuccessful'])]
+    passes = team_passes[['x', 'y', 'endX', 'endY', 'playerName', 'minute']].reset_index(drop=True)
+    passes['successful'] = category_mask(team_passes['outcomeType'], 'Successful')
+    return Layers({'passes': passes}, {})
+
+
+def _aggregate_key(aggregates, team_id, match_ids=None, **params):
+    # the aggregates' version stands for the season, a match set is keyed in any order
+    return (aggregates.version, int(team_id), None if match_ids is None else tuple(sorted(match_ids)),
+            tuple(sorted(params.items())))
+
+
+@cached(LRUCache(maxsize=AGGREGATE_CACHE_SIZE), key=_aggregate_key, lock=threading.Lock())
+def season_shot_layers(aggregates, team_id, match_ids=None):
+    """
+    Shots of a team and shots against it over the matches of TeamAggregates
+    (see aggregates.py), or over ``match_ids``, the shots against mirrored
+    onto the other half. Cached, the tables must not be modified in place.
+
+    Returns
+    -------
+    Layers with table 'shots': x, y, teamId (of the shooter), playerName,
+    minute, type, isGoal, matchId, against and value 'matches'.
+    """
+    shots = aggregates.rows('shots', team_id, match_ids).drop(columns='teamId').rename(columns={'shooterId': 'teamId'})
+    shots = shots[['x', 'y', 'teamId', 'playerName', 'minute', 'type', 'isGoal', 'matchId', 'against']]
+    return Layers({'shots': shots}, {'matches': len(aggregates.team_match_ids(team_id, match_ids))})
+
+
+@cached(LRUCache(maxsize=AGGREGATE_CACHE_SIZE), key=_aggregate_key, lock=threading.Lock())
+def season_total_pass_layers(aggregates, team_id, match_ids=None):
+    """
+    All passes of a team over the matches of TeamAggregates, or over
+    ``match_ids``. Cached, the tables must not be modified in place.
+
+    Returns
+    -------
+    Layers with table 'passes': x, y, endX, endY, playerName, minute, successful, matchId
+    and value 'matches'.
+    """
+    passes = aggregates.rows('passes', team_id, match_ids)
+    passes = passes[['x', 'y', 'endX', 'endY', 'playerName', 'minute', 'successful', 'matchId']]
+    return Layers({'passes': passes}, {'matches': len(aggregates.team_match_ids(team_id, match_ids))})
+
+
+@cached(LRUCache(maxsize=AGGREGATE_CACHE_SIZE), key=_aggregate_key, lock=threading.Lock())
+def season_box_pass_layers(aggregates, team_id, match_ids=None):
+    """
+    Successful passes into the box from outside it of a team over the
+    matches of TeamAggregates, or over ``match_ids``. Cached, the tables
+    must not be modified in place.
+
+    Returns
+    -------
+    Layers with table 'passes': x, y, endX, endY, playerName, minute, matchId,
+    sbX, sbY, sbEndX, sbEndY (StatsBomb pitch units) and value 'matches'.
+    """
+    passes = aggregates.rows('passes', team_id, match_ids)
+    passes = passes.loc[passes['intoBox'].to_numpy(), ['x', 'y', 'endX', 'endY', 'playerName', 'minute', 'matchId',
+                                                       *STATSBOMB_COLUMNS.values()]]
+    return Layers({'passes': passes.reset_index(drop=True)},
+                  {'matches': len(aggregates.team_match_ids(team_id, match_ids))})
+
+
+@cached(LRUCache(maxsize=AGGREGATE_CACHE_SIZE), key=_aggregate_key, lock=threading.Lock())
+def season_pass_network_layers(aggregates, team_id, match_ids=None, max_line_width=8, n_players=11):
+    """
+    Pass network of a team over the matches of TeamAggregates, or over
+    ``match_ids``: the ``n_players`` players with the most successful passes
+    at their average pass location, and the passes between them. Edges are
+    kept as in the match network, paired when both directions average the
+    match network's threshold per match; the transparency scales with the
+    EPV passed. Cached, the tables must not be modified in place.
+
+    Returns
+    -------
+    Layers with tables
+        'nodes': playerId, playerName, x, y, count.
+        'edges': playerId, recipientId, playerName, passRecipientName, pass_count, EPV,
+                 x, y (receiver), x_end, y_end (passer), width, alpha, paired.
+    and value 'matches'.
+    """
+    passes = aggregates.rows('network', team_id, match_ids)
+    n_matches = len(aggregates.team_match_ids(team_id, match_ids))
+
+    nodes = passes.groupby('playerId', sort=True).agg(x=('x', 'mean'), y=('y', 'mean'), count=('x', 'size'))
+    nodes = nodes.sort_values('count', ascending=False, kind='stable').iloc[:n_players]
+    nodes.insert(0, 'playerName', aggregates.player_names.reindex(nodes.index).to_numpy())
+
+    passes = passes.loc[passes['playerId'].isin(nodes.index).to_numpy() & passes['recipientId'].isin(nodes.index)]
+    edges = passes.groupby(['playerId', 'recipientId'], sort=True) \
+        .agg(pass_count=('EPV', 'size'), EPV=('EPV', 'sum')).reset_index()
+    edges.insert(2, 'playerName', nodes['playerName'].reindex(edges['playerId']).to_numpy())
+    edges.insert(3, 'passRecipientName', nodes['playerName'].reindex(edges['recipientId']).to_numpy())
+    edges = edges.join(nodes[['x', 'y']], on='recipientId') \
+        .join(nodes[['x', 'y']].add_suffix('_end'), on='playerId')
+
+    pass_filter = int(edges['pass_count'].mean()) if len(edges) else 0
+    edges = edges.loc[edges['pass_count'] > pass_filter].reset_index(drop=True)
+    edges['width'] = edges['pass_count'] / edges['pass_count'].max() * max_line_width
+
+    min_transparency = 0.3
+    c_transparency = edges['EPV'] / edges['EPV'].max() if len(edges) else edges['EPV']
+    edges['alpha'] = np.clip((c_transparency * (1 - min_transparency) + min_transparency).astype(float), 0, 1)
+
+    one_way, paired = split_reciprocal_edges(edges, PAIRED_THRESHOLD[False] * max(n_matches, 1),
+                                             source='playerId', target='recipientId')
+    edges = pd.concat([one_way.assign(paired=False), paired.assign(paired=True)], ignore_index=True)
+    return Layers({'nodes': nodes.reset_index(), 'edges': edges}, {'matches': n_matches})
+
+
+def pv_formation_layers(match_data, events_df, team_id, lineups=None, minute_range=None, received=False):
+    """
+    EPV passed (or received) per player of the starting formation, at the formation positions.
+
+    Returns
+    -------
+    Layers with table 'players': playerId, playerName, PV, vertical, horizontal
+    (StatsBomb pitch units) and value 'formation'.
+    """
+    lineups = lineups if lineups is not None else match_lineups(match_data)
+
+    # extracting successful passes with their recipients
+    passes_df = enriched_passes(match_data, events_df, team_id, lineups)
+    if minute_range is not None:
+        passes_df = passes_df.loc[interval_mask(passes_df, *minute_range)]
+
+    # Getting net possesion value for passes
+    if received:
+        net_pv = passes_df.groupby(['passRecipientId', 'passRecipientName'])['EPV'].sum().reset_index()
+        net_pv = net_pv.rename(columns={'passRecipientId': 'playerId', 'passRecipientName': 'playerName'})
+    else:
+        net_pv = passes_df.groupby(['playerId', 'playerName'])['EPV'].sum().reset_index()
+
+    # Getting formation and player ids for first 11
+    formation_data = lineups.team_formation(match_data['matchId'], team_id)
+    formation = formation_data['formationName'].iloc[0]
+    formation_data = formation_data[['playerId', 'vertical', 'horizontal']].copy()
+    formation_data['vertical'] = normalize(formation_data['vertical'], actual=(0, 10), desired=(10, 110))
+    formation_data['horizontal'] = normalize(formation_data['horizontal'], actual=(0, 10), desired=(80, 0))
+    players = net_pv.join(formation_data.set_index('playerId'), on='playerId', how='inner').reset_index(drop=True)
+    players = players.rename(columns={'EPV': 'PV'})
+    return Layers({'players': players}, {'formation': '-'.join(formation)})
+
+
+def cluster_layers(events_df, team_id, n_clusters=5, model=None):
+    """
+    KMeans clusters of a team's successful passes.
+
+    Clusters are numbered from 1 in order of decreasing size. Without a
+    model they are fitted on the match's passes, taken from the match's
+    cached sweep of cluster counts (see pass_clusters.py); with a
+    SeasonPassClusters model the passes are assigned to the season's
+    clusters, which are the same in every match, and ``n_clusters`` is the
+    model's.
+
+    Returns
+    -------
+    Layers with table 'passes': x, y, endX, endY (StatsBomb pitch units), cluster
+    and values 'n_clusters', 'inertia' and 'silhouette' (None for season clusters).
+    """
+    if model is not None:
+        df = pass_vectors(events_df, team_id)
+        df['cluster'] = model.predict(np.array(df[['x', 'y', 'endX', 'endY']]))
+        return Layers({'passes': df}, {'n_clusters': model.n_clusters, 'inertia': None, 'silhouette': None})
+    df, fit = match_clusters(events_df, team_id, n_clusters)
+    df['cluster'] = fit.labels
+    silhouette = None if np.isnan(fit.silhouette) else fit.silhouette
+    return Layers({'passes': df}, {'n_clusters': fit.n_clusters, 'inertia': fit.inertia, 'silhouette': silhouette})
+
+
+def positional_layers(bins, team_id, category='Touches', statistic='count', player_id=None, match_ids=None):
+    """
+    A category of events of a team (or of one of its players) summed over
+    the positional-play cells, from SpatialBins (see spatial.py).
+
+    Returns
+    -------
+    Layers with table 'cells': x0, x1, y0, y1 (Opta units), value (count or
+    EPV sum), one row per cell ordered by x then y, and values 'category',
+    'statistic' and 'total'.
+    """
+    cells = bins.cells(category, statistic, team_id, player_id, match_ids)
+    x_edges, y_edges = positional_edges()
+    xi, yi = np.meshgrid(np.arange(len(x_edges) - 1), np.arange(len(y_edges) - 1), indexing='ij')
+    table = pd.DataFrame({'x0': x_edges[xi.ravel()], 'x1': x_edges[xi.ravel() + 1], 'y0': y_edges[yi.ravel()],
+                          'y1': y_edges[yi.ravel() + 1], 'value': cells.ravel()})
+    return Layers({'cells': table}, {'category': category, 'statistic': statistic, 'total': float(cells.sum())})
+
+
+def defensive_line_layers(events_df, team_id, player):
+    """
+    Successful defensive actions of a player and their average height, from
+    the match's defensive index (see defensive.py).
+
+    Returns
+    -------
+    Layers with table 'actions': x, y, type, minute and value 'line' (mean x,
+    Opta units, None without actions).
+    """
+    index = defensive_index(events_df)
+    player_id = index.player_id(team_id, player)
+    succ_def = index.player(team_id, player_id) if player_id is not None else index.team(team_id).iloc[:0]
+    actions = succ_def[['x', 'y', 'type', 'minute']].reset_index(drop=True)
+    line = float(actions['x'].mean()) if len(actions) else None
+    return Layers({'actions': actions}, {'line': line})
+
+
+def team_defensive_line_layers(events_df, team_id):
+    """
+    Successful defensive actions of a whole team, every player's average
+    action location and the team's average height.
+
+    Returns
+    -------
+    Layers with tables
+        'actions': x, y, type, minute, playerId, playerName.
+        'players': playerId, playerName, x, y (mean location), actions (count).
+    and value 'line' (mean x, Opta units, None without actions).
+    """
+    team_actions = defensive_index(events_df).team(team_id)
+    actions = team_actions[['x', 'y', 'type', 'minute', 'playerId', 'playerName']].reset_index(drop=True)
+    players = actions.groupby('playerId', observed=True, sort=True) \
+        .agg(playerName=('playerName', 'first'), x=('x', 'mean'), y=('y', 'mean'), actions=('x', 'size')) \
+        .reset_index()
+    line = float(actions['x'].mean()) if len(actions) else None
+    return Layers({'actions': actions, 'players': players}, {'line': line})
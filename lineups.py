@@ -0,0 +1,130 @@
+"""
+Flat lineup and formation tables built from matches_data.json.
+
+Every match's ``players`` and ``formations`` blocks are read once into two
+typed tables indexed by (matchId, teamId), so the visuals get their roster
+and formation with an index lookup instead of walking the match dict.
+"""
+import threading
+
+import pandas as pd
+from cachetools import LRUCache, cached
+
+
+VENUES = ('home', 'away')
+
+PLAYER_DTYPES = {
+    'matchId': 'int32',
+    'teamId': 'int32',
+    'venue': 'category',
+    'playerId': 'int64',
+    'playerName': 'object',
+    'playerPos': 'category',
+    'playerKitNumber': 'int16',
+    'isFirstEleven': 'bool',
+}
+
+FORMATION_DTYPES = {
+    'matchId': 'int32',
+    'teamId': 'int32',
+    'formationIndex': 'int16',
+    'formationName': 'category',
+    'startMinuteExpanded': 'float32',
+    'endMinuteExpanded': 'float32',
+    'slot': 'int16',
+    'playerId': 'int64',
+    'vertical': 'float32',
+    'horizontal': 'float32',
+}
+
+
+class LineupTables:
+    """
+    players : one row per squad member (starters and subs) of each team in each match.
+
+    formations : one row per formation slot, ``formationIndex`` 0 being the
+                 starting formation.
+    """
+
+    def __init__(self, players, formations):
+        self.players = players.set_index(['matchId', 'teamId']).sort_index()
+        self.formations = formations.set_index(['matchId', 'teamId']).sort_index()
+
+    @classmethod
+    def from_matches(cls, matches):
+        """Build the tables from an iterable of match dicts (a list or a MatchCatalog)."""
+        builder = LineupBuilder()
+        for match in matches:
+            builder.add(match)
+        return builder.tables()
+
+    def _rows(self, table, match_id, team_id):
+        key = (int(match_id), int(team_id))
+        if key not in table.index:
+            return table.iloc[:0].reset_index(drop=True)
+        return table.loc[[key]].reset_index(drop=True)
+
+    def team_players(self, match_id, team_id):
+        """playerId, playerName, playerPos, playerKitNumber and isFirstEleven of a team's squad."""
+        return self._rows(self.players, match_id, team_id)
+
+    def team_formation(self, match_id, team_id, index=0):
+        """Slots of one of a team's formations: playerId, vertical, horizontal and formationName."""
+        formations = self._rows(self.formations, match_id, team_id)
+        return formations.loc[formations['formationIndex'] == index].reset_index(drop=True)
+
+    def formation_name(self, match_id, team_id, index=0):
+        return str(self.team_formation(match_id, team_id, index)['formationName'].iloc[0])
+
+
+class LineupBuilder:
+    """
+    Columns of the LineupTables, filled one match dict at a time, for a
+    caller that already walks the matches (see MatchCatalog).
+    """
+
+    def __init__(self):
+        self.players = {column: [] for column in PLAYER_DTYPES}
+        self.formations = {column: [] for column in FORMATION_DTYPES}
+
+    def add(self, match):
+        """Append the squads and formations of both teams of a match dict."""
+        players, formations = self.players, self.formations
+        match_id = int(match['matchId'])
+        for venue in VENUES:
+            team = match[venue]
+            for player in team['players']:
+                players['matchId'].append(match_id)
+                players['teamId'].append(team['teamId'])
+                players['venue'].append(venue)
+                players['playerId'].append(player['playerId'])
+                players['playerName'].append(player['name'])
+                players['playerPos'].append(player['position'])
+                players['playerKitNumber'].append(player['shirtNo'])
+                players['isFirstEleven'].append(bool(player.get('isFirstEleven', player['position'] != 'Sub')))
+
+            for index, formation in enumerate(team.get('formations', [])):
+                positions = formation['formationPositions']
+                # playerIds also lists the bench, the first len(positions) fill the slots
+                for slot, (player_id, pos) in enumerate(zip(formation['playerIds'], positions)):
+                    formations['matchId'].append(match_id)
+                    formations['teamId'].append(team['teamId'])
+                    formations['formationIndex'].append(index)
+                    formations['formationName'].append(formation['formationName'])
+                    formations['startMinuteExpanded'].append(formation.get('startMinuteExpanded'))
+                    formations['endMinuteExpanded'].append(formation.get('endMinuteExpanded'))
+                    formations['slot'].append(slot)
+                    formations['playerId'].append(player_id)
+                    formations['vertical'].append(pos['vertical'])
+                    formations['horizontal'].append(pos['horizontal'])
+
+    def tables(self):
+        """LineupTables of the matches added so far."""
+        return LineupTables(pd.DataFrame(self.players).astype(PLAYER_DTYPES),
+                            pd.DataFrame(self.formations).astype(FORMATION_DTYPES))
+
+
+@cached(LRUCache(maxsize=32), key=lambda match_data: int(match_data['matchId']), lock=threading.Lock())
+def match_lineups(match_data):
+    """Lineup tables of a single match, for callers that have no season tables."""
+    return LineupTables.from_matches([match_data])
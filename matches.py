@@ -0,0 +1,185 @@
+"""
+Id-keyed access to matches_data.json.
+
+The file is a JSON array with one large object per match (lineups,
+formations and per-player stats). MatchCatalog scans it once, keeping only
+the byte range of every match object plus the few header fields needed for
+the match selector, picked out of the object's tokens without decoding it;
+a single match is then read back with a seek and a ``json.loads`` of its
+own bytes. Only when asked for the season LineupTables (see lineups.py)
+does the scan decode every match, once, to build them.
+"""
+import json
+import re
+from functools import lru_cache
+
+from lineups import LineupBuilder
+
+
+_TOKENS = re.compile(rb'["{}\\]')
+
+# a string (a key when followed by a colon) or a bracket, of a match object
+_HEADER_TOKENS = re.compile(rb'"(?:[^"\\]|\\.)*"(?:\s*:)?|[{}\[\]]', re.S)
+
+_NUMBER = re.compile(rb'\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)')
+
+# (enclosing key, key) -> header field, None being the match object itself
+HEADER_FIELDS = {
+    (None, b'"matchId"'): ('matchId',),
+    (b'"home"', b'"teamId"'): ('home', 'teamId'),
+    (b'"home"', b'"name"'): ('home', 'name'),
+    (b'"away"', b'"teamId"'): ('away', 'teamId'),
+    (b'"away"', b'"name"'): ('away', 'name'),
+}
+
+
+def _object_spans(f, chunk_size=1 << 20):
+    """Byte ranges of the top-level objects of a JSON array, read in chunks."""
+    depth = 0
+    in_string = False
+    skip = -1
+    start = None
+    base = 0
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        for m in _TOKENS.finditer(chunk):
+            pos = base + m.start()
+            if pos == skip:
+                continue
+            token = m.group()
+            if in_string:
+                if token == b'\\':
+                    skip = pos + 1
+                elif token == b'"':
+                    in_string = False
+                continue
+            if token == b'"':
+                in_string = True
+            elif token == b'{':
+                if depth == 0:
+                    start = pos
+                depth += 1
+            elif token == b'}':
+                depth -= 1
+                if depth == 0:
+                    yield start, pos + 1
+        base += len(chunk)
+
+
+def _header(data):
+    """
+    matchId and the home and away teamId and name of the bytes of one match
+    object, read from its tokens with only those values decoded; None when
+    one of them is missing.
+    """
+    found = {}
+    # keys of the objects and arrays enclosing the current token, None for the match itself
+    path = []
+    key = None
+    for m in _HEADER_TOKENS.finditer(data):
+        token = m.group()
+        if token in (b'{', b'['):
+            path.append(key)
+            key = None
+            continue
+        if token in (b'}', b']'):
+            path.pop()
+            key = None
+            if not path:
+                break
+            continue
+
+        if token.endswith(b':'):
+            key = token[:token.rindex(b'"') + 1]
+            # a number value follows the key, a string value is the next token
+            value = _NUMBER.match(data, m.end())
+            value = value.group(1) if value else None
+        else:
+            value = token
+        field = HEADER_FIELDS.get((path[-1], key)) if 1 <= len(path) <= 2 else None
+        if field is not None and value is not None:
+            found[field] = json.loads(value)
+            if len(found) == len(HEADER_FIELDS):
+                break
+        if value is token:
+            key = None
+    if len(found) < len(HEADER_FIELDS):
+        return None
+    return {'matchId': found[('matchId',)],
+            **{venue: {'teamId': found[(venue, 'teamId')], 'name': found[(venue, 'name')]}
+               for venue in ('home', 'away')}}
+
+
+class MatchCatalog:
+    """
+    Parameters
+    ----------
+    json_path : path of matches_data.json.
+
+    team_names : optional {teamId: name} mapping used for the labels,
+                 the names in the JSON are used otherwise.
+
+    cache_size : number of parsed matches kept in memory.
+
+    lineups : build the LineupTables of every match while scanning, kept
+              as ``self.lineups`` (None otherwise).
+    """
+
+    def __init__(self, json_path, team_names=None, cache_size=8, lineups=False):
+        self.json_path = json_path
+        team_names = team_names or {}
+        builder = LineupBuilder() if lineups else None
+
+        self._spans = {}
+        self.headers = {}
+        self.labels = {}
+        with open(json_path, 'rb') as f:
+            spans = list(_object_spans(f))
+            for start, end in spans:
+                f.seek(start)
+                data = f.read(end - start)
+                match = json.loads(data) if builder is not None else _header(data)
+                if match is None:
+                    # headers not found by the token scan (e.g. a key spelt with escapes)
+                    match = json.loads(data)
+                match_id = int(match['matchId'])
+                self._spans[match_id] = (start, end)
+                self.headers[match_id] = {
+                    venue: {'teamId': match[venue]['teamId'], 'name': match[venue]['name']}
+                    for venue in ('home', 'away')
+                }
+                hname = team_names.get(match['home']['teamId'], match['home']['name'])
+                aname = team_names.get(match['away']['teamId'], match['away']['name'])
+                self.labels[match_id] = f'{hname} vs {aname}'
+                if builder is not None:
+                    builder.add(match)
+
+        self.lineups = builder.tables() if builder is not None else None
+        self.get = lru_cache(maxsize=cache_size)(self._read)
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __contains__(self, match_id):
+        return int(match_id) in self._spans
+
+    def match_ids(self):
+        return list(self._spans)
+
+    def label(self, match_id):
+        try:
+            return self.labels[int(match_id)]
+        except (KeyError, TypeError, ValueError):
+            return str(match_id)
+
+    def _read(self, match_id):
+        start, end = self._spans[int(match_id)]
+        with open(self.json_path, 'rb') as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def __iter__(self):
+        """Yield every match dict, one at a time, in file order."""
+        with open(self.json_path, 'rb') as f:
+            for start, end in self._spans.values():
+                f.seek(start)
+                yield json.loads(f.read(end - start))
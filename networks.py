@@ -0,0 +1,182 @@
+"""
+Pass network computations that do not draw anything.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, cached
+
+from passes import PASS_CACHE_SIZE, _cache_key, enriched_passes
+
+
+EDGE_KEYS = ['playerKitNumber', 'playerKitNumberReceipt', 'playerName', 'passRecipientName']
+
+
+def split_reciprocal_edges(passes_between, threshold, combine='each', source='playerKitNumber',
+                           target='playerKitNumberReceipt', count='pass_count'):
+    """
+    Separate the edges drawn as double-headed arrows from the one-way edges.
+
+    An edge a->b is paired when b->a is also in ``passes_between`` and the
+    counts pass the threshold: both of them (``combine='each'``, pass network)
+    or their sum (``combine='sum'``, attacking pass network).
+
+    The check is one lookup in a player x player count matrix instead of a
+    scan of the edge list for every pair of players.
+
+    Returns
+    -------
+    (one_way, paired) DataFrames, both with a fresh index. Paired edges are
+    ordered pair by pair, in order of the passers' first appearance.
+    """
+    if passes_between.empty:
+        return passes_between.reset_index(drop=True), passes_between.iloc[:0].reset_index(drop=True)
+
+    players, codes = np.unique(np.r_[passes_between[source].to_numpy(), passes_between[target].to_numpy()],
+                               return_inverse=True)
+    src, dst = np.split(codes, 2)
+    n_players = len(players)
+
+    counts = np.zeros((n_players, n_players))
+    present = np.zeros((n_players, n_players), dtype=bool)
+    counts[src, dst] = passes_between[count].to_numpy()
+    present[src, dst] = True
+
+    forward = counts[src, dst]
+    backward = counts[dst, src]
+    if combine == 'each':
+        passes = (forward >= threshold) & (backward >= threshold)
+    elif combine == 'sum':
+        passes = forward + backward >= threshold
+    else:
+        raise ValueError(f"combine must be 'each' or 'sum', not {combine!r}")
+    paired = present[dst, src] & passes & (src != dst)
+
+    # order of first appearance as a passer, to keep the draw order pair by pair
+    appearance = np.full(n_players, n_players)
+    unique_src = pd.unique(src)
+    appearance[unique_src] = np.arange(len(unique_src))
+    pair_first = np.minimum(appearance[src], appearance[dst])
+    pair_second = np.maximum(appearance[src], appearance[dst])
+
+    paired_rows = np.flatnonzero(paired)
+    paired_rows = paired_rows[np.lexsort((paired_rows, pair_second[paired_rows], pair_first[paired_rows]))]
+
+    one_way = passes_between.iloc[np.flatnonzero(~paired)].reset_index(drop=True)
+    return one_way, passes_between.iloc[paired_rows].reset_index(drop=True)
+
+
+def _group_ids(groups):
+    # group number of every row, -1 for rows whose keys are missing (pandas gives those NaN)
+    return groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _prefix_sums(minutes, ids, n_ids, n_minutes, weights=None):
+    # (n_minutes + 1, n_ids) running sums over the minutes: row m sums the passes of minutes < m
+    flat = minutes * n_ids + ids
+    per_minute = np.bincount(flat, weights=weights, minlength=n_minutes * n_ids).reshape(n_minutes, n_ids)
+    return np.vstack([np.zeros((1, n_ids)), np.cumsum(per_minute, axis=0)])
+
+
+class PassPrefixSums:
+    """
+    Per-minute running sums of a team's passes, so the network of any
+    minute window is a difference of two rows instead of a new filter and
+    groupby of the passes.
+
+    Per edge (passer and receiver, keyed as in the pass network) it holds the
+    pass count and EPV sum, of all passes and of the passes with a positive
+    EPV (the attacking network); per passer the pass count and the sums of
+    the pass locations.
+
+    Parameters
+    ----------
+    passes_df : enriched passes of one team in one match (see passes.py).
+    """
+
+    def __init__(self, passes_df):
+        minutes = passes_df['minute'].to_numpy(dtype=np.int64)
+        self.n_minutes = int(minutes.max()) + 1 if len(minutes) else 0
+        epv = np.nan_to_num(passes_df['EPV'].to_numpy(dtype=float))
+        positive = epv > 0
+        is_sub = (passes_df['playerPos'] == 'Sub').to_numpy()
+
+        edge_groups = passes_df.groupby(EDGE_KEYS, observed=True, sort=True)
+        edge_ids = _group_ids(edge_groups)
+        self.edges = edge_groups.size().reset_index()[EDGE_KEYS]
+        n_edges = len(self.edges)
+        self.edge_is_sub = np.zeros(n_edges, dtype=bool)
+        # passes without a recipient name are in no edge (-1), but still locate their passer
+        on_edge = edge_ids >= 0
+        self.edge_is_sub[edge_ids[on_edge]] = is_sub[on_edge]
+        positive &= on_edge
+
+        node_groups = passes_df.groupby('playerKitNumber', sort=True)
+        node_ids = _group_ids(node_groups)
+        self.nodes = node_groups.size().index.to_numpy()
+        n_nodes = len(self.nodes)
+        self.node_is_sub = np.zeros(n_nodes, dtype=bool)
+        # passers missing from the roster have no kit number, they are in no node (-1)
+        on_node = node_ids >= 0
+        self.node_is_sub[node_ids[on_node]] = is_sub[on_node]
+
+        self.edge_count = _prefix_sums(minutes[on_edge], edge_ids[on_edge], n_edges, self.n_minutes)
+        self.edge_epv = _prefix_sums(minutes[on_edge], edge_ids[on_edge], n_edges, self.n_minutes, epv[on_edge])
+        self.attacking_count = _prefix_sums(minutes[positive], edge_ids[positive], n_edges, self.n_minutes)
+        self.attacking_epv = _prefix_sums(minutes[positive], edge_ids[positive], n_edges, self.n_minutes,
+                                          epv[positive])
+        node_minutes = minutes[on_node]
+        self.node_count = _prefix_sums(node_minutes, node_ids[on_node], n_nodes, self.n_minutes)
+        self.node_x = _prefix_sums(node_minutes, node_ids[on_node], n_nodes, self.n_minutes,
+                                   passes_df['x'].to_numpy(dtype=float)[on_node])
+        self.node_y = _prefix_sums(node_minutes, node_ids[on_node], n_nodes, self.n_minutes,
+                                   passes_df['y'].to_numpy(dtype=float)[on_node])
+
+    def _rows(self, start, end):
+        # start <= minute < end, as timeline.interval_mask, on integer minutes
+        first = int(np.clip(np.ceil(start), 0, self.n_minutes))
+        last = int(np.clip(np.ceil(end), first, self.n_minutes)) if end != np.inf else self.n_minutes
+        return first, last
+
+    def locations(self, start=0, end=np.inf, include_subs=False):
+        """
+        Average pass location and pass count of every passer in the window.
+
+        Returns
+        -------
+        DataFrame indexed by playerKitNumber with x, y and count.
+        """
+        first, last = self._rows(start, end)
+        count = self.node_count[last] - self.node_count[first]
+        keep = (count > 0) & (include_subs | ~self.node_is_sub)
+        locations = pd.DataFrame({'x': (self.node_x[last] - self.node_x[first])[keep] / count[keep],
+                                  'y': (self.node_y[last] - self.node_y[first])[keep] / count[keep],
+                                  'count': count[keep].astype(np.int64)},
+                                 index=pd.Index(self.nodes[keep], name='playerKitNumber'))
+        return locations
+
+    def passes_between(self, start=0, end=np.inf, include_subs=False, attacking=False):
+        """
+        Pass count and EPV sum of every edge with passes in the window, only
+        counting passes with a positive EPV for the attacking network.
+
+        Returns
+        -------
+        DataFrame with playerKitNumber, playerKitNumberReceipt, playerName,
+        passRecipientName, pass_count and EPV.
+        """
+        first, last = self._rows(start, end)
+        counts, epv = (self.attacking_count, self.attacking_epv) if attacking else (self.edge_count, self.edge_epv)
+        count = counts[last] - counts[first]
+        keep = (count > 0) & (include_subs | ~self.edge_is_sub)
+        passes_between = self.edges.loc[keep].reset_index(drop=True)
+        passes_between['pass_count'] = count[keep].astype(np.int64)
+        passes_between['EPV'] = (epv[last] - epv[first])[keep]
+        return passes_between
+
+
+@cached(LRUCache(maxsize=PASS_CACHE_SIZE), key=_cache_key, lock=threading.Lock())
+def pass_prefix_sums(match_data, events_df, team_id, lineups=None):
+    """PassPrefixSums of a team's enriched passes, built once per (matchId, teamId, events frame)."""
+    return PassPrefixSums(enriched_passes(match_data, events_df, team_id, lineups))
@@ -0,0 +1,261 @@
+"""
+Pass clusters: per match with a choice of cluster counts, or season-wide.
+
+A match's passes are clustered for the requested number of clusters, the
+fit cached per (match, team, passes, count). Scoring every count of
+K_VALUES by inertia and a sampled silhouette (the app's "best silhouette")
+is a sweep fitted in parallel with joblib and cached the same way; once it
+has run, any count of that match is a lookup.
+
+SeasonPassClusters is a MiniBatchKMeans model of the (x, y, endX, endY)
+vectors, in StatsBomb pitch units, of every successful pass of the
+season. It is fitted incrementally, one partial_fit per match added to the event store, and
+saved next to the store, so the season is never fitted from scratch
+again. A match's passes are assigned to the season clusters with one
+predict: cluster 3 is the same kind of pass in every match, and opening
+the view costs a nearest-centroid lookup instead of a KMeans fit.
+
+    python pass_clusters.py events_store
+"""
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+from collections import namedtuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, cached
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+from coordinates import statsbomb_coordinates
+from eventstore import read_match_events, store_match_ids
+from render_service import WORKER_PREFIX
+from schema import category_mask
+
+
+# cluster counts fitted by a sweep
+K_VALUES = tuple(range(2, 11))
+
+# passes the silhouette of a fit is computed on
+SILHOUETTE_SAMPLE = 1000
+
+SWEEP_CACHE_SIZE = 64
+
+# joblib workers of a sweep, at most one per CPU
+SWEEP_JOBS = 4
+
+ClusterFit = namedtuple('ClusterFit', ['n_clusters', 'labels', 'centroids', 'inertia', 'silhouette'])
+
+MODEL_FILE = 'pass_clusters_{n_clusters}.joblib'
+
+# the only columns the model reads from a partition
+PASS_COLUMNS = ['teamId', 'type', 'outcomeType', 'x', 'y', 'endX', 'endY']
+
+
+def pass_vectors(events_df, team_id=None):
+    """Successful passes (of ``team_id`` when given) as x, y, endX, endY in StatsBomb pitch units."""
+    mask = category_mask(events_df['type'], 'Pass') & category_mask(events_df['outcomeType'], 'Successful')
+    if team_id is not None:
+        mask &= events_df['teamId'] == team_id
+    return statsbomb_coordinates(events_df.loc[mask])
+
+
+def _numbering(labels, n_clusters):
+    # cluster numbers from 1 in order of decreasing size, indexed by KMeans label
+    sizes = np.bincount(labels, minlength=n_clusters)
+    number = np.empty(n_clusters, dtype=int)
+    number[np.argsort(-sizes, kind='stable')] = np.arange(1, n_clusters + 1)
+    return number
+
+
+def fit_clusters(X, n_clusters, random_state=100, sample_size=SILHOUETTE_SAMPLE):
+    """
+    KMeans fit of an (n, 4) array of pass vectors.
+
+    Returns
+    -------
+    ClusterFit: labels numbered from 1 in order of decreasing cluster size,
+    centroids in that order, inertia, and the silhouette of at most
+    ``sample_size`` passes (NaN when it is undefined).
+    """
+    n_clusters = min(n_clusters, len(X))
+    if not n_clusters:
+        return ClusterFit(0, np.array([], dtype=int), np.empty((0, 4)), 0.0, np.nan)
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state).fit(X)
+    number = _numbering(kmeans.labels_, n_clusters)
+    silhouette = np.nan
+    if 1 < len(np.unique(kmeans.labels_)) < len(X):
+        silhouette = float(silhouette_score(X, kmeans.labels_, sample_size=min(sample_size, len(X)),
+                                            random_state=random_state))
+    centroids = np.empty_like(kmeans.cluster_centers_)
+    centroids[number - 1] = kmeans.cluster_centers_
+    return ClusterFit(n_clusters, number[kmeans.labels_], centroids, float(kmeans.inertia_), silhouette)
+
+
+def _sweep_key(X, match_id, team_id, k_values=K_VALUES):
+    # the passes themselves are the data version: an updated partition is swept again
+    return int(match_id), int(team_id), hashlib.sha1(np.ascontiguousarray(X).tobytes()).hexdigest(), tuple(k_values)
+
+
+def _fit_key(X, match_id, team_id, n_clusters):
+    return _sweep_key(X, match_id, team_id, (n_clusters,))
+
+
+def sweep_jobs():
+    """
+    joblib workers of a sweep: SWEEP_JOBS bounded by the CPUs, and 1 inside a
+    pool worker (export.py's processes, the render service's threads),
+    whose pool already has the CPUs busy.
+    """
+    if multiprocessing.parent_process() is not None or threading.current_thread().name.startswith(WORKER_PREFIX):
+        return 1
+    return max(1, min(SWEEP_JOBS, os.cpu_count() or 1))
+
+
+@cached(LRUCache(maxsize=SWEEP_CACHE_SIZE), key=_sweep_key, lock=threading.Lock())
+def cluster_sweep(X, match_id, team_id, k_values=K_VALUES):
+    """
+    ClusterFit of a team's pass vectors for every cluster count of ``k_values``,
+    fitted in parallel.
+
+    Returns
+    -------
+    dict n_clusters -> ClusterFit.
+    """
+    fits = joblib.Parallel(n_jobs=sweep_jobs())(joblib.delayed(fit_clusters)(X, k) for k in k_values)
+    return dict(zip(k_values, fits))
+
+
+@cached(LRUCache(maxsize=SWEEP_CACHE_SIZE), key=_fit_key, lock=threading.Lock())
+def match_fit(X, match_id, team_id, n_clusters):
+    """ClusterFit of a team's pass vectors for one cluster count, taken from the match's sweep if it has run."""
+    with cluster_sweep.cache_lock:
+        sweep = cluster_sweep.cache.get(_sweep_key(X, match_id, team_id))
+    if sweep is not None and n_clusters in sweep:
+        return sweep[n_clusters]
+    return fit_clusters(X, n_clusters)
+
+
+def _match_id(events_df):
+    return events_df['matchId'].iloc[0] if 'matchId' in events_df.columns and len(events_df) else None
+
+
+def match_clusters(events_df, team_id, n_clusters=5):
+    """Pass vectors of a team (see pass_vectors) and their ClusterFit for ``n_clusters``, cached per match."""
+    df = pass_vectors(events_df, team_id)
+    X = np.array(df[['x', 'y', 'endX', 'endY']])
+    match_id = _match_id(events_df)
+    if match_id is None:
+        return df, fit_clusters(X, n_clusters)
+    return df, match_fit(X, match_id, team_id, n_clusters)
+
+
+def match_cluster_scores(events_df, team_id):
+    """Inertia and silhouette of a team's passes for every cluster count of K_VALUES, one row per count."""
+    X = np.array(pass_vectors(events_df, team_id)[['x', 'y', 'endX', 'endY']])
+    match_id = _match_id(events_df)
+    if match_id is not None and len(X) >= max(K_VALUES):
+        fits = list(cluster_sweep(X, match_id, team_id).values())
+    else:
+        fits = [fit_clusters(X, k) for k in K_VALUES]
+    return pd.DataFrame({'n_clusters': [fit.n_clusters for fit in fits], 'inertia': [fit.inertia for fit in fits],
+                         'silhouette': [fit.silhouette for fit in fits]})
+
+
+class SeasonPassClusters:
+    """
+    Pass clusters of a whole season, numbered from 1 in order of decreasing
+    size over the season.
+
+    Parameters
+    ----------
+    n_clusters : number of clusters.
+
+    batch_size, random_state : passed to MiniBatchKMeans.
+    """
+
+    def __init__(self, n_clusters=5, batch_size=1024, random_state=100):
+        self.n_clusters = n_clusters
+        self.model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=random_state)
+        self.match_ids = set()
+        # passes assigned to each cluster when their match was added
+        self.sizes = np.zeros(n_clusters, dtype=np.int64)
+
+    @property
+    def fitted(self):
+        return bool(self.match_ids)
+
+    @property
+    def version(self):
+        """Changes whenever a match is added, for keys of anything drawn from the clusters."""
+        ids = ','.join(map(str, sorted(self.match_ids)))
+        return hashlib.sha1(f'{self.n_clusters}:{ids}'.encode()).hexdigest()[:12]
+
+    @property
+    def centroids(self):
+        """(n_clusters, 4) centroids, row i being cluster i + 1."""
+        return self.model.cluster_centers_[np.argsort(-self.sizes, kind='stable')]
+
+    def add_match(self, match_id, events_df):
+        """Fit the successful passes of one match into the model. Returns False if it was already in."""
+        if match_id in self.match_ids:
+            return False
+        X = pass_vectors(events_df).to_numpy(dtype=np.float64)
+        if len(X) >= self.n_clusters:
+            self.model.partial_fit(X)
+            self.sizes += np.bincount(self.model.predict(X), minlength=self.n_clusters)
+        self.match_ids.add(match_id)
+        return True
+
+    def update(self, store_path, match_ids=None):
+        """Add every match of the store (or of ``match_ids``) not in the model yet. Returns how many were added."""
+        match_ids = store_match_ids(store_path) if match_ids is None else match_ids
+        added = 0
+        for match_id in sorted(set(match_ids) - self.match_ids):
+            added += self.add_match(match_id, read_match_events(store_path, match_id, columns=PASS_COLUMNS))
+        return added
+
+    def predict(self, X):
+        """Cluster numbers of an (n, 4) array of pass vectors."""
+        number = np.empty(self.n_clusters, dtype=int)
+        number[np.argsort(-self.sizes, kind='stable')] = np.arange(1, self.n_clusters + 1)
+        if not len(X):
+            return np.array([], dtype=int)
+        return number[self.model.predict(np.asarray(X, dtype=np.float64))]
+
+    def save(self, path):
+        # the fitted MiniBatchKMeans is kept whole, so later partial fits carry on its per-centroid counts
+        state = {'model': self.model, 'match_ids': sorted(self.match_ids), 'sizes': self.sizes}
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        state = joblib.load(path)
+        clusters = cls(state['model'].n_clusters)
+        clusters.model = state['model']
+        clusters.match_ids = set(state['match_ids'])
+        clusters.sizes = state['sizes']
+        return clusters
+
+
+def season_pass_clusters(store_path, path=None, n_clusters=5):
+    """
+    The saved season model of the store, brought up to date with the
+    matches added since it was saved (and saved again if there were any).
+    """
+    path = os.path.join(store_path, MODEL_FILE.format(n_clusters=n_clusters)) if path is None else path
+    clusters = SeasonPassClusters.load(path) if os.path.exists(path) else SeasonPassClusters(n_clusters)
+    if clusters.update(store_path):
+        clusters.save(path)
+    return clusters
+
+
+if __name__ == '__main__':
+    season = season_pass_clusters(sys.argv[1])
+    print(f'{len(season.match_ids)} matches, cluster sizes {np.sort(season.sizes)[::-1].tolist()}')
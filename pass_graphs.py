@@ -0,0 +1,305 @@
+"""
+Season pass networks as sparse player x player matrices.
+
+Every (match, team) pass network of the season is a block of one
+block-diagonal scipy.sparse matrix: the nodes are the (match, team, player)
+rows of ``players`` in that order, and entry (i, j) holds the successful
+passes from player i to player j (the recipient being the player of the
+team's next event, as in passes.py), with their EPV sum in a second matrix
+of the same shape. Since no edge crosses two blocks, one sparse product or
+one shortest-path call computes a metric for all the networks at once:
+ranking players by centrality over a season is a handful of vectorized
+operations instead of one DataFrame pipeline per match. The matrices are
+saved in the store as a compressed ``.npz``.
+
+    python pass_graphs.py events_store
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from eventstore import read_season_events, store_match_ids
+from schema import category_mask
+
+
+GRAPHS_FILE = 'pass_graphs.npz'
+
+GRAPH_COLUMNS = ['matchId', 'teamId', 'playerId', 'playerName', 'type', 'outcomeType', 'EPV']
+
+KEY_COLUMNS = (('matchId', np.int64), ('teamId', np.int64), ('playerId', np.int64), ('playerName', str))
+
+# nodes per batched shortest-path call of the betweenness, whole networks at a time
+BETWEENNESS_BATCH = 1024
+
+METRIC_COLUMNS = ['out_degree', 'in_degree', 'passes', 'received', 'EPV', 'betweenness', 'eigenvector']
+
+
+def pass_edges(events_df):
+    """
+    Successful passes of every (match, team) of an events frame.
+
+    Returns
+    -------
+    DataFrame with matchId, teamId, playerId, recipientId and EPV, the
+    recipient being the player of the team's next event in the match, and
+    the pass location x, y when the frame has it.
+    """
+    events_df = events_df.loc[events_df['playerId'].notna().to_numpy()]
+    match_col = events_df['matchId'].to_numpy(dtype=np.int64)
+    team_col = events_df['teamId'].to_numpy(dtype=np.int64)
+    # stable, so events keep the match order within each (match, team)
+    order = np.lexsort((team_col, match_col))
+    match_col, team_col = match_col[order], team_col[order]
+    player_col = events_df['playerId'].to_numpy(dtype=np.int64)[order]
+
+    recipient = np.full(len(order), -1, dtype=np.int64)
+    same_team = (match_col[1:] == match_col[:-1]) & (team_col[1:] == team_col[:-1])
+    recipient[:-1][same_team] = player_col[1:][same_team]
+
+    successful = category_mask(events_df['type'], 'Pass') & category_mask(events_df['outcomeType'], 'Successful')
+    keep = successful[order] & (recipient >= 0) & (recipient != player_col)
+    epv = events_df['EPV'].to_numpy(dtype=float)[order] if 'EPV' in events_df.columns else np.zeros(len(order))
+    edges = pd.DataFrame({'matchId': match_col[keep], 'teamId': team_col[keep], 'playerId': player_col[keep],
+                          'recipientId': recipient[keep], 'EPV': np.nan_to_num(epv[keep])})
+    for column in ('x', 'y'):
+        if column in events_df.columns:
+            edges[column] = events_df[column].to_numpy(dtype=float)[order][keep]
+    return edges
+
+
+class SeasonPassGraphs:
+    """
+    Parameters
+    ----------
+    players : DataFrame of matchId, teamId, playerId, playerName, one row per
+              node, sorted by (matchId, teamId, playerId).
+
+    counts, epv : (nodes, nodes) sparse matrices of the pass counts and EPV
+                  sums from row player to column player, zero across networks.
+    """
+
+    def __init__(self, players, counts, epv):
+        self.players = players.reset_index(drop=True)
+        self.counts = sparse.csr_matrix(counts)
+        self.epv = sparse.csr_matrix(epv)
+
+        groups = self.players.groupby(['matchId', 'teamId'], sort=True)
+        # network of every node, and first and last + 1 node of every network
+        self.network_ids = groups.ngroup().to_numpy()
+        self.networks = groups.size().rename('size').reset_index()
+        self.networks['stop'] = np.cumsum(self.networks['size'].to_numpy())
+        self.networks['start'] = self.networks['stop'] - self.networks['size']
+        self._blocks = {(int(match_id), int(team_id)): (int(start), int(stop)) for match_id, team_id, start, stop
+                        in self.networks[['matchId', 'teamId', 'start', 'stop']].itertuples(index=False)}
+
+    @classmethod
+    def from_events(cls, events_df):
+        """Pass networks of every (match, team) of one or several matches."""
+        named = events_df.loc[events_df['playerId'].notna().to_numpy()]
+        players = named.groupby(['matchId', 'teamId', 'playerId'], sort=True, observed=True)['playerName'] \
+            .first().reset_index()
+        players = players.astype(dict(KEY_COLUMNS))
+        nodes = pd.MultiIndex.from_frame(players[['matchId', 'teamId', 'playerId']])
+
+        passes = pass_edges(events_df)
+        src = nodes.get_indexer(pd.MultiIndex.from_frame(passes[['matchId', 'teamId', 'playerId']]))
+        dst = nodes.get_indexer(pd.MultiIndex.from_arrays([passes['matchId'], passes['teamId'],
+                                                          passes['recipientId']]))
+        n_nodes = len(players)
+        edges, edge_ids = np.unique(src * n_nodes + dst, return_inverse=True)
+        rows, cols = np.divmod(edges, n_nodes)
+        counts = np.bincount(edge_ids, minlength=len(edges)).astype(np.int32)
+        epv = np.bincount(edge_ids, weights=passes['EPV'].to_numpy(), minlength=len(edges)).astype(np.float32)
+        shape = (n_nodes, n_nodes)
+        return cls(players, sparse.csr_matrix((counts, (rows, cols)), shape=shape),
+                   sparse.csr_matrix((epv, (rows, cols)), shape=shape))
+
+    def save(self, path):
+        counts, epv = self.counts.tocoo(), self.epv.tocoo()
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(tmp_path, count_rows=counts.row, count_cols=counts.col, counts=counts.data,
+                            epv_rows=epv.row, epv_cols=epv.col, epv=epv.data,
+                            **{f'key_{column}': self.players[column].to_numpy(dtype=dtype)
+                               for column, dtype in KEY_COLUMNS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            players = pd.DataFrame({name[len('key_'):]: data[name] for name in data.files if name.startswith('key_')})
+            shape = (len(players), len(players))
+            counts = sparse.csr_matrix((data['counts'], (data['count_rows'], data['count_cols'])), shape=shape)
+            epv = sparse.csr_matrix((data['epv'], (data['epv_rows'], data['epv_cols'])), shape=shape)
+        return cls(players, counts, epv)
+
+    def match_ids(self):
+        return sorted(self.networks['matchId'].unique().tolist())
+
+    def network(self, match_id, team_id):
+        """
+        Players, pass counts and EPV sums of one (match, team) network, the
+        matrices indexed like the players.
+        """
+        start, stop = self._blocks.get((int(match_id), int(team_id)), (0, 0))
+        return (self.players.iloc[start:stop].reset_index(drop=True), self.counts[start:stop, start:stop],
+                self.epv[start:stop, start:stop])
+
+    def degree(self):
+        """
+        Number of distinct recipients (out_degree) and passers (in_degree),
+        passes made and received, and EPV of the passes made, per node.
+        """
+        counts = self.counts
+        return pd.DataFrame({'out_degree': np.diff(counts.indptr), 'in_degree': np.diff(counts.tocsc().indptr),
+                             'passes': np.asarray(counts.sum(axis=1)).ravel(),
+                             'received': np.asarray(counts.sum(axis=0)).ravel(),
+                             'EPV': np.asarray(self.epv.sum(axis=1)).ravel()})
+
+    def betweenness(self, n_pivots=None, random_state=100):
+        """
+        Betweenness centrality of every node within its network, normalized
+        by (n - 1)(n - 2) for a network of n players.
+
+        Passes are distances of 1 / count, so a pair of players who pass a lot
+        is close. The result is approximate even without pivots: each pair
+        contributes a single one of its shortest paths, where exact
+        betweenness splits the pair between all of them when several are
+        equally short. With ``n_pivots`` only that many sampled sources per
+        network are walked as well, their counts scaled up by n / n_pivots.
+        """
+        n_nodes = len(self.players)
+        distance = self.counts.astype(float)
+        distance.data = 1 / distance.data
+        size = self.networks['size'].to_numpy()[self.network_ids]
+        position = np.arange(n_nodes) - self.networks['start'].to_numpy()[self.network_ids]
+
+        sources = np.ones(n_nodes, dtype=bool)
+        scale = np.ones(n_nodes)
+        if n_pivots is not None:
+            # a random rank of every node within its network (nodes are already grouped by network),
+            # the pivots are the first n_pivots
+            rank = np.empty(n_nodes, dtype=np.int64)
+            order = np.lexsort((np.random.default_rng(random_state).random(n_nodes), self.network_ids))
+            rank[order] = position
+            sources = rank < n_pivots
+            scale = size / np.minimum(size, n_pivots)
+
+        passing = np.zeros(n_nodes)
+        stops = self.networks['stop'].to_numpy()
+        start = 0
+        while start < n_nodes:
+            # whole networks up to BETWEENNESS_BATCH nodes, no path leaves the block
+            stop = stops[np.searchsorted(stops, start + BETWEENNESS_BATCH, side='right') - 1]
+            if stop <= start:
+                # a single network larger than the batch
+                stop = stops[np.searchsorted(stops, start, side='right')]
+            batch_sources = np.flatnonzero(sources[start:stop])
+            _, predecessors = csgraph.shortest_path(distance[start:stop, start:stop], method='D', directed=True,
+                                                    indices=batch_sources, return_predecessors=True)
+            # walk every path back from its target, counting the players strictly between the ends
+            current = predecessors
+            inner = (current >= 0) & (current != batch_sources[:, None])
+            while inner.any():
+                passing += np.bincount(current[inner] + start, minlength=n_nodes)
+                current = np.take_along_axis(predecessors, np.where(inner, current, 0), axis=1)
+                inner &= (current >= 0) & (current != batch_sources[:, None])
+            start = stop
+
+        # pivot counts are added to the nodes they pass through, scaled by their network's sampling rate
+        pairs = np.maximum((size - 1) * (size - 2), 1)
+        return passing * scale / pairs
+
+    def eigenvector(self, max_iter=100, tol=1e-6):
+        """
+        Eigenvector centrality of every node within its network, weighted by
+        the pass counts: a player is central when central players pass to
+        them. Power iteration of x + A^T x over all networks at once, each
+        network normalized to unit length.
+        """
+        transposed = self.counts.T.tocsr().astype(float)
+        x = np.ones(len(self.players))
+        for _ in range(max_iter):
+            x_next = x + transposed @ x
+            norm = np.sqrt(np.bincount(self.network_ids, weights=x_next ** 2))
+            x_next /= np.where(norm > 0, norm, 1)[self.network_ids]
+            if np.abs(x_next - x).max(initial=0) < tol:
+                return x_next
+            x = x_next
+        return x
+
+    def reciprocity(self):
+        """
+        Reciprocity of every network.
+
+        Returns
+        -------
+        DataFrame with matchId, teamId, reciprocity (share of the passes
+        returned the other way, min(a->b, b->a) summed over the edges and
+        divided by all passes, a score weighted by the pass counts) and pairs
+        (pairs of players who passed to each other at least once each way,
+        with no minimum number of passes).
+        """
+        returned = self.counts.minimum(self.counts.T)
+        returned.eliminate_zeros()
+        n_networks = len(self.networks)
+        passes = np.bincount(self.network_ids, weights=np.asarray(self.counts.sum(axis=1)).ravel(),
+                             minlength=n_networks)
+        passes_returned = np.bincount(self.network_ids, weights=np.asarray(returned.sum(axis=1)).ravel(),
+                                      minlength=n_networks)
+        pairs = np.bincount(self.network_ids, weights=np.diff(returned.indptr), minlength=n_networks) // 2
+        reciprocity = self.networks[['matchId', 'teamId']].copy()
+        reciprocity['reciprocity'] = passes_returned / np.where(passes > 0, passes, 1)
+        reciprocity['pairs'] = pairs.astype(np.int64)
+        return reciprocity
+
+    def metrics(self, n_pivots=None):
+        """Players with every per-node metric of METRIC_COLUMNS."""
+        metrics = pd.concat([self.players, self.degree()], axis=1)
+        metrics['betweenness'] = self.betweenness(n_pivots)
+        metrics['eigenvector'] = self.eigenvector()
+        return metrics
+
+
+def season_ranking(metrics, team_id=None, by='eigenvector'):
+    """
+    Per-match metrics (see SeasonPassGraphs.metrics) of a team, or of every
+    team, averaged over the matches of each player.
+
+    Returns
+    -------
+    DataFrame with teamId, playerId, playerName, matches and the mean of
+    every metric, sorted by ``by``, highest first.
+    """
+    if team_id is not None:
+        metrics = metrics.loc[metrics['teamId'].to_numpy() == int(team_id)]
+    ranking = metrics.groupby(['teamId', 'playerId'], sort=False).agg(
+        playerName=('playerName', 'first'), matches=('matchId', 'size'),
+        **{column: (column, 'mean') for column in METRIC_COLUMNS})
+    return ranking.reset_index().sort_values(by, ascending=False, kind='stable').reset_index(drop=True)
+
+
+def season_pass_graphs(store_path, path=None):
+    """
+    The saved networks of the store, built again (and saved) when the store
+    holds matches they do not.
+    """
+    path = os.path.join(store_path, GRAPHS_FILE) if path is None else path
+    match_ids = store_match_ids(store_path)
+    if os.path.exists(path):
+        graphs = SeasonPassGraphs.load(path)
+        if set(match_ids) <= set(graphs.match_ids()):
+            return graphs
+    graphs = SeasonPassGraphs.from_events(read_season_events(store_path, columns=GRAPH_COLUMNS,
+                                                             match_ids=match_ids))
+    graphs.save(path)
+    return graphs
+
+
+if __name__ == '__main__':
+    graphs = season_pass_graphs(sys.argv[1])
+    print(f'{len(graphs.networks)} networks, {len(graphs.players)} players, {graphs.counts.nnz} edges')
+    print(season_ranking(graphs.metrics()).head(10).to_string(index=False))
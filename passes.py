@@ -0,0 +1,69 @@
+"""
+Enriched successful passes, shared by all pass-based visuals.
+
+The pass network, attacking network and both PV formation maps start from
+the same table: a team's successful passes with passer and recipient names,
+positions and kit numbers, the recipient being whoever made the team's next
+event. It is computed once per (matchId, teamId, events frame) and kept in a
+bounded LRU, so switching between those views only costs the plotting.
+"""
+import threading
+
+from cachetools import LRUCache, cached
+
+from eventstore import frame_key
+from lineups import match_lineups
+from schema import category_mask
+
+
+PASS_CACHE_SIZE = 64
+
+
+def _cache_key(match_data, events_df, team_id, lineups=None):
+    # the frame's contents too: a minute slice or a differently typed copy of the match is another table
+    return int(match_data['matchId']), int(team_id), frame_key(events_df)
+
+
+@cached(LRUCache(maxsize=PASS_CACHE_SIZE), key=_cache_key, lock=threading.Lock())
+def enriched_passes(match_data, events_df, team_id, lineups=None):
+    """
+    Parameters
+    ----------
+    match_data : match dict from matches_data.json.
+
+    events_df : events of the match (at least those of the team).
+
+    team_id : ID of the team, the passes of which are required.
+
+    lineups : LineupTables holding the match, built from match_data when omitted.
+
+    Returns
+    -------
+    DataFrame of the team's successful passes with playerName, passRecipientId,
+    passRecipientName, playerPos, playerKitNumber, playerPosReceipt and
+    playerKitNumberReceipt added. The frame is shared between callers through
+    the cache and must not be modified in place.
+    """
+    lineups = lineups if lineups is not None else match_lineups(match_data)
+    roster = lineups.team_players(match_data['matchId'], team_id).set_index('playerId')
+
+    # the team's events in match order, the recipient of a pass is the player of the next one
+    passes_df = events_df.loc[events_df['teamId'] == team_id].reset_index(drop=True)
+    passes_df = passes_df.drop(columns=['playerName', 'passRecipientId', 'passRecipientName'], errors='ignore')
+    passes_df['playerId'] = passes_df['playerId'].astype('float').astype('Int64')
+    passes_df = passes_df.dropna(subset=['playerId'])
+    passes_df['playerName'] = passes_df['playerId'].map(roster['playerName'])
+    passes_df['passRecipientId'] = passes_df['playerId'].shift(-1)
+    passes_df['passRecipientName'] = passes_df['playerName'].shift(-1)
+    passes_df = passes_df.dropna(subset=['passRecipientName'])
+
+    is_pass = category_mask(passes_df['type'], 'Pass') & category_mask(passes_df['outcomeType'], 'Successful')
+    passes_df = passes_df.loc[is_pass & (passes_df['playerName'] != passes_df['passRecipientName']).to_numpy()]
+
+    passes_df = passes_df.assign(
+        playerPos=passes_df['playerId'].map(roster['playerPos']),
+        playerKitNumber=passes_df['playerId'].map(roster['playerKitNumber']),
+        playerPosReceipt=passes_df['passRecipientId'].map(roster['playerPos']),
+        playerKitNumberReceipt=passes_df['passRecipientId'].map(roster['playerKitNumber']),
+    )
+    return passes_df.reset_index(drop=True)
@@ -0,0 +1,115 @@
+"""
+Pitches drawn from cached templates.
+
+The visuals use a handful of pitch styles (opta/statsbomb, full or half,
+horizontal or vertical, dark or light lines) but used to construct an
+mplsoccer pitch and draw its markings (a dozen lines, arcs and spots, each
+its own artist) for every figure. A PitchTemplate draws a style once on an
+off-screen figure and keeps the markings as data-space paths, so putting
+the pitch on a new axes is the axes setup, the background colour and one
+collection per line style, with the data drawn on top as before.
+
+Only the paths are shared: every draw constructs its own mplsoccer pitch
+(no drawing, a few milliseconds) for the axes setup and for the caller to
+plot on, so render threads never share a pitch object. The axes setup is
+mplsoccer's private ``_set_axes``, checked against the mplsoccer version
+pinned in requirements.txt.
+"""
+import threading
+from collections import defaultdict
+
+from cachetools import LRUCache, cached
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from mplsoccer import Pitch, VerticalPitch
+
+
+class PitchTemplate:
+    """
+    Parameters
+    ----------
+    pitch_class : mplsoccer Pitch or VerticalPitch.
+
+    style : keyword arguments of ``pitch_class``.
+    """
+
+    def __init__(self, pitch_class, style):
+        self.pitch_class = pitch_class
+        self.style = dict(style)
+        pitch = self.new_pitch()
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        pitch.draw(ax=ax)
+        # arcs only settle their path on the first draw
+        fig.canvas.draw()
+
+        # grass is an image, not markings, and is drawn the usual way
+        self._groups = None
+        if ax.images or ax.collections or ax.texts:
+            return
+
+        groups = defaultdict(lambda: defaultdict(list))
+        for line in ax.lines:
+            style = (line.get_zorder(), line.get_solid_capstyle(), line.get_solid_joinstyle())
+            color = to_rgba(line.get_color(), line.get_alpha())
+            self._append(groups[style], line.get_path(), color, 'none', line)
+        for patch in ax.patches:
+            style = (patch.get_zorder(), patch.get_capstyle(), patch.get_joinstyle())
+            # patch colours already carry the alpha
+            path = patch.get_path().transformed(patch.get_patch_transform())
+            self._append(groups[style], path, patch.get_edgecolor(), patch.get_facecolor(), patch)
+        self._groups = {style: dict(props) for style, props in groups.items()}
+
+    @staticmethod
+    def _append(props, path, edgecolor, facecolor, artist):
+        props['paths'].append(path)
+        props['edgecolors'].append(edgecolor)
+        props['facecolors'].append(facecolor)
+        props['linewidths'].append(artist.get_linewidth())
+        props['linestyles'].append(artist.get_linestyle())
+
+    def new_pitch(self):
+        """A new mplsoccer pitch of the template's style."""
+        return self.pitch_class(**self.style)
+
+    def draw(self, ax):
+        """Draw the pitch on ``ax``, like ``pitch.draw(ax=ax)``, and return the pitch, of this call only."""
+        pitch = self.new_pitch()
+        if self._groups is None:
+            pitch.draw(ax=ax)
+            return pitch
+        pitch._set_axes(ax)
+        ax.set_facecolor(pitch.pitch_color)
+        for (zorder, capstyle, joinstyle), props in self._groups.items():
+            markings = PathCollection(props['paths'], edgecolors=props['edgecolors'],
+                                      facecolors=props['facecolors'], linewidths=props['linewidths'],
+                                      linestyles=props['linestyles'], capstyle=capstyle, joinstyle=joinstyle,
+                                      zorder=zorder, transform=ax.transData)
+            ax.add_collection(markings, autolim=False)
+        return pitch
+
+
+def _style_key(vertical=False, **style):
+    return vertical, tuple(sorted(style.items()))
+
+
+@cached(LRUCache(maxsize=16), key=_style_key, lock=threading.Lock())
+def pitch_template(vertical=False, **style):
+    """Template of the pitch built from ``style`` (mplsoccer pitch arguments), cached per style."""
+    return PitchTemplate(VerticalPitch if vertical else Pitch, style)
+
+
+def draw_pitch(ax, vertical=False, **style):
+    """
+    Draw a pitch of the given style on ``ax`` from its cached template.
+
+    Returns
+    -------
+    The mplsoccer pitch, to plot the data on ``ax`` with, not shared with
+    any other call.
+    """
+    return pitch_template(vertical, **style).draw(ax)
@@ -0,0 +1,152 @@
+"""
+Cache of rendered figures, as encoded image bytes.
+
+Entries are keyed on (matchId, teamId, view, parameters, data version) and
+kept in a size-bounded in-memory LRU backed by a size-bounded directory on
+local disk, where the least recently used files are evicted first. A hit is
+served without touching matplotlib.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+from cachetools import LRUCache
+
+from figures import close_figure
+
+
+# bump when the drawing code changes, so old images on disk are not served
+CACHE_VERSION = 4
+
+MEMORY_BYTES = 64 * 2**20
+DISK_BYTES = 1024 * 2**20
+
+
+def file_version(*paths):
+    """Version string of the given data files, changes whenever one of them is rewritten."""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    return '.'.join(parts)
+
+
+def encode_figure(fig, fmt='png', dpi=200):
+    """Encode a figure the way st.pyplot does and close it."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    close_figure(fig)
+    return buffer.getvalue()
+
+
+class RenderCache:
+    """
+    Parameters
+    ----------
+    cache_dir : directory of the on-disk cache, memory only when None.
+
+    memory_bytes : size limit of the in-memory LRU.
+
+    disk_bytes : size limit of the on-disk cache.
+    """
+
+    def __init__(self, cache_dir=None, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self._memory = LRUCache(maxsize=memory_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+        self._disk_used = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_used = sum(size for _, _, size in self._disk_entries())
+
+    @staticmethod
+    def key(match_id, team_id, view, params, data_version, fmt='png'):
+        """Hex digest identifying one rendered image."""
+        payload = json.dumps([CACHE_VERSION, int(match_id), int(team_id), view, params, data_version, fmt],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def get(self, key):
+        """Cached bytes for ``key``, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+        if data is not None or self.cache_dir is None:
+            return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # the file mtime is the recency used by the disk eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def _remember(self, key, data):
+        # an image larger than the whole memory budget is only kept on disk
+        if len(data) <= self._memory.maxsize:
+            with self._lock:
+                self._memory[key] = data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.cache_dir is None:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            # an existing file of the key is overwritten, only the difference is new disk use;
+            # under the lock, so two threads putting one key do not both count it
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            self._disk_used += len(data) - replaced
+            over_limit = self._disk_used > self.disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        used = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+        with self._lock:
+            self._disk_used = used
+
+    def get_or_render(self, key, render):
+        """Cached bytes for ``key``, calling ``render()`` for them on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
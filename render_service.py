@@ -0,0 +1,132 @@
+"""
+Render jobs shared by every session of the app.
+
+A RenderService runs render jobs on a bounded pool of workers (threads by
+default; the visuals draw into figures outside pyplot on the Agg canvas,
+so figures do not share state across threads). Requests for a key that
+is already being rendered wait on the same job instead of starting their
+own, so a burst of identical requests after full time costs one render.
+Finished images go to the RenderCache, so the next request for a key
+never reaches the pool.
+
+When max_pending jobs are queued or running, new keys are refused with
+ServiceBusy rather than queued without bound. A request waits at most
+timeout seconds for its job; the job itself keeps running (a worker
+cannot be interrupted) and its image is still cached when it finishes.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+MAX_WORKERS = 4
+
+# name prefix of the worker threads, for code that must not start pools of its own inside one
+WORKER_PREFIX = 'render'
+MAX_PENDING = 32
+TIMEOUT = 60.0
+
+
+class ServiceBusy(RuntimeError):
+    """Too many render jobs are pending to accept a new one."""
+
+
+class RenderTimeout(TimeoutError):
+    """A render job did not finish in time."""
+
+
+class RenderService:
+    """
+    Parameters
+    ----------
+    cache : RenderCache the images are read from and stored in, or None.
+
+    max_workers : size of the default thread pool.
+
+    max_pending : number of distinct jobs queued or running before new ones are refused.
+
+    timeout : seconds a request waits for its job.
+
+    executor : concurrent.futures executor to run jobs on instead of the
+               default thread pool, e.g. a ProcessPoolExecutor (render
+               functions and their arguments must then be picklable).
+    """
+
+    def __init__(self, cache=None, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT,
+                 executor=None):
+        self.cache = cache
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=WORKER_PREFIX)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._counters = {'rendered': 0, 'cache_hits': 0, 'coalesced': 0, 'rejected': 0, 'timeouts': 0,
+                          'failed': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def submit(self, key, render, *args):
+        """
+        Future of the bytes of ``render(*args)`` for ``key``, the one of the
+        in-flight job when ``key`` is already being rendered.
+
+        Raises ServiceBusy when max_pending jobs are pending.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters['coalesced'] += 1
+                return future
+            if len(self._in_flight) >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise ServiceBusy(f'{len(self._in_flight)} render jobs pending')
+            future = self._executor.submit(render, *args)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def _finish(self, key, future):
+        # cache first, so a request arriving once the job is out of _in_flight finds the image;
+        # the job leaves _in_flight even when the cache cannot store it
+        try:
+            if future.cancelled() or future.exception() is not None:
+                self._count('failed')
+            else:
+                self._count('rendered')
+                if self.cache is not None:
+                    self.cache.put(key, future.result())
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+    def render(self, key, render, *args, timeout=None):
+        """
+        Bytes for ``key``: from the cache, from an identical in-flight job,
+        or from a new job running ``render(*args)``.
+
+        Raises ServiceBusy when the job cannot be queued, RenderTimeout when
+        it takes longer than ``timeout`` (default: the service timeout), and
+        whatever ``render`` raised when it failed.
+        """
+        if self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                self._count('cache_hits')
+                return data
+        future = self.submit(key, render, *args)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            self._count('timeouts')
+            raise RenderTimeout(f'render job {key} did not finish in time') from None
+
+    def stats(self):
+        """Job counters, and the number of jobs pending now."""
+        with self._lock:
+            return dict(self._counters, pending=len(self._in_flight))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
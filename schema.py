@@ -0,0 +1,77 @@
+"""
+Declared dtypes for the events frame.
+
+Enumerations are categoricals with a fixed category order, so a given event
+type always has the same integer code, coordinates are float32 and ids are
+int32. Filters such as ``type == 'Pass'`` go through ``category_mask`` and
+compare codes instead of Python strings.
+"""
+import numpy as np
+import pandas as pd
+
+
+EVENT_TYPES = ['Pass', 'OffsidePass', 'TakeOn', 'Carry', 'BallTouch', 'Dispossessed', 'Foul', 'Tackle',
+               'Interception', 'BlockedPass', 'Clearance', 'BallRecovery', 'Aerial', 'Challenge', 'Error',
+               'MissedShots', 'SavedShot', 'ShotOnPost', 'Goal', 'ChanceMissed', 'Save', 'Claim', 'Punch',
+               'KeeperPickup', 'KeeperSweeper', 'Smother', 'CrossNotClaimed', 'PenaltyFaced', 'CornerAwarded',
+               'OffsideProvoked', 'OffsideGiven', 'ShieldBallOpp', 'GoodSkill', 'Card', 'SubstitutionOff',
+               'SubstitutionOn', 'FormationChange', 'FormationSet', 'Start', 'End']
+
+OUTCOME_TYPES = ['Successful', 'Unsuccessful']
+
+EVENT_SCHEMA = {
+    'id': 'int64',
+    'matchId': 'int32',
+    'minute': 'int16',
+    'teamId': 'int32',
+    'playerId': 'Int32',
+    'playerName': 'category',
+    'type': EVENT_TYPES,
+    'outcomeType': OUTCOME_TYPES,
+    'x': 'float32',
+    'y': 'float32',
+    'endX': 'float32',
+    'endY': 'float32',
+    'EPV': 'float32',
+    'isOwnGoal': 'bool',
+}
+
+
+def _categorical(series, categories):
+    # values outside the declared list are appended, so declared codes never move
+    observed = series.dropna().unique()
+    extra = sorted(set(map(str, observed)) - set(categories))
+    return series.astype(pd.CategoricalDtype(categories + extra))
+
+
+def apply_event_schema(events_df):
+    """Cast the known columns of an events frame to the declared dtypes, in place."""
+    for column, dtype in EVENT_SCHEMA.items():
+        if column not in events_df.columns:
+            continue
+        if isinstance(dtype, list):
+            events_df[column] = _categorical(events_df[column], dtype)
+        elif dtype == 'bool':
+            events_df[column] = events_df[column].eq(True)
+        elif dtype == 'Int32':
+            # playerId comes out of the CSV as float with NaN for team events
+            events_df[column] = events_df[column].astype('float').astype(dtype)
+        else:
+            events_df[column] = events_df[column].astype(dtype)
+    return events_df
+
+
+def category_mask(series, values):
+    """
+    Boolean mask of ``series`` being one of ``values``.
+
+    For categoricals the values are looked up once in the categories and the
+    comparison runs on the integer codes.
+    """
+    if isinstance(values, str):
+        values = [values]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.dtype.categories.get_indexer(values)
+        codes = codes[codes >= 0]
+        return np.isin(series.cat.codes.to_numpy(), codes)
+    return series.isin(values).to_numpy()
@@ -0,0 +1,221 @@
+"""
+Event counts and EPV sums binned on the positional-play grid.
+
+The positional heatmaps of mplsoccer (juego de posición: 'full',
+'horizontal' and 'vertical') are all unions of the cells between
+consecutive ``pitch.dim.positional_x`` and ``positional_y`` lines, a 6 x 5
+grid of the Opta pitch. SpatialBins holds, for every (match, team, player)
+and every event category of CATEGORIES, the count and the EPV sum of the
+events in each of those cells, computed for a whole season with one
+``np.bincount``. A heatmap of any player, team or set of matches is then a
+sum over a slice, with no event touched, and the season tensors are saved
+in the store as a compressed ``.npz``.
+
+    python spatial.py events_store
+"""
+import os
+import sys
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, cached
+from mplsoccer import Pitch
+
+from defensive import DEFENSIVE_TYPES
+from eventstore import frame_key, read_season_events, store_match_ids
+from schema import category_mask
+
+
+BINS_FILE = 'spatial_bins.npz'
+
+BIN_COLUMNS = ['matchId', 'teamId', 'playerId', 'playerName', 'type', 'outcomeType', 'x', 'y', 'EPV']
+
+# category -> (event types, None for every event with a player and a location; successful only)
+CATEGORIES = {
+    'Touches': (None, False),
+    'Passes': (['Pass'], False),
+    'Successful Passes': (['Pass'], True),
+    'Shots': (['MissedShots', 'SavedShot', 'ShotOnPost', 'Goal'], False),
+    'Take-Ons': (['TakeOn'], False),
+    'Defensive Actions': (DEFENSIVE_TYPES, True),
+}
+
+STATISTICS = ('count', 'EPV')
+
+BINS_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=1)
+def positional_edges():
+    """x and y edges of the positional-play cells, Opta pitch units."""
+    dim = Pitch(pitch_type='opta').dim
+    return np.asarray(dim.positional_x), np.asarray(dim.positional_y)
+
+
+def _cell_index(values, edges):
+    # bins are [a, b) except the last, which also holds its right edge, and the edges are compared in
+    # the dtype of the values (float32 coordinates), all as in scipy's binned_statistic_2d
+    edges = edges.astype(values.dtype)
+    index = np.searchsorted(edges, values, side='right') - 1
+    index[values == edges[-1]] = len(edges) - 2
+    index[~((values >= edges[0]) & (values <= edges[-1]))] = -1
+    return index
+
+
+class SpatialBins:
+    """
+    Parameters
+    ----------
+    keys : DataFrame of matchId, teamId, playerId, playerName, one row per
+           (match, team, player).
+
+    counts, epv : (keys, categories, x cells, y cells) arrays.
+
+    categories : category names, in the order of the second axis.
+    """
+
+    def __init__(self, keys, counts, epv, categories=tuple(CATEGORIES)):
+        self.keys = keys.reset_index(drop=True)
+        self.counts = counts
+        self.epv = epv
+        self.categories = list(categories)
+
+    @classmethod
+    def from_events(cls, events_df):
+        """Bin the events of one or several matches."""
+        x_edges, y_edges = positional_edges()
+        n_x, n_y = len(x_edges) - 1, len(y_edges) - 1
+
+        events_df = events_df.loc[events_df['playerId'].notna().to_numpy()]
+        xi = _cell_index(events_df['x'].to_numpy(), x_edges)
+        yi = _cell_index(events_df['y'].to_numpy(), y_edges)
+        located = (xi >= 0) & (yi >= 0)
+
+        groups = events_df.groupby(['matchId', 'teamId', 'playerId'], sort=True, observed=True)
+        key = groups.ngroup().to_numpy()
+        keys = groups['playerName'].first().reset_index()
+        keys = keys.astype({'matchId': np.int64, 'teamId': np.int64, 'playerId': np.int64, 'playerName': str})
+        n_keys = len(keys)
+
+        epv = events_df['EPV'].to_numpy(dtype=float) if 'EPV' in events_df.columns else np.zeros(len(events_df))
+        epv = np.nan_to_num(epv)
+        successful = category_mask(events_df['outcomeType'], 'Successful')
+        size = n_keys * len(CATEGORIES) * n_x * n_y
+        counts, epv_sums = np.zeros(size), np.zeros(size)
+        for c, (types, successful_only) in enumerate(CATEGORIES.values()):
+            mask = located if types is None else located & category_mask(events_df['type'], types)
+            if successful_only:
+                mask = mask & successful
+            flat = ((key[mask] * len(CATEGORIES) + c) * n_x + xi[mask]) * n_y + yi[mask]
+            counts += np.bincount(flat, minlength=size)
+            epv_sums += np.bincount(flat, weights=epv[mask], minlength=size)
+
+        shape = (n_keys, len(CATEGORIES), n_x, n_y)
+        return cls(keys, counts.reshape(shape).astype(np.int32), epv_sums.reshape(shape).astype(np.float32))
+
+    def save(self, path):
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(tmp_path, counts=self.counts, epv=self.epv, categories=np.array(self.categories),
+                            **{f'key_{column}': self.keys[column].to_numpy(dtype=dtype)
+                               for column, dtype in (('matchId', np.int64), ('teamId', np.int64),
+                                                     ('playerId', np.int64), ('playerName', str))})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            keys = pd.DataFrame({name[len('key_'):]: data[name] for name in data.files if name.startswith('key_')})
+            return cls(keys, data['counts'], data['epv'], data['categories'].tolist())
+
+    def match_ids(self):
+        return sorted(self.keys['matchId'].unique().tolist())
+
+    def rows(self, team_id=None, player_id=None, match_ids=None):
+        """Boolean mask of the keys of a team, a player and/or a set of matches."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        if team_id is not None:
+            mask &= self.keys['teamId'].to_numpy() == int(team_id)
+        if player_id is not None:
+            mask &= self.keys['playerId'].to_numpy() == int(player_id)
+        if match_ids is not None:
+            mask &= np.isin(self.keys['matchId'].to_numpy(), list(match_ids))
+        return mask
+
+    def player_id(self, team_id, player_name):
+        """Id of the player of a team with the given name, None if they are not in the bins."""
+        rows = self.rows(team_id) & (self.keys['playerName'].to_numpy() == player_name)
+        return int(self.keys['playerId'].to_numpy()[rows][0]) if rows.any() else None
+
+    def cells(self, category, statistic='count', team_id=None, player_id=None, match_ids=None):
+        """(x cells, y cells) sum of the count or EPV of one category over the selected keys."""
+        tensor = self.counts if statistic == 'count' else self.epv
+        rows = self.rows(team_id, player_id, match_ids)
+        return tensor[rows, self.categories.index(category)].sum(axis=0, dtype=float)
+
+
+def _bins_key(events_df):
+    return frame_key(events_df, BIN_COLUMNS)
+
+
+@cached(LRUCache(maxsize=BINS_CACHE_SIZE), key=_bins_key, lock=threading.Lock())
+def match_spatial_bins(events_df):
+    """SpatialBins of an events frame, computed once per frame."""
+    return SpatialBins.from_events(events_df)
+
+
+def season_spatial_bins(store_path, path=None):
+    """
+    The saved bins of the store, binned again (and saved) when the store
+    holds matches they do not.
+    """
+    path = os.path.join(store_path, BINS_FILE) if path is None else path
+    match_ids = store_match_ids(store_path)
+    if os.path.exists(path):
+        bins = SpatialBins.load(path)
+        if set(match_ids) <= set(bins.match_ids()) and bins.categories == list(CATEGORIES):
+            return bins
+    bins = SpatialBins.from_events(read_season_events(store_path, columns=BIN_COLUMNS, match_ids=match_ids))
+    bins.save(path)
+    return bins
+
+
+@lru_cache(maxsize=3)
+def _positional_cells(positional):
+    # every positional bin, in mplsoccer's order, as a mask of the cells it covers
+    x_edges, y_edges = positional_edges()
+    template = Pitch(pitch_type='opta').bin_statistic_positional(np.array([]), np.array([]),
+                                                                  positional=positional)
+    cx = (x_edges[:-1] + x_edges[1:]) / 2
+    cy = (y_edges[:-1] + y_edges[1:]) / 2
+    masks = []
+    for stats in template:
+        x_grid, y_grid = stats['x_grid'], stats['y_grid']
+        zone_masks = np.empty(stats['statistic'].shape + (len(cx), len(cy)), dtype=bool)
+        for i, j in np.ndindex(stats['statistic'].shape):
+            x0, x1 = sorted((x_grid[i, j], x_grid[i, j + 1]))
+            y0, y1 = sorted((y_grid[i, j], y_grid[i + 1, j]))
+            zone_masks[i, j] = np.outer((cx > x0) & (cx < x1), (cy > y0) & (cy < y1))
+        masks.append(zone_masks)
+    return template, masks
+
+
+def positional_statistic(cells, positional='full'):
+    """
+    mplsoccer bin statistics (as from ``pitch.bin_statistic_positional``) of
+    binned cells, ready for ``pitch.heatmap_positional``.
+    """
+    template, masks = _positional_cells(positional)
+    statistic = []
+    for stats, zone_masks in zip(template, masks):
+        stats = dict(stats)
+        stats['statistic'] = (zone_masks * cells).sum(axis=(-2, -1))
+        statistic.append(stats)
+    return statistic
+
+
+if __name__ == '__main__':
+    bins = season_spatial_bins(sys.argv[1])
+    print(f'{len(bins.keys)} (match, team, player) keys over {len(bins.match_ids())} matches, '
+          f'{bins.counts.nbytes + bins.epv.nbytes} bytes of bins')
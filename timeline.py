@@ -0,0 +1,107 @@
+"""
+Who was on the pitch when.
+
+MatchTimeline turns the starters of the lineup tables and the
+SubstitutionOn / SubstitutionOff / red card events of a match into
+on-pitch intervals per player and, per team, the periods during which the
+same XI was on the pitch. Restricting events to one of those periods is
+then a single interval mask over the minute column.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache, cached
+
+from lineups import match_lineups
+from schema import category_mask
+
+
+RED_CARDS = ('Red', 'SecondYellow')
+
+
+def interval_mask(events_df, start, end, column='minute'):
+    """Mask of the events with start <= minute < end."""
+    minutes = events_df[column].to_numpy()
+    return (minutes >= start) & (minutes < end)
+
+
+def _red_card_mask(events_df):
+    if 'cardType' not in events_df.columns:
+        return np.zeros(len(events_df), dtype=bool)
+    card_type = events_df['cardType'].astype('string').fillna('')
+    return category_mask(events_df['type'], 'Card') & card_type.str.contains('|'.join(RED_CARDS)).to_numpy()
+
+
+class MatchTimeline:
+    """
+    Attributes
+    ----------
+    players : DataFrame with teamId, playerId, start and end (minutes) of every
+              player who took the pitch, end being the match end if never taken off.
+
+    end : minute after the last event of the match.
+    """
+
+    def __init__(self, match_id, events_df, lineups):
+        self.end = float(events_df['minute'].max()) + 1 if len(events_df) else 0.0
+
+        squads = lineups.players.loc[[int(match_id)]].reset_index() if int(match_id) in lineups.players.index \
+            else lineups.players.iloc[:0].reset_index()
+        squads = squads[['teamId', 'playerId', 'isFirstEleven']]
+
+        is_on = category_mask(events_df['type'], 'SubstitutionOn')
+        is_off = category_mask(events_df['type'], 'SubstitutionOff') | _red_card_mask(events_df)
+        changes = events_df.loc[is_on | is_off, ['playerId', 'minute']].assign(on=is_on[is_on | is_off])
+        changes = changes.dropna(subset=['playerId'])
+        changes['playerId'] = changes['playerId'].astype('int64')
+        came_on = changes.loc[changes['on']].groupby('playerId')['minute'].min()
+        went_off = changes.loc[~changes['on']].groupby('playerId')['minute'].min()
+
+        start = np.where(squads['isFirstEleven'], 0.0, squads['playerId'].map(came_on).astype('float'))
+        end = squads['playerId'].map(went_off).astype('float').fillna(self.end).to_numpy()
+        players = squads[['teamId', 'playerId']].assign(start=start, end=end)
+        self.players = players.loc[players['start'].notna()].reset_index(drop=True)
+
+    def xi_periods(self, team_id):
+        """
+        The periods of unchanged XI of a team.
+
+        Returns
+        -------
+        periods : DataFrame with start and end of each period, in order.
+
+        player_ids : array of the team's players.
+
+        on_pitch : bool array (periods x players), True when the player was on the pitch for the whole period.
+        """
+        team = self.players.loc[self.players['teamId'] == int(team_id)]
+        starts = team['start'].to_numpy()
+        ends = team['end'].to_numpy()
+        bounds = np.unique(np.r_[0.0, starts, ends, self.end])
+        bounds = bounds[bounds <= self.end]
+        period_start, period_end = bounds[:-1], bounds[1:]
+
+        on_pitch = (starts[None, :] <= period_start[:, None]) & (ends[None, :] >= period_end[:, None])
+        # consecutive periods with the same XI (e.g. a sub off and on in the same minute) are one period
+        keep = np.r_[True, (on_pitch[1:] != on_pitch[:-1]).any(axis=1)] if len(on_pitch) else np.array([], bool)
+        first = np.flatnonzero(keep)
+        last = np.r_[first[1:], len(period_end)] - 1
+        periods = pd.DataFrame({'start': period_start[first], 'end': period_end[last]})
+        return periods, team['playerId'].to_numpy(), on_pitch[first]
+
+    def first_xi_period(self, team_id):
+        """(start, end) of the period the starting XI played together."""
+        periods, _, _ = self.xi_periods(team_id)
+        return float(periods['start'].iloc[0]), float(periods['end'].iloc[0])
+
+
+def _cache_key(match_data, events_df, lineups=None):
+    return int(match_data['matchId'])
+
+
+@cached(LRUCache(maxsize=32), key=_cache_key, lock=threading.Lock())
+def match_timeline(match_data, events_df, lineups=None):
+    """Timeline of a match, cached per matchId."""
+    lineups = lineups if lineups is not None else match_lineups(match_data)
+    return MatchTimeline(match_data['matchId'], events_df, lineups)
@@ -0,0 +1,232 @@
+"""
+The visualizations offered by the app, by name.
+
+Every view draws a figure from a MatchContext and its own parameters, with
+the defaults the app has always used. The app and anything rendering views
+outside of it go through render_view so they all draw the same figures,
+and view_layers gives the data those figures are drawn from.
+"""
+import re
+from collections import namedtuple
+
+from spatial import match_spatial_bins
+from layers import (
+    box_pass_layers,
+    cluster_layers,
+    defensive_line_layers,
+    pass_network_layers,
+    positional_layers,
+    pv_formation_layers,
+    season_box_pass_layers,
+    season_pass_network_layers,
+    season_shot_layers,
+    season_total_pass_layers,
+    shot_layers,
+    team_defensive_line_layers,
+    total_pass_layers,
+)
+from visuals import (
+    createShotmap,
+    createPassNetworks,
+    getTeamTotalPasses,
+    getTeamSuccessfulBoxPasses,
+    createPVFormationMap,
+    clusters,
+    defline,
+    teamDefline,
+    positionalHeatmap,
+    seasonShotmap,
+    seasonPassNetwork,
+    seasonBoxPasses,
+    seasonTotalPasses,
+)
+
+
+# season_clusters: SeasonPassClusters of the season (see pass_clusters.py), for the season pass clusters
+# spatial_bins: SpatialBins of the season (see spatial.py), for the season heatmaps
+# team_aggregates: TeamAggregates of the season (see aggregates.py), for the season shot map, passes and network
+MatchContext = namedtuple('MatchContext', ['match_id', 'match_data', 'match_events', 'team_id', 'team_name',
+                                           'opp_id', 'opp_name', 'lineups', 'season_clusters', 'spatial_bins',
+                                           'team_aggregates'],
+                          defaults=[None, None, None])
+
+
+def _team_aggregates(ctx):
+    if ctx.team_aggregates is None:
+        raise ValueError('season views need the season team aggregates in the context')
+    return ctx.team_aggregates
+
+
+def _shot_map(ctx, season, match_ids, **params):
+    if season:
+        return seasonShotmap(_team_aggregates(ctx), ctx.team_id, ctx.team_name, match_ids=match_ids, **params)
+    return createShotmap(events_df=ctx.match_events, hometeam=ctx.team_name, awayteam=ctx.opp_name,
+                         homeid=ctx.team_id, awayid=ctx.opp_id, **params)
+
+
+def _pass_network(ctx, season, match_ids, minute_range, include_subs, **params):
+    if season:
+        return seasonPassNetwork(_team_aggregates(ctx), ctx.team_id, match_ids=match_ids, **params)
+    return createPassNetworks(ctx.match_data, ctx.match_events, matchId=ctx.match_id, team=ctx.team_name,
+                              lineups=ctx.lineups, minute_range=minute_range, include_subs=include_subs, **params)
+
+
+def _box_passes(ctx, season, match_ids, **params):
+    if season:
+        return seasonBoxPasses(_team_aggregates(ctx), ctx.team_id, match_ids=match_ids, **params)
+    return getTeamSuccessfulBoxPasses(ctx.match_data, ctx.match_events, ctx.team_name, **params)
+
+
+def _total_passes(ctx, season, match_ids, **params):
+    if season:
+        return seasonTotalPasses(_team_aggregates(ctx), ctx.team_id, match_ids=match_ids, **params)
+    return getTeamTotalPasses(ctx.match_events, ctx.team_id, ctx.team_name, ctx.opp_name, **params)
+
+
+def _pv_formation_map(ctx, **params):
+    return createPVFormationMap(ctx.match_data, ctx.match_events, team=ctx.team_name, lineups=ctx.lineups, **params)
+
+
+def _season_clusters(ctx, season, n_clusters):
+    if not season:
+        return None
+    if ctx.season_clusters is None or ctx.season_clusters.n_clusters != n_clusters:
+        raise ValueError(f'season pass clusters need a season model of {n_clusters} clusters in the context')
+    return ctx.season_clusters
+
+
+def _pass_clusters(ctx, season, n_clusters, **params):
+    return clusters(ctx.match_events, ctx.team_id, n_clusters, model=_season_clusters(ctx, season, n_clusters),
+                    **params)
+
+
+def _defensive_line(ctx, player):
+    return defline(ctx.match_events, ctx.team_id, player)
+
+
+def _team_defensive_line(ctx):
+    return teamDefline(ctx.match_events, ctx.team_id)
+
+
+def _heatmap_selection(ctx, player, season):
+    # the bins, player id and matches a heatmap sums over: this match, or every match of the season bins
+    if season and ctx.spatial_bins is None:
+        raise ValueError('season heatmaps need the season spatial bins in the context')
+    bins = ctx.spatial_bins if season else match_spatial_bins(ctx.match_events)
+    player_id = bins.player_id(ctx.team_id, player) if player is not None else None
+    if player is not None and player_id is None:
+        raise ValueError(f'no events of {player} in the bins')
+    return bins, player_id, None if season else [ctx.match_id]
+
+
+def _positional_heatmap(ctx, category, statistic, player, season):
+    bins, player_id, match_ids = _heatmap_selection(ctx, player, season)
+    title = '{}: {}{}, {}'.format(player if player is not None else ctx.team_name, category,
+                                  ' EPV' if statistic == 'EPV' else '', 'season' if season else f'vs {ctx.opp_name}')
+    return positionalHeatmap(bins, ctx.team_id, title, category, statistic, player_id, match_ids)
+
+
+# name -> (render function, default parameters); season and match_ids (None for all) select a season
+# aggregate of the team instead of the match
+VIEWS = {
+    'Shot Map': (_shot_map, dict(pitchcolor='#171717', shotcolor='grey', goalcolor='gold', titlecolor='white',
+                                 legendcolor='white', marker_size=300, season=False, match_ids=None)),
+    'Pass Network': (_pass_network, dict(max_line_width=8, marker_size=300, edgewidth=2, dh_arrow_width=15,
+                                         marker_color='#FFDD57', marker_edge_color='black', shrink=5,
+                                         minute_range=None, include_subs=False, season=False, match_ids=None)),
+    'Successful Box Passes': (_box_passes, dict(pitch_color='#171717', cmap='plasma', season=False,
+                                                match_ids=None)),
+    'Total Passes': (_total_passes, dict(pitch_color='#171717', season=False, match_ids=None)),
+    'PV Formation Map': (_pv_formation_map, dict(color_palette='coolwarm', markerstyle='o', markersize=500,
+                                                 markeredgewidth=2, labelsize=10, labelcolor='white',
+                                                 minute_range=None)),
+    'Pass Clusters': (_pass_clusters, dict(n_clusters=5, show=None, season=False)),
+    'Defensive Line': (_defensive_line, dict(player=None)),
+    'Team Defensive Line': (_team_defensive_line, dict()),
+    'Positional Heatmap': (_positional_heatmap, dict(category='Touches', statistic='count', player=None,
+                                                     season=False)),
+}
+
+
+def _shot_map_layers(ctx, season, match_ids, **params):
+    if season:
+        return season_shot_layers(_team_aggregates(ctx), ctx.team_id, match_ids)
+    return shot_layers(ctx.match_events, ctx.team_id, ctx.opp_id)
+
+
+def _pass_network_layers(ctx, max_line_width, minute_range, include_subs, season, match_ids, **params):
+    if season:
+        return season_pass_network_layers(_team_aggregates(ctx), ctx.team_id, match_ids,
+                                          max_line_width=max_line_width)
+    return pass_network_layers(ctx.match_data, ctx.match_events, ctx.team_id, ctx.lineups, minute_range,
+                               max_line_width, include_subs=include_subs)
+
+
+def _box_passes_layers(ctx, season, match_ids, **params):
+    if season:
+        return season_box_pass_layers(_team_aggregates(ctx), ctx.team_id, match_ids)
+    return box_pass_layers(ctx.match_events, ctx.team_id)
+
+
+def _total_passes_layers(ctx, season, match_ids, **params):
+    if season:
+        return season_total_pass_layers(_team_aggregates(ctx), ctx.team_id, match_ids)
+    return total_pass_layers(ctx.match_events, ctx.team_id)
+
+
+def _pv_formation_map_layers(ctx, minute_range, **params):
+    return pv_formation_layers(ctx.match_data, ctx.match_events, ctx.team_id, ctx.lineups, minute_range)
+
+
+def _pass_clusters_layers(ctx, n_clusters, season, **params):
+    return cluster_layers(ctx.match_events, ctx.team_id, n_clusters, _season_clusters(ctx, season, n_clusters))
+
+
+def _defensive_line_layers(ctx, player):
+    return defensive_line_layers(ctx.match_events, ctx.team_id, player)
+
+
+def _team_defensive_line_layers(ctx):
+    return team_defensive_line_layers(ctx.match_events, ctx.team_id)
+
+
+def _positional_heatmap_layers(ctx, category, statistic, player, season):
+    bins, player_id, match_ids = _heatmap_selection(ctx, player, season)
+    return positional_layers(bins, ctx.team_id, category, statistic, player_id, match_ids)
+
+
+# name -> layers function, called with the same parameters as the render function
+LAYERS = {
+    'Shot Map': _shot_map_layers,
+    'Pass Network': _pass_network_layers,
+    'Successful Box Passes': _box_passes_layers,
+    'Total Passes': _total_passes_layers,
+    'PV Formation Map': _pv_formation_map_layers,
+    'Pass Clusters': _pass_clusters_layers,
+    'Defensive Line': _defensive_line_layers,
+    'Team Defensive Line': _team_defensive_line_layers,
+    'Positional Heatmap': _positional_heatmap_layers,
+}
+
+
+def slug(name):
+    """File and URL friendly version of a view or player name."""
+    return re.sub(r'[^\w]+', '-', str(name)).strip('-').lower()
+
+
+def view_params(view, **params):
+    """The full parameter set of a view: its defaults updated with ``params``."""
+    merged = dict(VIEWS[view][1])
+    merged.update(params)
+    return merged
+
+
+def render_view(view, ctx, **params):
+    """Draw ``view`` for the match and team of ``ctx`` and return the figure."""
+    render, _ = VIEWS[view]
+    return render(ctx, **view_params(view, **params))
+
+
+def view_layers(view, ctx, **params):
+    """The layers (see layers.py) ``view`` draws for the match and team of ``ctx``."""
+    return LAYERS[view](ctx, **view_params(view, **params))
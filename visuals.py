@@ -1,40 +1,70 @@
-import pandas as pd
-import numpy as np
-from mplsoccer.pitch import Pitch, VerticalPitch
-from matplotlib.colors import to_rgba
-from matplotlib.patches import ConnectionPatch
-from itertools import combinations
 import seaborn as sns
 import matplotlib.pyplot as plt
-from highlight_text import fig_text
-from sklearn.cluster import KMeans
 import matplotlib as mpl
 
+from artists import draw_arrows, draw_labels
+from figures import subplots
+from layers import (
+    box_pass_layers,
+    cluster_layers,
+    defensive_line_layers,
+    pass_network_layers,
+    positional_layers,
+    pv_formation_layers,
+    season_box_pass_layers,
+    season_pass_network_layers,
+    season_shot_layers,
+    season_total_pass_layers,
+    shot_layers,
+    team_defensive_line_layers,
+    total_pass_layers,
+)
+from lineups import match_lineups
+from pitches import draw_pitch
+from spatial import positional_statistic
+
+
+# pass cluster colours, by cluster number (1 = most passes), one per cluster up to max(K_VALUES) of pass_clusters.py
+CLUSTER_COLORS = ['#74c69d', '#ffd166', '#ef476f', '#4cc9f0', '#c77dff', '#f4a261', '#adb5bd', '#e9ff70',
+                  '#ff8fab', '#b08968']
+
 
 def createShotmap(events_df, hometeam, awayteam, homeid, awayid, pitchcolor, shotcolor, goalcolor,
                   titlecolor, legendcolor, marker_size):
-    #events_df['expectedGoals'] = events_df['expectedGoals'].astype(float)
-    total_shots = events_df.loc[(events_df['isOwnGoal'] != True)].reset_index(drop=True)
-    team_shots = total_shots.loc[(total_shots['teamId'] == homeid)].reset_index(drop=True)
-    # team_shots['x'] = 105 - team_shots['x']
-    # team_shots['y'] = 68 - team_shots['y']
-    goal = team_shots.loc[(team_shots['type'] == 'Goal')].reset_index(drop=True)
-    shot = team_shots.loc[
-        team_shots['type'].isin(['MissedShots', 'SavedShot', 'ShotOnPost'])
-    ].reset_index(drop=True)
-
-    team_shotso = total_shots.loc[(total_shots['teamId'] == awayid)].reset_index(drop=True)
-    team_shotso['x'] = 100 - team_shotso['x']
-    goalo = team_shotso.loc[(team_shotso['type'] == 'Goal')].reset_index(drop=True)
-    shoto = team_shotso.loc[team_shotso['type'].isin(['MissedShots', 'SavedShot', 'ShotOnPost'])].reset_index(drop=True)
-    #print(goalo)
+    shots = shot_layers(events_df, homeid, awayid).tables['shots']
+    # the opponent's shots are already mirrored onto the other half
+    return _draw_shotmap(shots.loc[shots['teamId'] == homeid], shots.loc[shots['teamId'] == awayid],
+                         f'{hometeam} vs {awayteam}\n Shotmap', pitchcolor, shotcolor, goalcolor, titlecolor,
+                         legendcolor, marker_size)
+
+
+def seasonShotmap(aggregates, teamId, team, pitchcolor, shotcolor, goalcolor, titlecolor, legendcolor,
+                  marker_size, match_ids=None):
+    """
+    Shot map of a team over the matches of TeamAggregates (see
+    aggregates.py), or over ``match_ids``: its shots, and the shots against
+    it on the other half.
+    """
+    layers = season_shot_layers(aggregates, teamId, match_ids)
+    shots = layers.tables['shots']
+    return _draw_shotmap(shots.loc[~shots['against']], shots.loc[shots['against']],
+                         f'{team}: {layers.values["matches"]} matches\n Shotmap', pitchcolor, shotcolor, goalcolor,
+                         titlecolor, legendcolor, marker_size)
+
+
+def _draw_shotmap(team_shots, team_shotso, title, pitchcolor, shotcolor, goalcolor, titlecolor, legendcolor,
+                  marker_size):
+    goal = team_shots.loc[team_shots['isGoal']]
+    shot = team_shots.loc[~team_shots['isGoal']]
+
+    goalo = team_shotso.loc[team_shotso['isGoal']]
+    shoto = team_shotso.loc[~team_shotso['isGoal']]
 
     # Setup the pitch
     # orientation='vertical'
-    fig, ax = plt.subplots(figsize=(16, 11))
-    pitch = Pitch(pitch_type='opta', pitch_color=pitchcolor, line_color='#c7d5cc',
-                  half=False, goal_type='box')  # , pad_top=2)
-    pitch.draw(ax=ax, tight_layout=True, constrained_layout=True)
+    fig, ax = subplots(figsize=(16, 11))
+    pitch = draw_pitch(ax, pitch_type='opta', pitch_color=pitchcolor, line_color='#c7d5cc',
+                       half=False, goal_type='box')  # , pad_top=2)
 
     pitch.scatter(50, 160, s=marker_size,
                   edgecolors='black', c=goalcolor, zorder=2,
@@ -59,7 +89,7 @@ def createShotmap(events_df, hometeam, awayteam, homeid, awayid, pitchcolor, sho
                   zorder=2,
                  ax=ax)
     # Set the title
-    ax.set_title(f'{hometeam} vs {awayteam}\n Shotmap', fontsize=30, color=titlecolor)
+    ax.set_title(title, fontsize=30, color=titlecolor)
 
     # set legend
     leg = ax.legend(facecolor=pitchcolor, edgecolor='None', fontsize=20, loc='lower center', handlelength=4)
@@ -84,188 +114,71 @@ def createShotmap(events_df, hometeam, awayteam, homeid, awayid, pitchcolor, sho
 
 def createPassNetworks(match_data, events_df, matchId, team, max_line_width, 
                        marker_size, edgewidth, dh_arrow_width, marker_color, 
-                       marker_edge_color, shrink,  kit_no_size=20):
+                       marker_edge_color, shrink,  kit_no_size=20, lineups=None,
+                       minute_range=None, include_subs=False):
     
-    # getting team id and venue
+    # getting team id
     if match_data['home']['name'] == team:
         teamId = match_data['home']['teamId']
-        venue = 'home'
     else:
         teamId = match_data['away']['teamId']
-        venue = 'away'
     
     
-    # getting opponent   
-    if venue == 'home':
-        opponent = match_data['away']['name']
-    else:
-        opponent = match_data['home']['name']
-    
-    
-    # getting player dictionary
-    team_players_dict = {}
-    for player in match_data[venue]['players']:
-        team_players_dict[player['playerId']] = player['name']
-    
-    
-    # getting minute of first substitution
-    for i in events_df.index:
-        if events_df.loc[i, 'type'] == 'SubstitutionOn' and events_df.loc[i, 'teamId'] == teamId:
-            sub_minute = str(events_df.loc[i, 'minute'])
-            break
-    
-    
-    # getting players dataframe
-    match_players_df = pd.DataFrame()
-    player_names = []
-    player_ids = []
-    player_pos = []
-    player_kit_number = []
-
-
-    for player in match_data[venue]['players']:
-        player_names.append(player['name'])
-        player_ids.append(player['playerId'])
-        player_pos.append(player['position'])
-        player_kit_number.append(player['shirtNo'])
-
-    match_players_df['playerId'] = player_ids
-    match_players_df['playerName'] = player_names
-    match_players_df['playerPos'] = player_pos
-    match_players_df['playerKitNumber'] = player_kit_number
-    
-    # extracting passes
-    passes_df = events_df.loc[events_df['teamId'] == teamId].reset_index().drop('index', axis=1)
-    passes_df['playerId'] = passes_df['playerId'].astype('float').astype('Int64')
-    if 'playerName' in passes_df.columns:
-        passes_df = passes_df.drop(columns='playerName')
-    passes_df.dropna(subset=["playerId"], inplace=True)
-    passes_df.insert(27, column='playerName', value=[team_players_dict[i] for i in list(passes_df['playerId'])])
-    if 'passRecipientId' in passes_df.columns:
-        passes_df = passes_df.drop(columns='passRecipientId')
-        passes_df = passes_df.drop(columns='passRecipientName')
-    passes_df.insert(28, column='passRecipientId', value=passes_df['playerId'].shift(-1))  
-    passes_df.insert(29, column='passRecipientName', value=passes_df['playerName'].shift(-1))  
-    passes_df.dropna(subset=["passRecipientName"], inplace=True)
-    # passes_df = passes_df.loc[events_df['type'] == 'Pass', :].reset_index(drop=True)
-    # passes_df = passes_df.loc[events_df['outcomeType'] == 'Successful', :].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['type'] == 'Pass'].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['outcomeType'] == 'Successful'].reset_index(drop=True)
-
-    index_names = passes_df.loc[passes_df['playerName']==passes_df['passRecipientName']].index
-    passes_df.drop(index_names, inplace=True)
-    passes_df = passes_df.merge(match_players_df, on=['playerId', 'playerName'], how='left', validate='m:1')
-    passes_df = passes_df.merge(match_players_df.rename({'playerId': 'passRecipientId', 'playerName':'passRecipientName'},
-                                                        axis='columns'), on=['passRecipientId', 'passRecipientName'],
-                                                        how='left', validate='m:1', suffixes=['', 'Receipt'])
-    passes_df = passes_df[passes_df['playerPos'] != 'Sub']
-    
-    
-    # getting team formation
-    formation = match_data[venue]['formations'][0]['formationName']
-    formation = '-'.join(formation)
-    
-    
-    # getting player average locations
-    location_formation = passes_df[['playerKitNumber', 'x', 'y']]
-    average_locs_and_count = location_formation.groupby('playerKitNumber').agg({'x': ['mean'], 'y': ['mean', 'count']})
-    average_locs_and_count.columns = ['x', 'y', 'count']
-
-    
-    # getting separate dataframe for selected columns 
-    passes_formation = passes_df[['id', 'playerKitNumber', 'playerKitNumberReceipt', 'playerName', 'passRecipientName']].copy()
-    passes_formation['EPV'] = passes_df['EPV']
-
-    
-    # getting dataframe for passes between players
-    passes_between = passes_formation.groupby(['playerKitNumber', 'playerKitNumberReceipt', 'playerName', 'passRecipientName']).agg({ 'id' : 'count', 'EPV' : 'sum'}).reset_index()        
-    passes_between.rename({'id': 'pass_count'}, axis='columns', inplace=True)
-    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumberReceipt', right_index=True)
-    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumber', right_index=True,
-                                          suffixes=['', '_end'])
-
-    
-    # filtering passes
-    pass_filter = int(passes_between['pass_count'].mean())
-    passes_between = passes_between.loc[passes_between['pass_count'] > pass_filter]
-    
-    
-    # calculating the line width 
-    passes_between['width'] = passes_between.pass_count / passes_between.pass_count.max() * max_line_width
-    passes_between = passes_between.reset_index(drop=True)
-    
-    
-    # setting color to make the lines more transparent when less EPV passes are made
-    min_transparency = 0.3
-    color = np.array(to_rgba('white'))
-    color = np.tile(color, (len(passes_between), 1))
-    #c_transparency = passes_between.pass_count / passes_between.pass_count.max()
-    #c_transparency = (c_transparency * (1 - min_transparency)) + min_transparency
-    c_transparency = passes_between.EPV
-    c_transparency = (c_transparency * (1 - min_transparency)) + min_transparency
-    color[:, 3] = c_transparency
-    passes_between['alpha'] = color.tolist()
-
-    
-    # separating paired passes from normal passes
-    passes_between_threshold = 15
-    filtered_pair_df = []
-    pair_list = [comb for comb in combinations(passes_between['playerKitNumber'].unique(), 2)]
-    for pair in pair_list:
-        df = passes_between[((passes_between['playerKitNumber']==pair[0]) & (passes_between['playerKitNumberReceipt']==pair[1])) |
-                            ((passes_between['playerKitNumber']==pair[1]) & (passes_between['playerKitNumberReceipt']==pair[0]))]
-        if df.shape[0] == 2:
-            if (np.array(df.pass_count)[0] >= passes_between_threshold) and (np.array(df.pass_count)[1] >= passes_between_threshold):
-                filtered_pair_df.append(df)
-                passes_between.drop(df.index, inplace=True)
-    if len(filtered_pair_df) > 0:
-        filtered_pair_df = pd.concat(filtered_pair_df).reset_index(drop=True)
-        passes_between = passes_between.reset_index(drop=True)
+    # getting lineups
+    lineups = lineups if lineups is not None else match_lineups(match_data)
     
     
+    # getting the nodes and edges of the network
+    layers = pass_network_layers(match_data, events_df, teamId, lineups, minute_range, max_line_width,
+                                 attacking=False, include_subs=include_subs)
+    formation = layers.values['formation']
+    average_locs_and_count = layers.tables['nodes'].set_index('playerKitNumber')
+    edges = layers.tables['edges']
+    passes_between = edges.loc[~edges['paired']]
+    filtered_pair_df = edges.loc[edges['paired']]
+    return _draw_pass_network(average_locs_and_count, passes_between, filtered_pair_df, formation, max_line_width,
+                              marker_size, edgewidth, dh_arrow_width, marker_color, marker_edge_color, shrink,
+                              kit_no_size)
+
+
+def seasonPassNetwork(aggregates, teamId, max_line_width, marker_size, edgewidth, dh_arrow_width, marker_color,
+                      marker_edge_color, shrink, name_size=12, match_ids=None):
+    """
+    Pass network of a team over the matches of TeamAggregates (see
+    aggregates.py), or over ``match_ids``, its most frequent passers
+    labelled by surname.
+    """
+    layers = season_pass_network_layers(aggregates, teamId, match_ids, max_line_width=max_line_width)
+    nodes = layers.tables['nodes']
+    average_locs_and_count = nodes.set_index(nodes['playerName'].str.split().str[-1])
+    edges = layers.tables['edges']
+    return _draw_pass_network(average_locs_and_count, edges.loc[~edges['paired']], edges.loc[edges['paired']],
+                              f'{layers.values["matches"]} matches', max_line_width, marker_size, edgewidth,
+                              dh_arrow_width, marker_color, marker_edge_color, shrink, name_size)
+
+
+def _draw_pass_network(average_locs_and_count, passes_between, filtered_pair_df, formation, max_line_width,
+                       marker_size, edgewidth, dh_arrow_width, marker_color, marker_edge_color, shrink, kit_no_size):
     # plotting
-    fig, ax = plt.subplots(figsize=(16, 11))
-    pitch = Pitch(pitch_type='opta', pitch_color='#171717', line_color='#5c5c5c',
-                  goal_type='box')
-    pitch.draw(ax=ax, constrained_layout=True, tight_layout=True)
-    average_locs_and_count['zorder'] = list(np.linspace(1,5,11))
-    for i in average_locs_and_count.index:
-        pitch.scatter(average_locs_and_count.loc[i, 'x'], average_locs_and_count.loc[i, 'y'], s=marker_size,
-                      color=marker_color, edgecolors=marker_edge_color, linewidth=edgewidth, 
-                      alpha=1, zorder=average_locs_and_count.loc[i, 'zorder'], ax=ax)
-    
-    for i in passes_between.index:
-        x = passes_between.loc[i, 'x']
-        y = passes_between.loc[i, 'y']
-        endX = passes_between.loc[i, 'x_end']
-        endY = passes_between.loc[i, 'y_end']
-        coordsA = "data"
-        coordsB = "data"
-        con = ConnectionPatch([endX, endY], [x, y],
-                              coordsA, coordsB,
-                              arrowstyle="simple", shrinkA=shrink, shrinkB=shrink,
-                              mutation_scale=passes_between.loc[i, 'width']*max_line_width, color=passes_between.loc[i, 'alpha'])
-        ax.add_artist(con)
-    
-    if len(filtered_pair_df) > 0:
-        for i in filtered_pair_df.index:
-            x = filtered_pair_df.loc[i, 'x']
-            y = filtered_pair_df.loc[i, 'y']
-            endX = filtered_pair_df.loc[i, 'x_end']
-            endY = filtered_pair_df.loc[i, 'y_end']
-            coordsA = "data"
-            coordsB = "data"
-            con = ConnectionPatch([endX, endY], [x, y],
-                                  coordsA, coordsB,
-                                  arrowstyle="<|-|>", shrinkA=shrink, shrinkB=shrink,
-                                  mutation_scale=dh_arrow_width, lw=filtered_pair_df.loc[i, 'width']*max_line_width/5, 
-                                  color=filtered_pair_df.loc[i, 'alpha'])
-            ax.add_artist(con)
-    
-    for i in average_locs_and_count.index:
-        pitch.annotate(i, xy=(average_locs_and_count.loc[i, 'x'], average_locs_and_count.loc[i, 'y']), 
-                       family='DejaVu Sans', c='white', 
-                       va='center', ha='center', zorder=average_locs_and_count.loc[i, 'zorder'], size=kit_no_size, weight='bold', ax=ax)
+    fig, ax = subplots(figsize=(16, 11))
+    pitch = draw_pitch(ax, pitch_type='opta', pitch_color='#171717', line_color='#5c5c5c',
+                       goal_type='box')
+    # one collection each for the players, the one-way and the paired edges and the kit numbers
+    pitch.scatter(average_locs_and_count.x, average_locs_and_count.y, s=marker_size,
+                  color=marker_color, edgecolors=marker_edge_color, linewidth=edgewidth,
+                  alpha=1, zorder=2, ax=ax)
+    
+    draw_arrows(ax, passes_between[['x_end', 'y_end']].to_numpy(), passes_between[['x', 'y']].to_numpy(),
+                arrowstyle="simple", shrink=shrink, mutation_scale=passes_between['width']*max_line_width,
+                colors=[(1, 1, 1, alpha) for alpha in passes_between['alpha']], zorder=1)
+    
+    draw_arrows(ax, filtered_pair_df[['x_end', 'y_end']].to_numpy(), filtered_pair_df[['x', 'y']].to_numpy(),
+                arrowstyle="<|-|>", shrink=shrink, mutation_scale=dh_arrow_width,
+                linewidths=filtered_pair_df['width']*max_line_width/5,
+                colors=[(1, 1, 1, alpha) for alpha in filtered_pair_df['alpha']], zorder=1)
+    
+    draw_labels(ax, average_locs_and_count.index, average_locs_and_count[['x', 'y']].to_numpy(),
+                family='DejaVu Sans', color='white', size=kit_no_size, weight='bold', zorder=3)
   #  ax.text(50, 104, "{} (Mins 1-{})".format(team, sub_minute).upper(), size=10, fontweight='bold', ha='center',
           # va='center')
     ax.text(2, 3, '{}'.format(formation), size=9, c='grey')
@@ -287,7 +200,6 @@ def createPassNetworks(match_data, events_df, matchId, team, max_line_width,
 
     custom_map = custom_div_cmap(7, mincol='#A9A9A9', midcol='0.9', maxcol='#FFFFFF')
     #plt.tight_layout()
-    N = 7
     #cmap = plt.get_cmap('white', N)
     # Normalizer
     norm = mpl.colors.Normalize(vmin=0, vmax=1)
@@ -296,10 +208,10 @@ def createPassNetworks(match_data, events_df, matchId, team, max_line_width,
     sm = plt.cm.ScalarMappable(cmap=custom_map, norm=norm)
     sm.set_array([])
 
-    plt.colorbar(sm, ticks=[] ,ax=ax, location= 'bottom', shrink=0.23,pad=0,anchor=(0.884, 1.46))
+    fig.colorbar(sm, ticks=[] ,ax=ax, location= 'bottom', shrink=0.23,pad=0,anchor=(0.884, 1.46))
     ax.text(72, -2.3, 'Low EPV', size=12, c='grey',zorder=4)
     ax.text(93.8, -2.3, 'High EPV', size=12, c='grey', zorder=4)
-    plt.tight_layout()
+    fig.tight_layout()
     #plt.show()
     return fig
 
@@ -310,191 +222,50 @@ def createPassNetworks(match_data, events_df, matchId, team, max_line_width,
     
 def createAttPassNetworks(match_data, events_df, matchId, team, max_line_width, 
                       marker_size, edgewidth, dh_arrow_width, marker_color, 
-                      marker_edge_color, shrink, ax, kit_no_size = 20):
+                      marker_edge_color, shrink, ax, kit_no_size = 20, lineups=None,
+                      minute_range=None, include_subs=False):
     
-    # getting team id and venue
+    # getting team id
     if match_data['home']['name'] == team:
         teamId = match_data['home']['teamId']
-        venue = 'home'
     else:
         teamId = match_data['away']['teamId']
-        venue = 'away'
-    
-    
-    # getting opponent   
-    if venue == 'home':
-        opponent = match_data['away']['name']
-    else:
-        opponent = match_data['home']['name']
-    
-    
-    # getting player dictionary
-    team_players_dict = {}
-    for player in match_data[venue]['players']:
-        team_players_dict[player['playerId']] = player['name']
-    
-    
-    # getting minute of first substitution
-    for i in events_df.index:
-        if events_df.loc[i, 'type'] == 'SubstitutionOn' and events_df.loc[i, 'teamId'] == teamId:
-            sub_minute = str(events_df.loc[i, 'minute'])
-            break
-    
-    
-    # getting players dataframe
-    match_players_df = pd.DataFrame()
-    player_names = []
-    player_ids = []
-    player_pos = []
-    player_kit_number = []
-
-
-    for player in match_data[venue]['players']:
-        player_names.append(player['name'])
-        player_ids.append(player['playerId'])
-        player_pos.append(player['position'])
-        player_kit_number.append(player['shirtNo'])
-
-    match_players_df['playerId'] = player_ids
-    match_players_df['playerName'] = player_names
-    match_players_df['playerPos'] = player_pos
-    match_players_df['playerKitNumber'] = player_kit_number
-    
-    
-    # extracting passes
-    passes_df = events_df.loc[events_df['teamId'] == teamId].reset_index().drop('index', axis=1)
-    passes_df['playerId'] = passes_df['playerId'].astype('float').astype('Int64')
-    if 'playerName' in passes_df.columns:
-        passes_df = passes_df.drop(columns='playerName')
-    passes_df.dropna(subset=["playerId"], inplace=True)
-    passes_df.insert(27, column='playerName', value=[team_players_dict[i] for i in list(passes_df['playerId'])])
-    if 'passRecipientId' in passes_df.columns:
-        passes_df = passes_df.drop(columns='passRecipientId')
-        passes_df = passes_df.drop(columns='passRecipientName')
-    passes_df.insert(28, column='passRecipientId', value=passes_df['playerId'].shift(-1))  
-    passes_df.insert(29, column='passRecipientName', value=passes_df['playerName'].shift(-1))  
-    passes_df.dropna(subset=["passRecipientName"], inplace=True)
-    # passes_df = passes_df.loc[events_df['type'] == 'Pass', :].reset_index(drop=True)
-    # passes_df = passes_df.loc[events_df['outcomeType'] == 'Successful', :].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['type'] == 'Pass'].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['outcomeType'] == 'Successful'].reset_index(drop=True)
-
-    index_names = passes_df.loc[passes_df['playerName']==passes_df['passRecipientName']].index
-    passes_df.drop(index_names, inplace=True)
-    passes_df = passes_df.merge(match_players_df, on=['playerId', 'playerName'], how='left', validate='m:1')
-    passes_df = passes_df.merge(match_players_df.rename({'playerId': 'passRecipientId', 'playerName':'passRecipientName'},
-                                                        axis='columns'), on=['passRecipientId', 'passRecipientName'],
-                                                        how='left', validate='m:1', suffixes=['', 'Receipt'])
-    passes_df = passes_df[passes_df['playerPos'] != 'Sub']
     
     
-    # getting team formation
-    formation = match_data[venue]['formations'][0]['formationName']
-    formation = '-'.join(formation)
+    # getting lineups
+    lineups = lineups if lineups is not None else match_lineups(match_data)
     
     
-    # getting player average locations
-    location_formation = passes_df[['playerKitNumber', 'x', 'y']]
-    average_locs_and_count = location_formation.groupby('playerKitNumber').agg({'x': ['mean'], 'y': ['mean', 'count']})
-    average_locs_and_count.columns = ['x', 'y', 'count']
+    # getting the nodes and edges of the network
+    layers = pass_network_layers(match_data, events_df, teamId, lineups, minute_range, max_line_width,
+                                 attacking=True, include_subs=include_subs)
+    formation = layers.values['formation']
+    average_locs_and_count = layers.tables['nodes'].set_index('playerKitNumber')
+    edges = layers.tables['edges']
+    passes_between = edges.loc[~edges['paired']]
+    filtered_pair_df = edges.loc[edges['paired']]
     
     
-    # filtering progressive passes 
-    passes_df = passes_df.loc[passes_df['EPV'] > 0]
-
-    
-    # getting separate dataframe for selected columns 
-    passes_formation = passes_df[['id', 'playerKitNumber', 'playerKitNumberReceipt']].copy()
-    passes_formation['EPV'] = passes_df['EPV']
-
-
-    # getting dataframe for passes between players
-    passes_between = passes_formation.groupby(['playerKitNumber', 'playerKitNumberReceipt']).agg({ 'id' : 'count', 'EPV' : 'sum'}).reset_index()
-    passes_between.rename({'id': 'pass_count'}, axis='columns', inplace=True)
-    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumberReceipt', right_index=True)
-    passes_between = passes_between.merge(average_locs_and_count, left_on='playerKitNumber', right_index=True,
-                                          suffixes=['', '_end'])
-    
-    
-    # filtering passes
-    pass_filter = int(passes_between['pass_count'].mean())
-    passes_between = passes_between.loc[passes_between['pass_count'] > pass_filter*2]
-    
-    
-    # calculating the line width and marker sizes relative to the largest counts
-    passes_between['width'] = passes_between.pass_count / passes_between.pass_count.max() * max_line_width
-    passes_between = passes_between.reset_index(drop=True)
+    # plotting
+    pitch = draw_pitch(ax, pitch_type='opta', pitch_color='#171717', line_color='#5c5c5c',
+                       goal_type='box')
     
+    # one collection each for the players, the one-way and the paired edges and the kit numbers
+    pitch.scatter(average_locs_and_count.x, average_locs_and_count.y, s=marker_size,
+                  color=marker_color, edgecolors=marker_edge_color, linewidth=edgewidth,
+                  alpha=1, zorder=2, ax=ax)
     
-    # setting color to make the lines more transparent when fewer passes are made
-    min_transparency = 0.3
-    color = np.array(to_rgba('white'))
-    color = np.tile(color, (len(passes_between), 1))
-    c_transparency = passes_between.EPV / passes_between.EPV.max()
-    c_transparency = (c_transparency * (1 - min_transparency)) + min_transparency
-    color[:, 3] = c_transparency
-    passes_between['alpha'] = color.tolist()
-    
-    
-    # separating paired passes from normal passes
-    passes_between_threshold = 20
-    filtered_pair_df = []
-    pair_list = [comb for comb in combinations(passes_between['playerKitNumber'].unique(), 2)]
-    for pair in pair_list:
-        df = passes_between[((passes_between['playerKitNumber']==pair[0]) & (passes_between['playerKitNumberReceipt']==pair[1])) | 
-                            ((passes_between['playerKitNumber']==pair[1]) & (passes_between['playerKitNumberReceipt']==pair[0]))]
-        if df.shape[0] == 2:
-            if np.array(df.pass_count)[0]+np.array(df.pass_count)[1] >= passes_between_threshold:
-                filtered_pair_df.append(df)
-                passes_between.drop(df.index, inplace=True)
-    if len(filtered_pair_df) > 0:
-        filtered_pair_df = pd.concat(filtered_pair_df).reset_index(drop=True)
-        passes_between = passes_between.reset_index(drop=True)
+    draw_arrows(ax, passes_between[['x_end', 'y_end']].to_numpy(), passes_between[['x', 'y']].to_numpy(),
+                arrowstyle="simple", shrink=shrink, mutation_scale=passes_between['width']*max_line_width,
+                colors=[(1, 1, 1, alpha) for alpha in passes_between['alpha']], zorder=1)
     
+    draw_arrows(ax, filtered_pair_df[['x_end', 'y_end']].to_numpy(), filtered_pair_df[['x', 'y']].to_numpy(),
+                arrowstyle="<|-|>", shrink=shrink, mutation_scale=dh_arrow_width,
+                linewidths=filtered_pair_df['width']*max_line_width/5,
+                colors=[(1, 1, 1, alpha) for alpha in filtered_pair_df['alpha']], zorder=1)
     
-    # plotting
-    pitch = Pitch(pitch_type='opta', pitch_color='#171717', line_color='#5c5c5c',
-                  goal_type='box')
-    pitch.draw(ax=ax, constrained_layout=True, tight_layout=True)
-    
-    average_locs_and_count['zorder'] = list(np.linspace(1,5,11))
-    for i in average_locs_and_count.index:
-        pitch.scatter(average_locs_and_count.loc[i, 'x'], average_locs_and_count.loc[i, 'y'], s=marker_size,
-                      color=marker_color, edgecolors=marker_edge_color, linewidth=edgewidth, 
-                      alpha=1, zorder=average_locs_and_count.loc[i, 'zorder'], ax=ax)
-    
-    for i in passes_between.index:
-        x = passes_between.loc[i, 'x']
-        y = passes_between.loc[i, 'y']
-        endX = passes_between.loc[i, 'x_end']
-        endY = passes_between.loc[i, 'y_end']
-        coordsA = "data"
-        coordsB = "data"
-        con = ConnectionPatch([endX, endY], [x, y],
-                              coordsA, coordsB,
-                              arrowstyle="simple", shrinkA=shrink, shrinkB=shrink,
-                              mutation_scale=passes_between.loc[i, 'width']*max_line_width, color=passes_between.loc[i, 'alpha'])
-        ax.add_artist(con)
-    
-    if len(filtered_pair_df) > 0:
-        for i in filtered_pair_df.index:
-            x = filtered_pair_df.loc[i, 'x']
-            y = filtered_pair_df.loc[i, 'y']
-            endX = filtered_pair_df.loc[i, 'x_end']
-            endY = filtered_pair_df.loc[i, 'y_end']
-            coordsA = "data"
-            coordsB = "data"
-            con = ConnectionPatch([endX, endY], [x, y],
-                                  coordsA, coordsB,
-                                  arrowstyle="<|-|>", shrinkA=shrink, shrinkB=shrink,
-                                  mutation_scale=dh_arrow_width, lw=filtered_pair_df.loc[i, 'width']*max_line_width/5, 
-                                  color=filtered_pair_df.loc[i, 'alpha'])
-            ax.add_artist(con)
-    
-    for i in average_locs_and_count.index:
-        pitch.annotate(i, xy=(average_locs_and_count.loc[i, 'x'], average_locs_and_count.loc[i, 'y']), 
-                       family='DejaVu Sans', c='white', 
-                       va='center', ha='center', zorder=average_locs_and_count.loc[i, 'zorder'], size=kit_no_size, weight='bold', ax=ax)
+    draw_labels(ax, average_locs_and_count.index, average_locs_and_count[['x', 'y']].to_numpy(),
+                family='DejaVu Sans', color='white', size=kit_no_size, weight='bold', zorder=3)
    # ax.text(50, 104, "{} (Mins 1-{})".format(team, sub_minute).upper(), size=10, fontweight='bold', ha='center',
         #   va='center')
     ax.text(2, 3, '{}'.format(formation), size=9, c='grey')
@@ -528,51 +299,34 @@ def getTeamSuccessfulBoxPasses(match_data, events_df, team, pitch_color, cmap):
     Pitch Plot.
 
     """
-    # getting team id and venue
+    # getting team id
     if match_data['home']['name'] == team:
         teamId = match_data['home']['teamId']
-        venue = 'home'
     else:
         teamId = match_data['away']['teamId']
-        venue = 'away'
-    # Get Total Passes
-    passes_df = events_df.loc[events_df['type']=='Pass'].reset_index(drop=True)
-    
-    # Get Team Passes
-    team_passes = passes_df.loc[passes_df['teamId'] == teamId]
-        
-    # Extracting Box Passes from Total Passes
-    box_passes = team_passes.copy()
-    for i,pas in box_passes.iterrows():
-        X = pas["x"]/100*120
-        Xend = pas["endX"]/100*120
-        Y = pas["y"]/100*80
-        Yend = pas["endY"]/100*80
-        if Xend >= 102 and Yend >= 18 and Yend <= 62:
-            if X >=102 and Y >= 18 and Y <= 62:
-                box_passes = box_passes.drop([i])
-            else:
-                pass
-        else:
-            box_passes = box_passes.drop([i])
-            
-    
-    successful_box_passes = box_passes.loc[box_passes['outcomeType']=='Successful'].reset_index(drop=True)
-    
-        
+    # Successful passes into the box from outside it
+    successful_box_passes = box_pass_layers(events_df, teamId).tables['passes']
+    return _draw_box_passes(successful_box_passes, pitch_color, cmap)
+
+
+def seasonBoxPasses(aggregates, teamId, pitch_color, cmap, match_ids=None):
+    """Successful box passes of a team over the matches of TeamAggregates (see aggregates.py), or over ``match_ids``."""
+    return _draw_box_passes(season_box_pass_layers(aggregates, teamId, match_ids).tables['passes'], pitch_color, cmap)
+
+
+def _draw_box_passes(successful_box_passes, pitch_color, cmap):
     # orientation='vertical'
-    fig, ax = plt.subplots(figsize=(16, 11))
-    pitch = VerticalPitch(pitch_type='statsbomb', pitch_color=pitch_color, line_color='#c7d5cc',
-                          half=True, pad_top=2)
-    fig, ax = pitch.draw(figsize=(16, 11), constrained_layout=True, tight_layout=False)
+    fig, ax = subplots(figsize=(16, 11), constrained_layout=True)
+    pitch = draw_pitch(ax, vertical=True, pitch_type='statsbomb', pitch_color=pitch_color, line_color='#c7d5cc',
+                       half=True, pad_top=2)
     
     # Plot the completed passes
-    pitch.lines(successful_box_passes.x/100*120, 80-successful_box_passes.y/100*80,
-                successful_box_passes.endX/100*120, 80-successful_box_passes.endY/100*80,
+    pitch.lines(successful_box_passes.sbX, successful_box_passes.sbY,
+                successful_box_passes.sbEndX, successful_box_passes.sbEndY,
                 lw=3, cmap=cmap, comet=True, transparent=True,
                 label='Successful Passes', ax=ax)
     
-    pitch.scatter(successful_box_passes.x/100*120, 80-successful_box_passes.y/100*80,
+    pitch.scatter(successful_box_passes.sbX, successful_box_passes.sbY,
                   edgecolors='white', c='white', s=30, zorder=2,
                   ax=ax)
     
@@ -587,7 +341,7 @@ def getTeamSuccessfulBoxPasses(match_data, events_df, team, pitch_color, cmap):
     
     # Set the figure facecolor
     fig.set_facecolor(pitch_color)
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
     
@@ -619,18 +373,22 @@ def getTeamTotalPasses(events_df, teamId, team, opponent, pitch_color):
     Pitch Plot.
     """
     
-    # Get Total Passes
-    passes_df = events_df.loc[events_df['type']=='Pass'].reset_index(drop=True)
-    
-    # Get Team Passes
-    team_passes = passes_df.loc[passes_df['teamId'] == teamId]
-        
-    successful_passes = team_passes.loc[team_passes['outcomeType']=='Successful'].reset_index(drop=True)
-    unsuccessful_passes = team_passes.loc[team_passes['outcomeType']=='Unsuccessful'].reset_index(drop=True)
+    passes = total_pass_layers(events_df, teamId).tables['passes']
+    return _draw_total_passes(passes, pitch_color)
+
+
+def seasonTotalPasses(aggregates, teamId, pitch_color, match_ids=None):
+    """All passes of a team over the matches of TeamAggregates (see aggregates.py), or over ``match_ids``."""
+    return _draw_total_passes(season_total_pass_layers(aggregates, teamId, match_ids).tables['passes'], pitch_color)
+
+
+def _draw_total_passes(passes, pitch_color):
+    successful_passes = passes.loc[passes['successful']]
+    unsuccessful_passes = passes.loc[~passes['successful']]
             
     # Setup the pitch
-    pitch = Pitch(pitch_type='opta', pitch_color=pitch_color, line_color='#c7d5cc')
-    fig, ax = pitch.draw(figsize=(16, 11),constrained_layout=True, tight_layout=False)
+    fig, ax = subplots(figsize=(16, 11), constrained_layout=True)
+    pitch = draw_pitch(ax, pitch_type='opta', pitch_color=pitch_color, line_color='#c7d5cc')
     
     # Plot the completed passes
     pitch.arrows(successful_passes.x, successful_passes.y,
@@ -657,134 +415,37 @@ def getTeamTotalPasses(events_df, teamId, team, opponent, pitch_color):
     
     fig.set_facecolor(pitch_color)
     
+    return fig
     
     
     
-    
-
-def normalize(values, bounds):
-    return [bounds['desired']['lower'] + (x - bounds['actual']['lower']) * (bounds['desired']['upper'] 
-            - bounds['desired']['lower']) / (bounds['actual']['upper'] - bounds['actual']['lower']) for x in values]
 
-
-
-
-    
 def createPVFormationMap(match_data, events_df, team, color_palette,
-                        markerstyle, markersize, markeredgewidth, labelsize, labelcolor):
+                        markerstyle, markersize, markeredgewidth, labelsize, labelcolor, lineups=None,
+                        minute_range=None):
     
-    # getting team id and venue
+    # getting team id
     if match_data['home']['name'] == team:
         teamId = match_data['home']['teamId']
-        venue = 'home'
     else:
         teamId = match_data['away']['teamId']
-        venue = 'away'
 
 
-    # getting opponent   
-    if venue == 'home':
-        opponent = match_data['away']['name']
-    else:
-        opponent = match_data['home']['name']
-
-
-    # getting player dictionary
-    team_players_dict = {}
-    for player in match_data[venue]['players']:
-        team_players_dict[player['playerId']] = player['name']
-
-
-    # getting minute of first substitution
-    for i,row in events_df.iterrows():
-        if row['type'] == 'SubstitutionOn' and row['teamId'] == teamId:
-            sub_minute = str(row['minute'])
-            break
-
-
-    # getting players dataframe
-    match_players_df = pd.DataFrame()
-    player_names = []
-    player_ids = []
-    player_pos = []
-    player_kit_number = []
-
-    for player in match_data[venue]['players']:
-        player_names.append(player['name'])
-        player_ids.append(player['playerId'])
-        player_pos.append(player['position'])
-        player_kit_number.append(player['shirtNo'])
-
-    match_players_df['playerId'] = player_ids
-    match_players_df['playerName'] = player_names
-    match_players_df['playerPos'] = player_pos
-    match_players_df['playerKitNumber'] = player_kit_number
-
-
-    # extracting passes
-    passes_df = events_df.loc[events_df['teamId'] == teamId].reset_index().drop('index', axis=1)
-    passes_df['playerId'] = passes_df['playerId'].astype('float').astype('Int64')
-    if 'playerName' in passes_df.columns:
-        passes_df = passes_df.drop(columns='playerName')
-    passes_df.dropna(subset=["playerId"], inplace=True)
-    passes_df.insert(27, column='playerName', value=[team_players_dict[i] for i in list(passes_df['playerId'])])
-    if 'passRecipientId' in passes_df.columns:
-        passes_df = passes_df.drop(columns='passRecipientId')
-        passes_df = passes_df.drop(columns='passRecipientName')
-    passes_df.insert(28, column='passRecipientId', value=passes_df['playerId'].shift(-1))  
-    passes_df.insert(29, column='passRecipientName', value=passes_df['playerName'].shift(-1))  
-    passes_df.dropna(subset=["passRecipientName"], inplace=True)
-    # passes_df = passes_df.loc[events_df['type'] == 'Pass', :].reset_index(drop=True)
-    # passes_df = passes_df.loc[events_df['outcomeType'] == 'Successful', :].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['type'] == 'Pass'].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['outcomeType'] == 'Successful'].reset_index(drop=True)
-
-    index_names = passes_df.loc[passes_df['playerName']==passes_df['passRecipientName']].index
-    passes_df.drop(index_names, inplace=True)
-    passes_df = passes_df.merge(match_players_df, on=['playerId', 'playerName'], how='left', validate='m:1')
-    passes_df = passes_df.merge(match_players_df.rename({'playerId': 'passRecipientId', 'playerName':'passRecipientName'},
-                                                        axis='columns'), on=['passRecipientId', 'passRecipientName'],
-                                                        how='left', validate='m:1', suffixes=['', 'Receipt'])
-    # passes_df = passes_df[passes_df['playerPos'] != 'Sub']
-    
-    
-    # Getting net possesion value for passes
-    netPVPassed = passes_df.groupby(['playerId', 'playerName'])['EPV'].sum().reset_index()
-    netPVReceived = passes_df.groupby(['passRecipientId', 'passRecipientName'])['EPV'].sum().reset_index()
-    
-
-    
-    # Getting formation and player ids for first 11
-    formation = match_data[venue]['formations'][0]['formationName']
-    formation_positions = match_data[venue]['formations'][0]['formationPositions']
-    playerIds = match_data[venue]['formations'][0]['playerIds'][:11]
-
-    
-    # Getting all data in a dataframe
-    formation_data = []
-    for playerId, pos in zip(playerIds, formation_positions):
-        pl_dict = {'playerId': playerId}
-        pl_dict.update(pos)
-        formation_data.append(pl_dict)
-    formation_data = pd.DataFrame(formation_data)
-    formation_data['vertical'] = normalize(formation_data['vertical'], 
-                                           {'actual': {'lower': 0, 'upper': 10}, 'desired': {'lower': 10, 'upper': 110}})
-    formation_data['horizontal'] = normalize(formation_data['horizontal'],
-                                             {'actual': {'lower': 0, 'upper': 10}, 'desired': {'lower': 80, 'upper': 0}})
-    formation_data = netPVPassed.join(formation_data.set_index('playerId'), on='playerId', how='inner').reset_index(drop=True)
-    formation_data = formation_data.rename(columns={"EPV": "PV"})
-
+    # EPV passed per player, at the formation positions
+    layers = pv_formation_layers(match_data, events_df, teamId, lineups, minute_range, received=False)
+    formation = layers.values['formation']
+    formation_data = layers.tables['players']
+    
 
     # Plotting
-    fig, ax = plt.subplots(figsize=(16, 11))
-    pitch = Pitch(pitch_type='statsbomb', pitch_color='#171717', line_color='#5c5c5c',
-                  goal_type='box')
-    pitch.draw(ax=ax, constrained_layout=True, tight_layout=True)
+    fig, ax = subplots(figsize=(16, 11))
+    pitch = draw_pitch(ax, pitch_type='statsbomb', pitch_color='#171717', line_color='#5c5c5c',
+                       goal_type='box')
     
     sns.scatterplot(x='vertical', y='horizontal', data=formation_data, hue='PV', s=markersize, marker=markerstyle, legend=False, 
                     palette=color_palette, linewidth=markeredgewidth, ax=ax)
     
-    ax.text(2, 78, '{}'.format('-'.join(formation)), size=20, c='grey')
+    ax.text(2, 78, '{}'.format(formation), size=20, c='grey')
     
     for index, row in formation_data.iterrows():
         pitch.annotate(str(round(row.PV*100,2))+'%', xy=(row.vertical, row.horizontal), c=labelcolor, va='center',
@@ -793,188 +454,103 @@ def createPVFormationMap(match_data, events_df, team, color_palette,
                        ha='center', size=labelsize+2, zorder=2, weight='bold', ax=ax)
 
 
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
 def createPVFormationMaprec(match_data, events_df, team, color_palette,
-                         markerstyle, markersize, markeredgewidth, labelsize, labelcolor):
-    # getting team id and venue
+                         markerstyle, markersize, markeredgewidth, labelsize, labelcolor, lineups=None,
+                         minute_range=None):
+    # getting team id
     if match_data['home']['name'] == team:
         teamId = match_data['home']['teamId']
-        venue = 'home'
     else:
         teamId = match_data['away']['teamId']
-        venue = 'away'
 
-    # getting opponent
-    if venue == 'home':
-        opponent = match_data['away']['name']
-    else:
-        opponent = match_data['home']['name']
-
-    # getting player dictionary
-    team_players_dict = {}
-    for player in match_data[venue]['players']:
-        team_players_dict[player['playerId']] = player['name']
-
-    # getting minute of first substitution
-    for i, row in events_df.iterrows():
-        if row['type'] == 'SubstitutionOn' and row['teamId'] == teamId:
-            sub_minute = str(row['minute'])
-            break
-
-    # getting players dataframe
-    match_players_df = pd.DataFrame()
-    player_names = []
-    player_ids = []
-    player_pos = []
-    player_kit_number = []
-
-    for player in match_data[venue]['players']:
-        player_names.append(player['name'])
-        player_ids.append(player['playerId'])
-        player_pos.append(player['position'])
-        player_kit_number.append(player['shirtNo'])
-
-    match_players_df['playerId'] = player_ids
-    match_players_df['playerName'] = player_names
-    match_players_df['playerPos'] = player_pos
-    match_players_df['playerKitNumber'] = player_kit_number
-
-    # extracting passes
-    passes_df = events_df.loc[events_df['teamId'] == teamId].reset_index().drop('index', axis=1)
-    passes_df['playerId'] = passes_df['playerId'].astype('float').astype('Int64')
-    if 'playerName' in passes_df.columns:
-        passes_df = passes_df.drop(columns='playerName')
-    passes_df.dropna(subset=["playerId"], inplace=True)
-    passes_df.insert(27, column='playerName', value=[team_players_dict[i] for i in list(passes_df['playerId'])])
-    if 'passRecipientId' in passes_df.columns:
-        passes_df = passes_df.drop(columns='passRecipientId')
-        passes_df = passes_df.drop(columns='passRecipientName')
-    passes_df.insert(28, column='passRecipientId', value=passes_df['playerId'].shift(-1))
-    passes_df.insert(29, column='passRecipientName', value=passes_df['playerName'].shift(-1))
-    passes_df.dropna(subset=["passRecipientName"], inplace=True)
-    # passes_df = passes_df.loc[events_df['type'] == 'Pass', :].reset_index(drop=True)
-    # passes_df = passes_df.loc[events_df['outcomeType'] == 'Successful', :].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['type'] == 'Pass'].reset_index(drop=True)
-    passes_df = passes_df.loc[passes_df['outcomeType'] == 'Successful'].reset_index(drop=True)
-
-    index_names = passes_df.loc[passes_df['playerName'] == passes_df['passRecipientName']].index
-    passes_df.drop(index_names, inplace=True)
-    passes_df = passes_df.merge(match_players_df, on=['playerId', 'playerName'], how='left', validate='m:1')
-    passes_df = passes_df.merge(
-        match_players_df.rename({'playerId': 'passRecipientId', 'playerName': 'passRecipientName'},
-                                axis='columns'), on=['passRecipientId', 'passRecipientName'],
-        how='left', validate='m:1', suffixes=['', 'Receipt'])
-    # passes_df = passes_df[passes_df['playerPos'] != 'Sub']
-
-    # Getting net possesion value for passes
-    netPVPassed = passes_df.groupby(['playerId', 'playerName'])['EPV'].sum().reset_index()
-    netPVReceived = passes_df.groupby(['passRecipientId', 'passRecipientName'])['EPV'].sum().reset_index()
-
-    # Getting formation and player ids for first 11
-    formation = match_data[venue]['formations'][0]['formationName']
-    formation_positions = match_data[venue]['formations'][0]['formationPositions']
-    passRecipientIds = match_data[venue]['formations'][0]['playerIds'][:11]
-
-    # Getting all data in a dataframe
-    formation_data = []
-    for playerId, pos in zip(passRecipientIds, formation_positions):
-        pl_dict = {'passRecipientId': playerId}
-        pl_dict.update(pos)
-        formation_data.append(pl_dict)
-    formation_data = pd.DataFrame(formation_data)
-    formation_data['vertical'] = normalize(formation_data['vertical'],
-                                           {'actual': {'lower': 0, 'upper': 10},
-                                            'desired': {'lower': 10, 'upper': 110}})
-    formation_data['horizontal'] = normalize(formation_data['horizontal'],
-                                             {'actual': {'lower': 0, 'upper': 10},
-                                              'desired': {'lower': 80, 'upper': 0}})
-    formation_data = netPVReceived.join(formation_data.set_index('passRecipientId'), on= 'passRecipientId', how='inner').reset_index(
-        drop=True)
-    formation_data = formation_data.rename(columns={"EPV": "PV"})
+    # EPV received per player, at the formation positions
+    layers = pv_formation_layers(match_data, events_df, teamId, lineups, minute_range, received=True)
+    formation = layers.values['formation']
+    formation_data = layers.tables['players']
+    
 
     # Plotting
-    fig, ax = plt.subplots(figsize=(16, 11))
-    pitch = Pitch(pitch_type='statsbomb', pitch_color='#171717', line_color='#5c5c5c',
-                  goal_type='box')
-    pitch.draw(ax=ax, constrained_layout=True, tight_layout=True)
+    fig, ax = subplots(figsize=(16, 11))
+    pitch = draw_pitch(ax, pitch_type='statsbomb', pitch_color='#171717', line_color='#5c5c5c',
+                       goal_type='box')
 
     sns.scatterplot(x='vertical', y='horizontal', data=formation_data, hue='PV', s=markersize, marker=markerstyle,
                     legend=False,
                     palette=color_palette, linewidth=markeredgewidth, ax=ax)
 
-    ax.text(2, 78, '{}'.format('-'.join(formation)), size=20, c='grey')
+    ax.text(2, 78, '{}'.format(formation), size=20, c='grey')
 
     for index, row in formation_data.iterrows():
         pitch.annotate(str(round(row.PV * 100, 2)) + '%', xy=(row.vertical, row.horizontal), c=labelcolor, va='center',
                        ha='center', size=labelsize, zorder=2, weight='bold', ax=ax)
-        pitch.annotate(row.passRecipientName, xy=(row.vertical, row.horizontal + 6), c=labelcolor, va='center',
+        pitch.annotate(row.playerName, xy=(row.vertical, row.horizontal + 6), c=labelcolor, va='center',
                        ha='center', size=labelsize+2, zorder=2, weight='bold', ax=ax)
 
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
-def clusters(Df,teamid):
-    from sklearn.cluster import KMeans
-    df = Df.copy()
-    df = df.loc[(df.type=='Pass') & (df.outcomeType=='Successful') & (df.teamId==teamid)]
-    df = df.reset_index()
-    df['y'] = 80 - (0.8* df['y'])
-    df['endY'] = 80 - (0.8*df['endY'])
-    df['x'] = df['x']* 1.2
-    df['endX'] = df['endX'] * 1.2
-    X = np.array(df[['x', 'y', 'endX', 'endY']])
-    kmeans = KMeans(n_clusters=5, random_state=100)
-    kmeans.fit(X)
-    df['cluster'] = kmeans.predict(X)
-    df.cluster.value_counts()
-    fig, ax = plt.subplots(figsize=(16, 9))
+def clusters(Df, teamid, n_clusters=5, show=None, model=None):
+    """
+    Parameters
+    ----------
+    Df : DataFrame of all events.
+
+    teamid : ID of the team whose successful passes are clustered.
+
+    n_clusters : number of KMeans clusters of (x, y, endX, endY).
+
+    show : cluster numbers to draw, all when None. Clusters are numbered
+           from 1 in order of decreasing size.
+
+    model : SeasonPassClusters the passes are assigned to instead of fitting
+            clusters on this match (see pass_clusters.py).
+
+    Returns
+    -------
+    Pitch Plot.
+    """
+    layers = cluster_layers(Df, teamid, n_clusters, model)
+    df = layers.tables['passes']
+    n_clusters = layers.values['n_clusters']
+    fig, ax = subplots(figsize=(16, 9))
     fig.set_facecolor('#38383b')
     ax.patch.set_facecolor('#38383b')
 
-    pitch = Pitch(pitch_type='statsbomb',
-                  pitch_color='#171717', line_color='white')
-
-    pitch.draw(ax=ax, figsize=(16, 9),
-               constrained_layout=False, tight_layout=True)
+    pitch = draw_pitch(ax, pitch_type='statsbomb',
+                       pitch_color='#171717', line_color='white')
 
-    for x in df.index:
+    # one comet collection per cluster, largest cluster drawn first
+    for cluster in range(1, n_clusters + 1):
+        if show is not None and cluster not in show:
+            continue
+        passes = df.loc[df['cluster'] == cluster]
+        pitch.lines(xstart=passes['x'], ystart=passes['y'], xend=passes['endX'], yend=passes['endY'],
+                    color=CLUSTER_COLORS[cluster - 1], lw=3, zorder=3, comet=True,
+                    label='Cluster {} ({} passes)'.format(cluster, len(passes)), ax=ax)
 
-        if df['cluster'][x] == 0:
-            pitch.lines(xstart=df['x'][x], ystart=df['y'][x], xend=df['endX'][x], yend=df['endY'][x],
-                        color='#74c69d', lw=3, zorder=3, comet=True, ax=ax)
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(facecolor='#171717', handlelength=3, edgecolor='None', labelcolor='white', fontsize=12,
+                  loc='upper left')
 
     return fig
 
 
 def defline(events_df,teamId,playername):
-    intercept_df = events_df.loc[events_df['type']=='Interception'].reset_index(drop=True)
-    ballrecovery_df=events_df.loc[events_df['type']=='BallRecovery'].reset_index(drop=True)
-    blockedpass_df=events_df.loc[events_df['type']=='BlockedPass'].reset_index(drop=True)
-    challenge_df=events_df.loc[events_df['type']=='BlockedPass'].reset_index(drop=True)
-    clearance_df=events_df.loc[events_df['type']=='Clearance'].reset_index(drop=True)
-    tackle_df=events_df.loc[events_df['type']=='Tackle'].reset_index(drop=True)
-    aerial_df = events_df.loc[events_df['type']=='Aerial'].reset_index(drop=True)
-    defactions_df=pd.concat([intercept_df,ballrecovery_df, ballrecovery_df, blockedpass_df, challenge_df,
-                             clearance_df, tackle_df, aerial_df])
-    defaction_df=defactions_df.loc[defactions_df['teamId'] == teamId].reset_index(drop=True)
-    succ_def=defactions_df.loc[defactions_df['outcomeType']=='Successful'].reset_index(drop=True)
-    succ_def = succ_def.loc[succ_def['teamId'] == teamId].reset_index(drop=True)
-    succ_def =succ_def[succ_def['playerName']==playername]
+    succ_def = defensive_line_layers(events_df, teamId, playername).tables['actions']
+    
+    
     #plot it
-    pitch = VerticalPitch(pitch_type='opta',
-                      pitch_color='#171717', line_color='grey')
-
-
-    fig, ax = pitch.draw(figsize=(16, 11),
-                      constrained_layout=True, tight_layout=False)
+    fig, ax = subplots(figsize=(16, 11), constrained_layout=True)
+    pitch = draw_pitch(ax, vertical=True, pitch_type='opta',
+                       pitch_color='#171717', line_color='grey')
     #pitch.scatter(merged_df.x, merged_df.y,  ax=ax)
 
     #positions = ['full', 'horizontal', 'vertical']
     #for i, pos in enumerate(positions):
-    bin_statistic = pitch.bin_statistic_positional(succ_def.x, succ_def.y, statistic='count')
     #pitch.heatmap_positional(bin_statistic, ax=ax, cmap='coolwarm', edgecolors='#22312b')
     pitch.scatter(succ_def.x, succ_def.y, c='white', s=10, ax=ax)
     #total = np.array([bs['statistic'].sum() for bs in bin_statistic]).sum()
@@ -987,9 +563,87 @@ def defline(events_df,teamId,playername):
     defeline = succ_def.x.mean()
     defeline= round(defeline,2)
     #print(succ_def.x.mean())
-    plt.axhline(succ_def.x.mean())
+    ax.axhline(succ_def.x.mean())
     ax.text(-0.5, 78, f'{defeline}', size=20, c='grey')
     fig.set_facecolor('#171717')
 
-    plt.tight_layout()
+    fig.tight_layout()
+    return fig
+
+
+def positionalHeatmap(bins, teamId, title, category='Touches', statistic='count', player_id=None, match_ids=None):
+    """
+    Parameters
+    ----------
+    bins : SpatialBins holding the team's matches (see spatial.py).
+
+    teamId : ID of the team.
+
+    title : title of the plot.
+
+    category : event category of spatial.CATEGORIES.
+
+    statistic : 'count' (labelled as shares of the total) or 'EPV' (sums).
+
+    player_id : ID of the player to draw, the whole team when None.
+
+    match_ids : matches to sum over, every match in the bins when None.
+
+    Returns
+    -------
+    Pitch Plot of the positional-play zones.
+    """
+    layers = positional_layers(bins, teamId, category, statistic, player_id, match_ids)
+    cells = layers.tables['cells']
+    n_x = cells['x0'].nunique()
+    stats = positional_statistic(cells['value'].to_numpy().reshape(n_x, -1))
+
+    fig, ax = subplots(figsize=(16, 11), constrained_layout=True)
+    fig.set_facecolor('#171717')
+    pitch = draw_pitch(ax, vertical=True, pitch_type='opta',
+                       pitch_color='#171717', line_color='grey', line_zorder=2)
+    pitch.heatmap_positional(stats, ax=ax, cmap='coolwarm', edgecolors='#22312b')
+
+    total = layers.values['total']
+    if statistic == 'count':
+        labels = [dict(zone, statistic=zone['statistic'] / total if total else zone['statistic']) for zone in stats]
+        str_format = '{:.0%}'
+    else:
+        labels, str_format = stats, '{:.2f}'
+    pitch.label_heatmap(labels, color='white', fontsize=16, ha='center', va='center', str_format=str_format,
+                        exclude_zeros=True, ax=ax)
+    ax.set_title(title, color='white', fontsize=20)
+    return fig
+
+
+def teamDefline(events_df, teamId):
+    """
+    Parameters
+    ----------
+    events_df : DataFrame of all events.
+
+    teamId : ID of the team whose successful defensive actions are drawn.
+
+    Returns
+    -------
+    Pitch Plot of every action, each player's average action location
+    (sized by number of actions) and the team's average height.
+    """
+    layers = team_defensive_line_layers(events_df, teamId)
+    actions, players = layers.tables['actions'], layers.tables['players']
+
+    fig, ax = subplots(figsize=(16, 11), constrained_layout=True)
+    pitch = draw_pitch(ax, vertical=True, pitch_type='opta',
+                       pitch_color='#171717', line_color='grey')
+    pitch.scatter(actions.x, actions.y, c='white', s=10, alpha=0.5, ax=ax)
+    pitch.scatter(players.x, players.y, s=players.actions * 40, c='#FFDD57', edgecolors='black', linewidth=1.5,
+                  zorder=3, ax=ax)
+    for player in players.itertuples():
+        pitch.annotate(str(player.playerName).split()[-1], xy=(player.x - 4, player.y), c='white', size=11,
+                       va='center', ha='center', zorder=4, ax=ax)
+
+    if layers.values['line'] is not None:
+        ax.axhline(layers.values['line'])
+        ax.text(-0.5, 78, f"{round(layers.values['line'], 2)}", size=20, c='grey')
+    fig.set_facecolor('#171717')
     return fig
@@ -0,0 +1,105 @@
+"""
+Pitch zones as bitmasks over Opta (100x100) coordinates.
+
+Every event gets a ``startZone`` and an ``endZone`` integer with one bit per
+zone containing that point, so a question like "passes into the box from
+outside it" is one integer-mask expression over the whole frame.
+
+The zone edges are the StatsBomb (120x80) markings rescaled to Opta units,
+the same box getTeamSuccessfulBoxPasses used when it converted every pass.
+Opta's y runs from the attacking team's right touchline (0) to its left (100).
+"""
+import numpy as np
+
+
+PENALTY_BOX = 1
+SIX_YARD_BOX = 2
+FINAL_THIRD = 4
+RIGHT_CHANNEL = 8
+RIGHT_HALF_SPACE = 16
+CENTRAL_CHANNEL = 32
+LEFT_HALF_SPACE = 64
+LEFT_CHANNEL = 128
+
+ZONES = {
+    'penalty_box': PENALTY_BOX,
+    'six_yard_box': SIX_YARD_BOX,
+    'final_third': FINAL_THIRD,
+    'right_channel': RIGHT_CHANNEL,
+    'right_half_space': RIGHT_HALF_SPACE,
+    'central_channel': CENTRAL_CHANNEL,
+    'left_half_space': LEFT_HALF_SPACE,
+    'left_channel': LEFT_CHANNEL,
+}
+
+# 102/120, 18/80 and 62/80 of the StatsBomb pitch
+BOX_X, BOX_Y_LOW, BOX_Y_HIGH = 85.0, 22.5, 77.5
+# 114/120, 30/80 and 50/80
+SIX_YARD_X, SIX_YARD_Y_LOW, SIX_YARD_Y_HIGH = 95.0, 37.5, 62.5
+FINAL_THIRD_X = 200 / 3
+
+
+def zone_ids(x, y):
+    """Zone bitmask (uint16) of every (x, y) point, 0 where a coordinate is missing."""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    ids = np.zeros(x.shape, dtype='uint16')
+
+    box_width = (y >= BOX_Y_LOW) & (y <= BOX_Y_HIGH)
+    ids |= np.where((x >= BOX_X) & box_width, PENALTY_BOX, 0).astype('uint16')
+    ids |= np.where((x >= SIX_YARD_X) & (y >= SIX_YARD_Y_LOW) & (y <= SIX_YARD_Y_HIGH), SIX_YARD_BOX, 0).astype('uint16')
+    ids |= np.where(x >= FINAL_THIRD_X, FINAL_THIRD, 0).astype('uint16')
+
+    # vertical lanes, the half-spaces sit between the box edges and the six-yard box edges
+    lanes = np.select(
+        [y < BOX_Y_LOW, y < SIX_YARD_Y_LOW, y <= SIX_YARD_Y_HIGH, y <= BOX_Y_HIGH, y <= 100],
+        [RIGHT_CHANNEL, RIGHT_HALF_SPACE, CENTRAL_CHANNEL, LEFT_HALF_SPACE, LEFT_CHANNEL],
+        default=0,
+    )
+    ids |= np.where(np.isnan(x), 0, lanes).astype('uint16')
+    return ids
+
+
+def add_zone_columns(events_df):
+    """Add startZone and endZone to an events frame, in place."""
+    events_df['startZone'] = zone_ids(events_df['x'], events_df['y'])
+    if 'endX' in events_df.columns:
+        events_df['endZone'] = zone_ids(events_df['endX'], events_df['endY'])
+    return events_df
+
+
+def _zones(events_df, column, x, y):
+    if column in events_df.columns:
+        return events_df[column].to_numpy()
+    return zone_ids(events_df[x], events_df[y])
+
+
+def zone_mask(events_df, start=0, end=0, start_outside=0, end_outside=0):
+    """
+    Boolean mask of the events matching every given zone condition.
+
+    Parameters
+    ----------
+    start, end : zone bits the start / end point must fall in (any of them).
+
+    start_outside, end_outside : zone bits the start / end point must not fall in.
+    """
+    mask = np.ones(len(events_df), dtype=bool)
+    if start or start_outside:
+        start_zone = _zones(events_df, 'startZone', 'x', 'y')
+        if start:
+            mask &= (start_zone & start) != 0
+        if start_outside:
+            mask &= (start_zone & start_outside) == 0
+    if end or end_outside:
+        end_zone = _zones(events_df, 'endZone', 'endX', 'endY')
+        if end:
+            mask &= (end_zone & end) != 0
+        if end_outside:
+            mask &= (end_zone & end_outside) == 0
+    return mask
+
+
+def into_zone(events_df, zone):
+    """Events ending in ``zone`` that started outside it, e.g. passes into the box."""
+    return zone_mask(events_df, end=zone, start_outside=zone)